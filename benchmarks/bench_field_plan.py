@@ -0,0 +1,96 @@
+"""Per-document cost of the compiled field plan against the previous
+implementation, which split every path and walked it separately for each
+document.
+
+    python benchmarks/bench_field_plan.py
+"""
+
+import copy
+import timeit
+
+from mongomasker_cli.plan import compile_fields
+
+
+def legacy_anonymize_data(document, fields, generate):
+    def _anonymize(doc, keys, data_type):
+        if len(keys) == 1:
+            if isinstance(doc, list):
+                for item in doc:
+                    if isinstance(item, dict) and keys[0] in item:
+                        item[keys[0]] = generate(data_type, item[keys[0]])
+            elif keys[0] in doc:
+                doc[keys[0]] = generate(data_type, doc[keys[0]])
+        else:
+            key = keys[0]
+            if isinstance(doc, list):
+                for item in doc:
+                    if isinstance(item, dict):
+                        _anonymize(item[key], keys[1:], data_type)
+            elif key in doc:
+                _anonymize(doc[key], keys[1:], data_type)
+            elif key == "*":
+                for k in doc.keys():
+                    _anonymize(doc[k], keys[1:], data_type)
+
+    for field, data_type in fields.items():
+        keys = field.split(".")
+        _anonymize(document, keys, data_type)
+    return document
+
+
+def generate(data_type, value):
+    return data_type
+
+
+def wide_document(paths):
+    document = {}
+    for path in paths:
+        doc = document
+        keys = path.split(".")
+        for key in keys[:-1]:
+            doc = doc.setdefault(key, {})
+        doc[keys[-1]] = "value"
+    return document
+
+
+SHAPES = {
+    "flat (10 paths)": {f"field{i}": "name" for i in range(10)},
+    "shared prefix (40 paths)": {
+        f"patient.details.address.line{i}": "address" for i in range(40)
+    },
+    "wildcard and lists": {f"*.charges.field{i}": "id" for i in range(10)},
+}
+
+
+def documents_for(name, fields):
+    if name == "wildcard and lists":
+        charge = {f"field{i}": "value" for i in range(10)}
+        return {
+            f"key{k}": {"charges": [dict(charge) for _ in range(5)]} for k in range(5)
+        }
+    return wide_document(fields)
+
+
+def main(number=2000):
+    print(f"{'shape':<28}{'legacy us/doc':>16}{'plan us/doc':>16}{'speedup':>10}")
+    for name, fields in SHAPES.items():
+        template = documents_for(name, fields)
+        plan = compile_fields(fields)
+        docs = [copy.deepcopy(template) for _ in range(number)]
+        legacy = timeit.timeit(
+            lambda: legacy_anonymize_data(docs.pop(), fields, generate), number=number
+        )
+        docs = [copy.deepcopy(template) for _ in range(number)]
+        compiled = timeit.timeit(
+            lambda: plan.apply(docs.pop(), generate), number=number
+        )
+        legacy_us = legacy / number * 1e6
+        compiled_us = compiled / number * 1e6
+        print(
+            f"{name:<28}{legacy_us:>16.2f}{compiled_us:>16.2f}"
+            f"{legacy_us / compiled_us:>9.1f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""Per-document cost of masking a wide document by decoding it fully against
+decoding only the masked top-level fields of the raw BSON.
+
+    python benchmarks/bench_raw_bson.py
+"""
+
+import timeit
+
+import bson
+
+from mongomasker_cli.main import CODEC_OPTIONS
+from mongomasker_cli.plan import compile_fields
+from mongomasker_cli.rawbson import mask_raw_bson
+
+
+def generate(data_type, value):
+    return data_type
+
+
+def wide_document(width):
+    # 20 top-level fields, each holding `width` nested values
+    document = {
+        f"field{i}": {f"sub{j}": {"a": j, "b": [j, f"value {j}"]} for j in range(width)}
+        for i in range(20)
+    }
+    document["patient"] = {"name": "John", "email": "john@example.com"}
+    return document
+
+
+def main(number=2000):
+    plan = compile_fields({"patient.name": "name", "patient.email": "email"})
+    print(f"{'width':>8}{'bytes':>10}{'full us/doc':>14}{'partial us/doc':>17}")
+    for width in (1, 10, 100):
+        data = bson.encode(wide_document(width), codec_options=CODEC_OPTIONS)
+
+        def full():
+            document = bson.decode(data, CODEC_OPTIONS)
+            plan.apply(document, generate)
+            return bson.encode(document, codec_options=CODEC_OPTIONS)
+
+        def partial():
+            return mask_raw_bson(
+                data,
+                plan,
+                lambda document: plan.apply(document, generate),
+                CODEC_OPTIONS,
+            )
+
+        full_us = timeit.timeit(full, number=number) / number * 1e6
+        partial_us = timeit.timeit(partial, number=number) / number * 1e6
+        print(f"{width:>8}{len(data):>10}{full_us:>14.2f}{partial_us:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import hashlib
+from datetime import datetime
+
+import bson
+
+REDACTED = "REDACTED"
+
+
+def _null(value):
+    return None
+
+
+def _redact(value):
+    return REDACTED
+
+
+def _hash(value):
+    digest = hashlib.md5(bson.encode({"": value})).digest()
+    return str(int.from_bytes(digest[:8], "little", signed=True))
+
+
+def _datetrunc(value):
+    if isinstance(value, datetime):
+        return value.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    return value
+
+
+# Types computed from the original value instead of generated by Faker
+TRANSFORMS = {
+    "null": _null,
+    "redact": _redact,
+    "hash": _hash,
+    "datetrunc": _datetrunc,
+}
+# TRANSFORMS the server applies in an aggregation pipeline with the same result
+# as on the client; "hash" is left out, $toHashedIndexKey hashes differently
+SERVER_SIDE_TYPES = ("null", "redact", "datetrunc")
+
+
+def _leaf_expression(data_type, value):
+    if data_type == "null":
+        return {"$literal": None}
+    if data_type == "redact":
+        return {"$literal": REDACTED}
+    # datetrunc, other values are left as they are
+    return {
+        "$cond": [
+            {"$eq": [{"$type": value}, "date"]},
+            {"$dateTrunc": {"date": value, "unit": "month"}},
+            value,
+        ]
+    }
+
+
+def _set_child(value, keys, data_type, depth):
+    # mask `keys` below `value` when it is a document having keys[0], a value
+    # of any other type is left as it is
+    key = keys[0]
+    child = {"$getField": {"field": {"$literal": key}, "input": value}}
+    return {
+        "$cond": [
+            {
+                "$and": [
+                    {"$eq": [{"$type": value}, "object"]},
+                    {"$ne": [{"$type": child}, "missing"]},
+                ]
+            },
+            {
+                "$setField": {
+                    "field": {"$literal": key},
+                    "input": value,
+                    "value": _value_expression(child, keys[1:], data_type, depth + 1),
+                }
+            },
+            value,
+        ]
+    }
+
+
+def _value_expression(value, keys, data_type, depth=0):
+    # new value of a field whose current value is `value`, masking the path
+    # `keys` below it; arrays are fanned out to their documents like on the
+    # client, nested arrays are left as they are
+    if not keys:
+        return _leaf_expression(data_type, value)
+    # a value that isn't an array goes through the same $map as a one item
+    # array, so the expression of the keys below appears once and grows
+    # linearly with the depth of the path
+    var = f"value{depth}"
+    item = f"item{depth}"
+    masked = f"masked{depth}"
+    return {
+        "$let": {
+            "vars": {var: value},
+            "in": {
+                "$let": {
+                    "vars": {
+                        masked: {
+                            "$map": {
+                                "input": {
+                                    "$cond": [
+                                        {"$isArray": f"$${var}"},
+                                        f"$${var}",
+                                        [f"$${var}"],
+                                    ]
+                                },
+                                "as": item,
+                                "in": _set_child(f"$${item}", keys, data_type, depth),
+                            }
+                        }
+                    },
+                    "in": {
+                        "$cond": [
+                            {"$isArray": f"$${var}"},
+                            f"$${masked}",
+                            {"$arrayElemAt": [f"$${masked}", 0]},
+                        ]
+                    },
+                }
+            },
+        }
+    }
+
+
+def is_server_side(path, data_type):
+    return data_type in SERVER_SIDE_TYPES and "*" not in path.split(".")
+
+
+def split_fields(fields):
+    """Split fields to anonymize into the server-side ones and the rest."""
+    server_fields = {}
+    client_fields = {}
+    for path, data_type in fields.items():
+        if is_server_side(path, data_type):
+            server_fields[path] = data_type
+        else:
+            client_fields[path] = data_type
+    return server_fields, client_fields
+
+
+def set_stages(fields):
+    """$set stages masking `fields`, which must all be server-side.
+
+    Every path gets its own stage so that paths sharing a prefix don't
+    conflict. A path is only masked where it exists, like on the client.
+    """
+    stages = []
+    for path, data_type in fields.items():
+        top, *keys = path.split(".")
+        stages.append(
+            {
+                "$set": {
+                    top: {
+                        "$cond": [
+                            {"$eq": [{"$type": f"${top}"}, "missing"]},
+                            "$$REMOVE",
+                            _value_expression(f"${top}", keys, data_type),
+                        ]
+                    }
+                }
+            }
+        )
+    return stages
+
+
+# $merge behaviour on existing _id values for every write mode
+_WHEN_MATCHED = {"insert": "fail", "unordered": "keepExisting", "upsert": "replace"}
+
+
+def merge_stage(database, collection, write_mode="insert"):
+    return {
+        "$merge": {
+            "into": {"db": database, "coll": collection},
+            "on": "_id",
+            "whenMatched": _WHEN_MATCHED[write_mode],
+            "whenNotMatched": "insert",
+        }
+    }
@@ -0,0 +1,92 @@
+import asyncio
+
+from bson.raw_bson import RawBSONDocument
+
+# batches stay well below the 48 MB limit of a wire protocol message
+MAX_BATCH_BYTES = 16 * 1024 * 1024
+MIN_BATCH_BYTES = 64 * 1024
+INITIAL_BATCH_BYTES = 1024 * 1024
+MAX_BATCH_DOCUMENTS = 100_000
+# seconds an insert_many should take
+DEFAULT_TARGET_LATENCY = 0.5
+
+
+def document_size(document):
+    """BSON size of a document read as a RawBSONDocument, 0 otherwise."""
+    if isinstance(document, RawBSONDocument):
+        return len(document.raw)
+    return 0
+
+
+class AdaptiveBatcher:
+    """Size batches by their BSON bytes, tuned from the measured write latency.
+
+    A batch is closed once its documents add up to `batch_bytes`. Writes faster
+    than half of `target_latency` grow `batch_bytes` by half, slower writes
+    shrink it in proportion to how much they overshot, within
+    [`min_bytes`, `max_bytes`]. Small documents thus fill large batches and
+    large documents don't pile up in memory.
+    """
+
+    def __init__(
+        self,
+        target_latency=DEFAULT_TARGET_LATENCY,
+        min_bytes=MIN_BATCH_BYTES,
+        max_bytes=MAX_BATCH_BYTES,
+        batch_bytes=INITIAL_BATCH_BYTES,
+        max_documents=MAX_BATCH_DOCUMENTS,
+    ):
+        self.target_latency = target_latency
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.batch_bytes = min(max(batch_bytes, min_bytes), max_bytes)
+        self.max_documents = max_documents
+
+    def is_full(self, count, size):
+        return size >= self.batch_bytes or count >= self.max_documents
+
+    def observe(self, size, seconds):
+        """Record that writing a batch of `size` bytes took `seconds`."""
+        if size < self.batch_bytes / 2:
+            # the end of a cursor, says little about full batches
+            return
+        if seconds < self.target_latency / 2:
+            batch_bytes = self.batch_bytes * 1.5
+        elif seconds > self.target_latency:
+            batch_bytes = self.batch_bytes * self.target_latency / seconds
+        else:
+            return
+        self.batch_bytes = int(min(max(batch_bytes, self.min_bytes), self.max_bytes))
+
+
+class MemoryBudget:
+    """Bytes of the documents read but not written yet, bounded by `limit`.
+
+    Readers acquire the BSON size of every document they read and wait while
+    the budget is exhausted, writers release a batch once it is acknowledged.
+    The budget can be overrun by the documents being read when it runs out,
+    so a document larger than `limit` still goes through, alone.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = 0
+        self.peak = 0
+        self._released = asyncio.Event()
+
+    @property
+    def exhausted(self):
+        return self.used >= self.limit
+
+    def acquire(self, size):
+        self.used += size
+        self.peak = max(self.peak, self.used)
+
+    def release(self, size):
+        self.used -= size
+        self._released.set()
+
+    async def wait(self):
+        while self.exhausted:
+            self._released.clear()
+            await self._released.wait()
@@ -0,0 +1,308 @@
+import copy
+import subprocess
+import sys
+import time
+
+import bson
+from bson.raw_bson import RawBSONDocument
+
+# data types of generators.FAKER_GENERATORS and FORMAT_GENERATORS
+DATA_TYPES = (
+    "name",
+    "company",
+    "email",
+    "address",
+    "date",
+    "datestr",
+    "zipcode",
+    "statecode",
+    "lastname",
+    "lastnamefirstname",
+    "city",
+    "id",
+    "word",
+    "scramble",
+    "dateshift",
+    "statecodeshift",
+)
+# originals of the format preserving types, they return other values unchanged
+FORMAT_ORIGINALS = {
+    "scramble": "AB-1234",
+    "dateshift": "2023-01-01",
+    "statecodeshift": "NY",
+}
+
+
+def flat_document(i):
+    document = {
+        "_id": i,
+        "name": "John",
+        "email": "john.doe@example.com",
+        "city": "New York",
+        "zipcode": "10001",
+        "createdAt": "2023-01-01",
+    }
+    document.update({f"field{j}": f"value {j}" for j in range(20)})
+    return document
+
+
+def nested_document(i):
+    leaf = {"name": "John", "email": "john.doe@example.com", "other": 1}
+    document = leaf
+    for depth in range(6):
+        document = {f"level{depth}": document, f"sibling{depth}": {"value": depth}}
+    return dict(document, _id=i)
+
+
+def array_document(i):
+    return {
+        "_id": i,
+        "orders": [
+            {
+                "id": str(j),
+                "customer": {"name": "John", "email": "john.doe@example.com"},
+                "amount": j,
+            }
+            for j in range(50)
+        ],
+    }
+
+
+def wildcard_document(i):
+    document = {
+        f"claim{j}": {
+            "charges": [{"provider": "Dr. Smith", "code": k} for k in range(5)]
+        }
+        for j in range(20)
+    }
+    return dict(document, _id=i)
+
+
+# path of the leaf document of nested_document
+NESTED_PATH = ".".join(f"level{depth}" for depth in reversed(range(6)))
+
+# synthetic document generator and fields to anonymize of every shape
+SHAPES = {
+    "flat": (
+        flat_document,
+        {"name": "name", "email": "email", "city": "city", "zipcode": "zipcode"},
+    ),
+    "nested": (
+        nested_document,
+        {f"{NESTED_PATH}.name": "name", f"{NESTED_PATH}.email": "email"},
+    ),
+    "array": (
+        array_document,
+        {"orders.id": "id", "orders.customer.name": "name"},
+    ),
+    "wildcard": (wildcard_document, {"*.charges.provider": "lastname"}),
+}
+
+
+def peak_rss_mb(children=False):
+    """Peak RSS in MB of this process, or of its largest child process."""
+    try:
+        import resource
+    except ImportError:
+        # POSIX only, e.g. not on Windows
+        return float("nan")
+    who = resource.RUSAGE_CHILDREN if children else resource.RUSAGE_SELF
+    peak = resource.getrusage(who).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+class Result:
+    """Time taken by `count` values or documents, and `rss` MB of memory.
+
+    The peak RSS of a process only grows, so `rss` is how much a row raised
+    it, see measure, and 0 for a row that fits in the memory of earlier rows.
+    """
+
+    __slots__ = ("name", "count", "seconds", "rss")
+
+    def __init__(self, name, count, seconds, rss):
+        self.name = name
+        self.count = count
+        self.seconds = seconds
+        self.rss = rss
+
+    @property
+    def latency_us(self):
+        return self.seconds / self.count * 1e6
+
+    @property
+    def per_second(self):
+        return self.count / self.seconds if self.seconds else float("inf")
+
+
+def measure():
+    """Start of a row, passed to result once it's done."""
+    return time.perf_counter(), peak_rss_mb()
+
+
+def result(name, count, started):
+    seconds = time.perf_counter() - started[0]
+    return Result(name, count, seconds, peak_rss_mb() - started[1])
+
+
+def bench_data_types(count):
+    """Time generate_fake_data_different for every data type.
+
+    A value of every type is generated first, so the Faker instance and the
+    generator it builds on first use aren't timed.
+    """
+    from mongomasker_cli import main
+
+    results = []
+    for data_type in DATA_TYPES:
+        original = FORMAT_ORIGINALS.get(data_type)
+        main.generate_fake_data_different(data_type, original or 0)
+        started = measure()
+        for i in range(count):
+            main.generate_fake_data_different(data_type, original or i)
+        results.append(result(data_type, count, started))
+    return results
+
+
+def bench_shapes(count, shapes=SHAPES):
+    """Time anonymize_batch on the documents of every shape."""
+    from mongomasker_cli import main
+    from mongomasker_cli.plan import compile_fields
+
+    results = []
+    for name, (make_document, fields) in shapes.items():
+        plan = compile_fields(fields)
+        template = make_document(0)
+        documents = [copy.deepcopy(template) for _ in range(count)]
+        started = measure()
+        main.anonymize_batch(documents, plan)
+        results.append(result(name, count, started))
+    return results
+
+
+class MemoryCursor:
+    def __init__(self, documents, codec_options):
+        self.documents = documents
+        self.codec_options = codec_options
+
+    def sort(self, *args, **kwargs):
+        # documents are kept in _id order
+        return self
+
+    async def __aiter__(self):
+        raw = self.codec_options.document_class is RawBSONDocument
+        for data in self.documents:
+            if raw:
+                yield RawBSONDocument(data)
+            else:
+                yield bson.decode(data, self.codec_options)
+
+
+class MemoryCollection:
+    """In-memory stand-in for the parts of a motor collection used by a copy.
+
+    Documents are kept as BSON bytes and every find() returns all of them,
+    so the copy path is measured without a server.
+    """
+
+    def __init__(self, name, codec_options, documents=None):
+        self.full_name = f"bench.{name}"
+        self.codec_options = codec_options
+        self.documents = documents if documents is not None else []
+
+    def with_options(self, codec_options=None):
+        return MemoryCollection(
+            self.full_name.split(".", 1)[1],
+            codec_options or self.codec_options,
+            self.documents,
+        )
+
+    def find(self, query=None):
+        return MemoryCursor(self.documents, self.codec_options)
+
+    async def count_documents(self, query):
+        return len(self.documents)
+
+    async def estimated_document_count(self):
+        return len(self.documents)
+
+    async def insert_many(self, documents, ordered=True):
+        self.documents.extend(
+            (
+                document.raw
+                if isinstance(document, RawBSONDocument)
+                else bson.encode(document, codec_options=self.codec_options)
+            )
+            for document in documents
+        )
+
+
+async def bench_copy(count, options, shapes=SHAPES, database=None):
+    """Time copy_collection end to end for every shape.
+
+    Collections are kept in memory unless a motor `database` is given, its
+    bench_source and bench_target collections are dropped after every shape.
+    """
+    from mongomasker_cli import main
+    from mongomasker_cli.plan import compile_fields
+
+    results = []
+    for name, (make_document, fields) in shapes.items():
+        documents = [make_document(i) for i in range(count)]
+        if database is None:
+            source = MemoryCollection(
+                "source",
+                main.CODEC_OPTIONS,
+                [bson.encode(document) for document in documents],
+            )
+            target = MemoryCollection("target", main.CODEC_OPTIONS)
+        else:
+            source = database["bench_source"]
+            target = database["bench_target"]
+            await source.drop()
+            await target.drop()
+            await source.insert_many(documents)
+        try:
+            started = measure()
+            await main.copy_collection(
+                source, target, compile_fields(fields), {}, options
+            )
+            results.append(result(name, count, started))
+        finally:
+            if database is not None:
+                await source.drop()
+                await target.drop()
+    return results
+
+
+# modules that are imported on first use only, they take a large part of the
+# startup time
+LAZY_MODULES = ("faker", "motor", "pymongo")
+
+
+def bench_startup(runs):
+    """Time `runs` fresh interpreters importing the CLI, as every command does.
+
+    The memory of the result is the peak RSS of the interpreters rather than
+    growth of this process.
+    """
+    started = time.perf_counter()
+    for _ in range(runs):
+        subprocess.run(
+            [sys.executable, "-c", "import mongomasker_cli.main"], check=True
+        )
+    seconds = time.perf_counter() - started
+    return [Result("import", runs, seconds, peak_rss_mb(children=True))]
+
+
+def format_results(title, results, unit="doc", rss="peak RSS +MB"):
+    lines = [
+        f"{title:<20}{'us/' + unit:>12}{unit + 's/s':>14}{rss:>14}",
+    ]
+    for row in results:
+        lines.append(
+            f"{row.name:<20}{row.latency_us:>12.2f}"
+            f"{row.per_second:>14.0f}{row.rss:>14.1f}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,169 @@
+import os
+import uuid
+from datetime import datetime
+
+from bson import json_util
+from bson.binary import Binary
+from bson.decimal128 import Decimal128
+from bson.int64 import Int64
+from bson.max_key import MaxKey
+from bson.min_key import MinKey
+from bson.objectid import ObjectId
+from bson.regex import Regex
+from bson.timestamp import Timestamp
+
+JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS
+
+# $type aliases in BSON comparison order, types of the same group compare with
+# each other
+_TYPE_ORDER = [
+    ["minKey"],
+    ["null"],
+    ["double", "int", "long", "decimal"],
+    ["symbol", "string"],
+    ["object"],
+    ["array"],
+    ["binData"],
+    ["objectId"],
+    ["bool"],
+    ["date"],
+    ["timestamp"],
+    ["regex"],
+    ["maxKey"],
+]
+
+
+def _type_group(value):
+    if value is None:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float, Int64, Decimal128)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, dict):
+        return 4
+    if isinstance(value, (bytes, Binary, uuid.UUID)):
+        return 6
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    if isinstance(value, Timestamp):
+        return 10
+    if isinstance(value, Regex):
+        return 11
+    if isinstance(value, MinKey):
+        return 0
+    if isinstance(value, MaxKey):
+        return 12
+    raise TypeError(f"unsupported _id type {type(value).__name__}")
+
+
+def after_id_filter(last_id):
+    """Filter matching the _id values sorted after `last_id`.
+
+    A range query only matches values of the same type, so values of every type
+    sorted after the type of `last_id` are matched with $type.
+    """
+    later_types = [
+        alias for group in _TYPE_ORDER[_type_group(last_id) + 1 :] for alias in group
+    ]
+    condition = {"_id": {"$gt": last_id}}
+    if not later_types:
+        return condition
+    return {"$or": [condition, {"_id": {"$type": later_types}}]}
+
+
+class Checkpoint:
+    """Progress of a copy, saved to a file after every acknowledged batch.
+
+    Every partition of the source records the highest _id up to which all
+    documents have been written. The cursors are sorted by _id, but batches
+    may be written out of order, so a batch only moves that _id forward once
+    all batches read before it have been written too.
+    """
+
+    def __init__(
+        self, path, source, target, filter_dict, partitions, done=False, indexes=None
+    ):
+        self.path = path
+        self.source = source
+        self.target = target
+        self.filter = filter_dict
+        # dicts with the "filter" of the partition and the "last_id" written
+        self.partitions = partitions
+        self.done = done
+        # documents of the indexes dropped from the target until the copy is
+        # done, see indexes.defer_indexes
+        self.indexes = indexes or []
+        # per partition: last _id of the batches read but not yet committed,
+        # the sequence numbers written out of order and the next to commit
+        self._read = [{} for _ in partitions]
+        self._written = [set() for _ in partitions]
+        self._next = [0 for _ in partitions]
+
+    @classmethod
+    def create(cls, path, source, target, filter_dict, partition_filters):
+        partitions = [{"filter": query, "last_id": None} for query in partition_filters]
+        return cls(path, source, target, filter_dict, partitions)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as checkpoint_file:
+            state = json_util.loads(checkpoint_file.read(), json_options=JSON_OPTIONS)
+        return cls(
+            path,
+            state["source"],
+            state["target"],
+            state["filter"],
+            state["partitions"],
+            state["done"],
+            state.get("indexes"),
+        )
+
+    def save(self):
+        state = {
+            "source": self.source,
+            "target": self.target,
+            "filter": self.filter,
+            "partitions": self.partitions,
+            "done": self.done,
+            "indexes": self.indexes,
+        }
+        # write and rename, a crash never leaves a partial checkpoint behind
+        temporary_path = f"{self.path}.tmp"
+        with open(temporary_path, "w") as checkpoint_file:
+            checkpoint_file.write(json_util.dumps(state, json_options=JSON_OPTIONS))
+        os.replace(temporary_path, self.path)
+
+    def queries(self):
+        """Queries reading the documents not written yet, one per partition."""
+        queries = []
+        for partition in self.partitions:
+            if partition["last_id"] is None:
+                queries.append(partition["filter"])
+                continue
+            resume = after_id_filter(partition["last_id"])
+            if partition["filter"]:
+                resume = {"$and": [partition["filter"], resume]}
+            queries.append(resume)
+        return queries
+
+    def batch_read(self, batch):
+        self._read[batch.source][batch.sequence] = batch.documents[-1]["_id"]
+
+    def batch_written(self, batch):
+        source = batch.source
+        self._written[source].add(batch.sequence)
+        partition = self.partitions[source]
+        while self._next[source] in self._written[source]:
+            self._written[source].remove(self._next[source])
+            partition["last_id"] = self._read[source].pop(self._next[source])
+            self._next[source] += 1
+        self.save()
+
+    def finish(self):
+        self.done = True
+        self.save()
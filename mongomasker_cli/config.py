@@ -0,0 +1,110 @@
+import json
+from pathlib import Path
+
+from mongomasker_cli.links import link_data_type
+from mongomasker_cli.plan import compile_fields
+
+
+class ConfigError(Exception):
+    pass
+
+
+class CollectionJob:
+    """One collection of a multi-collection config."""
+
+    __slots__ = ("source", "target", "fields", "filter")
+
+    def __init__(self, source, target, fields, filter_dict):
+        self.source = source
+        self.target = target
+        self.fields = fields
+        self.filter = filter_dict
+
+
+def load_config(config_file):
+    """Read the config of a multi-collection copy.
+
+    The config maps source collections to their fields to anonymize, either
+    inline or as the path of a fields JSON file relative to the config:
+
+        {
+            "source_db": "crm",
+            "target_db": "crm_masked",
+            "collections": {
+                "people": {"fields": {"name": "name"}, "filter": {"active": true}},
+                "orders": {"fields": "orders_fields.json", "target": "orders_2024"}
+            },
+            "links": {
+                "customer": {
+                    "type": "id",
+                    "fields": {"people": ["customerId"], "orders": ["customer.id"]}
+                }
+            }
+        }
+
+    The optional links give fields of several collections the data type
+    "link:<name>:<type>", so that an original value is masked alike in all of
+    them, see generators.LinkGenerator.
+
+    Returns the source and target database names and a CollectionJob per
+    collection.
+    """
+    path = Path(config_file.name)
+    try:
+        config = json.load(config_file)
+    except json.JSONDecodeError as exc:
+        raise ConfigError(f"{path} is not valid JSON: {exc}")
+    for key in ("source_db", "target_db", "collections"):
+        if key not in config:
+            raise ConfigError(f"{path} has no {key}")
+
+    fields_by_source = {}
+    for source, spec in config["collections"].items():
+        if not isinstance(spec, dict) or "fields" not in spec:
+            raise ConfigError(f"collection {source} has no fields")
+        fields = spec["fields"]
+        if isinstance(fields, str):
+            with open(path.parent / fields) as fields_file:
+                fields = json.load(fields_file)
+        fields_by_source[source] = dict(fields)
+    _add_links(config.get("links", {}), fields_by_source)
+
+    jobs = []
+    for source, spec in config["collections"].items():
+        jobs.append(
+            CollectionJob(
+                source,
+                spec.get("target", source),
+                compile_fields(fields_by_source[source]),
+                spec.get("filter", {}),
+            )
+        )
+    targets = [job.target for job in jobs]
+    if config["source_db"] == config["target_db"] and set(targets) & set(
+        config["collections"]
+    ):
+        raise ConfigError("a collection would be copied onto a source collection")
+    if len(set(targets)) != len(targets):
+        raise ConfigError("two collections are copied to the same target")
+    return config["source_db"], config["target_db"], jobs
+
+
+def _add_links(links, fields_by_source):
+    for name, link in links.items():
+        if ":" in name:
+            raise ConfigError(f"link {name} has a : in its name")
+        if not isinstance(link, dict) or "type" not in link or "fields" not in link:
+            raise ConfigError(f"link {name} needs a type and fields")
+        data_type = link_data_type(name, link["type"])
+        for source, paths in link["fields"].items():
+            if source not in fields_by_source:
+                raise ConfigError(
+                    f"link {name} has fields of unknown collection {source}"
+                )
+            fields = fields_by_source[source]
+            for field in paths:
+                if fields.get(field, data_type) != data_type:
+                    raise ConfigError(
+                        f"{source}.{field} is linked by {name} and has type {fields[field]}"
+                    )
+                fields[field] = data_type
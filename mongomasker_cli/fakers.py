@@ -0,0 +1,73 @@
+# Faker provider modules every data type needs, other data types get a lorem
+# word. Faker falls back to all its default providers when given none, so
+# "id", which only needs random_number of the base provider, loads lorem too
+PROVIDERS = {
+    "name": ("person",),
+    "lastname": ("person",),
+    "lastnamefirstname": ("person",),
+    "company": ("company", "person"),
+    "email": ("company", "internet", "person"),
+    "address": ("address", "person"),
+    "city": ("address", "person"),
+    "zipcode": ("address",),
+    "statecode": ("address",),
+    "date": ("date_time",),
+    "datestr": ("date_time",),
+    "id": ("lorem",),
+}
+DEFAULT_PROVIDERS = ("lorem",)
+
+
+class Fakers:
+    """Faker instances by data type, built on first use.
+
+    Importing faker and loading all of its default providers takes a large
+    part of the startup time, so faker is only imported once a value is
+    generated and every instance only loads the providers of PROVIDERS. Data
+    types needing the same providers share an instance. Every instance is
+    seeded with `seed` and uses `locale` (default: Faker's, en_US).
+    """
+
+    def __init__(self, seed=None, locale=None):
+        self.seed = seed
+        self.locale = locale
+        self.by_data_type = {}
+        self.by_providers = {}
+
+    def __getitem__(self, data_type):
+        fake = self.by_data_type.get(data_type)
+        if fake is None:
+            providers = PROVIDERS.get(data_type, DEFAULT_PROVIDERS)
+            fake = self.by_providers.get(providers)
+            if fake is None:
+                fake = self.by_providers[providers] = self._create(providers)
+            self.by_data_type[data_type] = fake
+        return fake
+
+    def _create(self, providers):
+        from faker import Faker
+
+        fake = Faker(
+            self.locale, providers=[f"faker.providers.{name}" for name in providers]
+        )
+        fake.seed_instance(self.seed)
+        return fake
+
+
+def numeric_zipcodes(fake):
+    """Whether `fake` uses en_US, whose zip codes are generated as numbers."""
+    return fake.locales == ["en_US"]
+
+
+def zipcode(fake):
+    """A zip code or postcode of the locale of `fake`."""
+    # zipcode is en_US's and a few others', the other locales have a postcode
+    if hasattr(fake, "zipcode"):
+        return fake.zipcode()
+    return fake.postcode()
+
+
+def available_locales():
+    from faker.config import AVAILABLE_LOCALES
+
+    return AVAILABLE_LOCALES
@@ -0,0 +1,205 @@
+import gzip
+import io
+import mmap
+import os
+import struct
+
+import bson
+from bson import json_util
+from bson.raw_bson import RawBSONDocument
+
+_INT32 = struct.Struct("<i")
+
+# extended JSON written to NDJSON files, the mongoexport default
+JSON_OPTIONS = json_util.RELAXED_JSON_OPTIONS
+
+COMPRESSIONS = {".gz": "gzip", ".zst": "zstd", ".zstd": "zstd"}
+FORMATS = {".bson": "bson", ".json": "ndjson", ".ndjson": "ndjson", ".jsonl": "ndjson"}
+
+
+def file_format(path):
+    """(format, compression) of a file, from its suffixes, e.g. people.bson.gz."""
+    suffixes = [suffix.lower() for suffix in os.path.basename(path).split(".")[1:]]
+    compression = None
+    if suffixes and f".{suffixes[-1]}" in COMPRESSIONS:
+        compression = COMPRESSIONS[f".{suffixes.pop()}"]
+    if not suffixes or f".{suffixes[-1]}" not in FORMATS:
+        raise ValueError(
+            f"{path}: unknown format, use one of {', '.join(FORMATS)} "
+            f"optionally followed by {', '.join(COMPRESSIONS)}"
+        )
+    return FORMATS[f".{suffixes[-1]}"], compression
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError:
+        raise ValueError(
+            "zstd files need the zstandard package, pip install mongomasker_cli[zstd]"
+        )
+    return zstandard
+
+
+def _open_read(path, compression):
+    if compression == "gzip":
+        return gzip.open(path, "rb")
+    if compression == "zstd":
+        reader = _zstandard().ZstdDecompressor().stream_reader(open(path, "rb"))
+        return io.BufferedReader(reader)
+    return open(path, "rb")
+
+
+def _open_write(path, compression):
+    if compression == "gzip":
+        return gzip.open(path, "wb")
+    if compression == "zstd":
+        return _zstandard().ZstdCompressor().stream_writer(open(path, "wb"))
+    return open(path, "wb")
+
+
+def json_options(codec_options):
+    """JSON_OPTIONS decoding and encoding like `codec_options`."""
+    return JSON_OPTIONS.with_options(
+        tz_aware=codec_options.tz_aware,
+        uuid_representation=codec_options.uuid_representation,
+        datetime_conversion=codec_options.datetime_conversion,
+    )
+
+
+def _bson_documents_mmap(data):
+    position = 0
+    while position < len(data):
+        size = _INT32.unpack_from(data, position)[0]
+        if size < 5 or position + size > len(data):
+            raise bson.errors.InvalidBSON(f"truncated document at byte {position}")
+        yield data[position : position + size]
+        position += size
+
+
+def _bson_documents_stream(stream):
+    while True:
+        header = stream.read(4)
+        if not header:
+            return
+        size = _INT32.unpack(header)[0] if len(header) == 4 else 0
+        body = stream.read(size - 4) if size >= 5 else b""
+        if len(body) != size - 4:
+            raise bson.errors.InvalidBSON("truncated document at the end of the file")
+        yield header + body
+
+
+def count_documents(path):
+    """Number of documents of an uncompressed BSON file, None for other files.
+
+    Only the length prefixes are read, so counting is cheap.
+    """
+    if file_format(path) != ("bson", None) or os.path.getsize(path) == 0:
+        return None
+    count = position = 0
+    with open(path, "rb") as file, mmap.mmap(
+        file.fileno(), 0, access=mmap.ACCESS_READ
+    ) as data:
+        # from length prefix to length prefix, the documents aren't copied
+        end = len(data)
+        while position < end:
+            size = _INT32.unpack_from(data, position)[0]
+            if size < 5 or position + size > end:
+                raise bson.errors.InvalidBSON(f"truncated document at byte {position}")
+            position += size
+            count += 1
+    return count
+
+
+class FileSource:
+    """Documents of a BSON (mongodump) or NDJSON file, as an async iterable.
+
+    Uncompressed BSON files are memory-mapped and cut at the length prefix of
+    every document; compressed files are decompressed as a stream. Only the
+    documents being iterated are in memory, whatever the size of the file.
+    Documents are RawBSONDocuments when `raw` is set, dicts decoded with
+    `codec_options` otherwise.
+    """
+
+    def __init__(self, path, codec_options, raw=False):
+        self.path = path
+        self.format, self.compression = file_format(path)
+        self.codec_options = codec_options
+        self.raw = raw
+
+    def _documents(self):
+        # BSON bytes, or dicts for NDJSON
+        if self.format == "ndjson":
+            options = json_options(self.codec_options)
+            with _open_read(self.path, self.compression) as stream:
+                for line in stream:
+                    if line.strip():
+                        yield json_util.loads(line, json_options=options)
+        elif self.compression is None:
+            if os.path.getsize(self.path) == 0:
+                return
+            with open(self.path, "rb") as file, mmap.mmap(
+                file.fileno(), 0, access=mmap.ACCESS_READ
+            ) as data:
+                if hasattr(data, "madvise"):
+                    data.madvise(mmap.MADV_SEQUENTIAL)
+                yield from _bson_documents_mmap(data)
+        else:
+            with _open_read(self.path, self.compression) as stream:
+                yield from _bson_documents_stream(stream)
+
+    async def __aiter__(self):
+        for document in self._documents():
+            if isinstance(document, dict):
+                if self.raw:
+                    document = RawBSONDocument(
+                        bson.encode(document, codec_options=self.codec_options)
+                    )
+                yield document
+            elif self.raw:
+                yield RawBSONDocument(document)
+            else:
+                yield bson.decode(document, self.codec_options)
+
+
+class FileSink:
+    """Write masked documents to a BSON or NDJSON file, usable as a write stage.
+
+    The file is written to a temporary path and renamed on close, so an
+    interrupted run doesn't leave a truncated file behind.
+    """
+
+    def __init__(self, path, codec_options):
+        self.path = path
+        self.format, self.compression = file_format(path)
+        self.codec_options = codec_options
+        self.json_options = json_options(codec_options)
+        self.temporary_path = f"{path}.tmp"
+        self.stream = _open_write(self.temporary_path, self.compression)
+
+    async def write(self, documents):
+        if self.format == "bson":
+            self.stream.write(
+                b"".join(
+                    (
+                        document.raw
+                        if isinstance(document, RawBSONDocument)
+                        else bson.encode(document, codec_options=self.codec_options)
+                    )
+                    for document in documents
+                )
+            )
+        else:
+            self.stream.write(
+                "".join(
+                    json_util.dumps(document, json_options=self.json_options) + "\n"
+                    for document in documents
+                ).encode()
+            )
+
+    def close(self, keep=True):
+        self.stream.close()
+        if keep:
+            os.replace(self.temporary_path, self.path)
+        else:
+            os.remove(self.temporary_path)
@@ -0,0 +1,123 @@
+import string
+from datetime import date, datetime, timedelta
+
+# the dates of "dateshift" move by 1 to this many days, back or forward
+MAX_SHIFT_DAYS = 365
+
+# codes of the US states and DC, the values of "statecodeshift"
+STATE_CODES = tuple("""
+    AL AK AZ AR CA CO CT DE DC FL GA HI ID IL IN IA KS KY LA ME MD MA MI MN MS MO
+    MT NE NV NH NJ NM NY NC ND OH OK OR PA RI SC SD TN TX UT VT VA WA WV WI WY
+    """.split())
+_STATE_INDEX = {code: i for i, code in enumerate(STATE_CODES)}
+
+# characters of a class are replaced by others of the same class
+_CLASSES = {
+    character: (characters, i)
+    for characters in (string.digits, string.ascii_lowercase, string.ascii_uppercase)
+    for i, character in enumerate(characters)
+}
+_NON_ZERO = string.digits[1:]
+# largest absolute values of the BSON int32 and int64 types, an int is encoded
+# as the smallest of the two it fits in
+_INT32_MAX = 2**31 - 1
+_INT64_MAX = 2**63 - 1
+
+
+def _other(characters, index, random):
+    # any character of `characters` but the one at `index`
+    # random() rather than randrange(), it is several times faster
+    size = len(characters)
+    return characters[(index + 1 + int(random.random() * (size - 1))) % size]
+
+
+def scramble(value, random):
+    """Replace every ASCII letter and digit of `value` by another of its class.
+
+    Other characters, e.g. separators, are kept, so "AB-1234" gives another
+    two uppercase letters, a dash and four digits. An int gives an int with as
+    many digits. The result differs from any value with a letter or digit;
+    other values, e.g. dates, are returned as they are.
+
+    An int stays in the range of its BSON type, int32 or int64, so scrambled
+    values encode as the same type.
+    """
+    if isinstance(value, bool) or not isinstance(value, (str, int)):
+        return value
+    if isinstance(value, int):
+        # the result stays in the BSON type of the value, negative values
+        # reach one further
+        limit = _INT32_MAX if -_INT32_MAX - 1 <= value <= _INT32_MAX else _INT64_MAX
+        limit += value < 0
+        digits = str(abs(value))
+        if len(digits) > 1:
+            # no leading zero, it would drop a digit
+            first = _other(_NON_ZERO, _NON_ZERO.index(digits[0]), random)
+            rest = scramble(digits[1:], random)
+            if int(first + rest) > limit:
+                # another first digit within the limit, or the value's own,
+                # which is within it whenever no other is
+                size = 10 ** len(rest)
+                firsts = [
+                    digit
+                    for digit in _NON_ZERO
+                    if digit != digits[0] and int(digit) * size + int(rest) <= limit
+                ]
+                first = (
+                    firsts[int(random.random() * len(firsts))] if firsts else digits[0]
+                )
+            digits = first + rest
+        else:
+            digits = scramble(digits, random)
+        # e.g. Int64, which is always encoded as an int64
+        return type(value)(-int(digits) if value < 0 else int(digits))
+    characters = []
+    for character in value:
+        found = _CLASSES.get(character)
+        if found is not None:
+            character = _other(*found, random)
+        characters.append(character)
+    return "".join(characters)
+
+
+def _shift_days(random, max_days):
+    days = int(random.random() * 2 * max_days) - max_days
+    return days + 1 if days >= 0 else days
+
+
+def shift_date(value, random, max_days=MAX_SHIFT_DAYS):
+    """Move a date by 1 to `max_days` days, back or forward.
+
+    Datetimes keep their time and timezone, and strings starting with an ISO
+    date, e.g. "2023-01-01" or "2023-01-01T10:00:00Z", keep the rest of the
+    string. Other values are returned as they are.
+    """
+    if isinstance(value, (datetime, date)):
+        days = timedelta(days=_shift_days(random, max_days))
+        try:
+            return value + days
+        except OverflowError:
+            # near year 1 or 9999, the other way is in range
+            return value - days
+    if isinstance(value, str):
+        try:
+            day = date.fromisoformat(value[:10])
+        except ValueError:
+            return value
+        return shift_date(day, random, max_days).isoformat() + value[10:]
+    return value
+
+
+def shift_state_code(value, random):
+    """Another code of STATE_CODES for a state code, in the case of `value`.
+
+    Any other string gets a random state code. Other values are returned as
+    they are.
+    """
+    if not isinstance(value, str):
+        return value
+    index = _STATE_INDEX.get(value.upper())
+    if index is None:
+        return STATE_CODES[int(random.random() * len(STATE_CODES))]
+    code = _other(STATE_CODES, index, random)
+    return code.lower() if value.islower() else code
@@ -0,0 +1,412 @@
+from datetime import datetime
+from importlib.metadata import entry_points
+from operator import methodcaller
+from random import Random
+
+from mongomasker_cli.aggregation import TRANSFORMS
+from mongomasker_cli.fakers import numeric_zipcodes, zipcode
+from mongomasker_cli.formats import scramble, shift_date, shift_state_code
+from mongomasker_cli.links import parse_link
+from mongomasker_cli.pools import FILLERS
+
+# entry point group of the generators installed by other packages, e.g. in a
+# pyproject.toml:
+#
+#     [project.entry-points."mongomasker_cli.generators"]
+#     phone = "my_package.masking:phone_generator"
+ENTRY_POINT_GROUP = "mongomasker_cli.generators"
+# data type of the values generated for unknown data types
+DEFAULT_DATA_TYPE = "word"
+# default number of originals a DictionaryGenerator maps
+DEFAULT_DICTIONARY_SIZE = 100_000
+
+
+class Generator:
+    """Fake values of one data type.
+
+    `one(original)` returns a value different from `original`, `many(originals)`
+    a list with a value for every original at once, which subclasses override
+    when they can generate in bulk.
+    """
+
+    def one(self, original):
+        raise NotImplementedError
+
+    def many(self, originals):
+        one = self.one
+        return [one(original) for original in originals]
+
+
+class FakerGenerator(Generator):
+    """Values of `value(fake)`, regenerated while equal to the original.
+
+    `fill(fake, size)`, if given, generates `size` values at once for many().
+    """
+
+    def __init__(self, fake, value, fill=None):
+        self.fake = fake
+        self.value = value
+        self.fill = fill
+
+    def one(self, original):
+        new_value = self.value(self.fake)
+        while new_value == original:
+            new_value = self.value(self.fake)
+        return new_value
+
+    def many(self, originals):
+        if self.fill is None:
+            return super().many(originals)
+        values = self.fill(self.fake, len(originals))
+        for i, original in enumerate(originals):
+            if values[i] == original:
+                values[i] = self.one(original)
+        return values
+
+
+class TransformGenerator(Generator):
+    """Values computed from the original by `transform`, see TRANSFORMS."""
+
+    def __init__(self, transform):
+        self.one = transform
+
+
+class PooledGenerator(Generator):
+    """Values of a data type taken from ValuePools."""
+
+    def __init__(self, pools, data_type):
+        self.pools = pools
+        self.data_type = data_type
+
+    def one(self, original):
+        new_value = self.pools.take(self.data_type)
+        while new_value == original:
+            new_value = self.pools.take(self.data_type)
+        return new_value
+
+
+class PseudonymGenerator(Generator):
+    """Values of a data type mapped from the original by a Pseudonymizer."""
+
+    def __init__(self, pseudonymizer, data_type):
+        self.pseudonymizer = pseudonymizer
+        self.data_type = data_type
+
+    def one(self, original):
+        return self.pseudonymizer.mask(self.data_type, original)
+
+
+class FormatGenerator(Generator):
+    """Values of `transform(original, random)`, one of the formats functions.
+
+    `random` is the run's seeded Random; with a Pseudonymizer it is seeded with
+    the keyed digest of the original instead, so equal originals get equal
+    values in every run with the same key.
+    """
+
+    def __init__(self, transform, data_type, random, pseudonymizer=None):
+        self.transform = transform
+        self.data_type = data_type
+        self.random = random
+        self.pseudonymizer = pseudonymizer
+
+    def one(self, original):
+        if self.pseudonymizer is None:
+            return self.transform(original, self.random)
+        digest = self.pseudonymizer.digest(self.data_type, original)
+        return self.transform(original, Random(digest))
+
+
+class DictionaryGenerator(Generator):
+    """Values of `generator` mapped once per distinct original.
+
+    Meant for fields with few distinct values, which are then masked by a
+    dictionary lookup and mask equal originals alike. Up to `max_size`
+    originals are mapped, the values of further originals are generated every
+    time. `misses` counts the values generated and `hits` the values masked
+    by a lookup.
+    """
+
+    def __init__(self, generator, max_size=DEFAULT_DICTIONARY_SIZE):
+        self.generator = generator
+        self.max_size = max_size
+        self.values = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def add(self, originals):
+        """Map `originals` ahead of masking, generating their values at once."""
+        # lookups of the masking only, which may have started, e.g. in another
+        # collection of copy-many
+        hits, misses = self.hits, self.misses
+        self.many(originals)
+        self.hits, self.misses = hits, misses
+
+    def one(self, original):
+        return self.many([original])[0]
+
+    def many(self, originals):
+        values = self.values
+        masked = []
+        # indices of the originals missing from the dictionary, by key
+        missing = {}
+        for i, original in enumerate(originals):
+            # the type keeps e.g. 1 and True apart
+            key = (type(original), original)
+            try:
+                masked.append(values[key])
+                continue
+            except KeyError:
+                pass
+            except TypeError:
+                # e.g. embedded documents, an index is their key
+                key = i
+            missing.setdefault(key, []).append(i)
+            masked.append(None)
+        if not missing:
+            self.hits += len(originals)
+            return masked
+        new_values = self.generator.many(
+            [originals[indices[0]] for indices in missing.values()]
+        )
+        for (key, indices), value in zip(missing.items(), new_values):
+            for i in indices:
+                masked[i] = value
+            if len(values) < self.max_size and key.__class__ is tuple:
+                values[key] = value
+        # a value generated for the batch counts as a miss, its repeats as hits
+        self.hits += len(originals) - len(missing)
+        self.misses += len(missing)
+        return masked
+
+
+class LinkGenerator(Generator):
+    """Values of `generator` mapped once per original in a MappingStore.
+
+    Every field of the link `name` maps through the same store, so an
+    original gets the same value in all of them, e.g. a customer id in the
+    customers and the orders collections.
+    """
+
+    def __init__(self, store, name, generator):
+        self.store = store
+        self.name = name
+        self.generator = generator
+
+    def one(self, original):
+        return self.many([original])[0]
+
+    def many(self, originals):
+        key = self.store.key
+        keys = [key(original) for original in originals]
+        values = self.store.get_many(self.name, keys)
+        missing = {}
+        for key, original in zip(keys, originals):
+            if key not in values:
+                missing[key] = original
+        if missing:
+            new_values = self.generator.many(list(missing.values()))
+            values.update(
+                self.store.put_many(self.name, dict(zip(missing, new_values)))
+            )
+        return [values[key] for key in keys]
+
+
+def _faker(value, fill=None):
+    def factory(generators, data_type):
+        return FakerGenerator(generators.fakers[data_type], value, fill)
+
+    return factory
+
+
+def _date(fake):
+    return datetime.strptime(fake.date(), "%Y-%m-%d")
+
+
+def _lastnamefirstname(fake):
+    return fake.last_name() + "," + fake.first_name()
+
+
+def _id(fake):
+    # numeric string
+    return str(fake.random_number(digits=10))
+
+
+def _zipcode(generators, data_type):
+    fake = generators.fakers[data_type]
+    if numeric_zipcodes(fake):
+        return FakerGenerator(fake, methodcaller("zipcode"), FILLERS["zipcode"])
+    # the locale's own format, one value at a time like the pools and the
+    # pseudonymizer
+    return FakerGenerator(fake, zipcode)
+
+
+def _transform(transform):
+    def factory(generators, data_type):
+        return TransformGenerator(transform)
+
+    return factory
+
+
+# Factories of the built-in Faker generators, by data type. A factory is called
+# with the Generators of the run and the data type, and returns a Generator
+FAKER_GENERATORS = {
+    "name": _faker(methodcaller("first_name")),
+    "company": _faker(methodcaller("company")),
+    "email": _faker(methodcaller("email")),
+    "address": _faker(methodcaller("address")),
+    "date": _faker(_date, FILLERS["date"]),
+    "datestr": _faker(methodcaller("date"), FILLERS["datestr"]),
+    "zipcode": _zipcode,
+    "statecode": _faker(methodcaller("state_abbr")),
+    "lastname": _faker(methodcaller("last_name")),
+    "lastnamefirstname": _faker(_lastnamefirstname),
+    "city": _faker(methodcaller("city")),
+    "id": _faker(_id, FILLERS["id"]),
+    DEFAULT_DATA_TYPE: _faker(methodcaller("word")),
+}
+
+
+def _format(transform):
+    def factory(generators, data_type):
+        return FormatGenerator(
+            transform,
+            data_type,
+            Random(generators.fakers.seed),
+            generators.pseudonymizer,
+        )
+
+    return factory
+
+
+# Format preserving types, computed from the original without Faker and
+# different from it without regenerating, see formats
+FORMAT_GENERATORS = {
+    "scramble": _format(scramble),
+    "dateshift": _format(shift_date),
+    "statecodeshift": _format(shift_state_code),
+}
+
+GENERATORS = dict(FAKER_GENERATORS)
+GENERATORS.update(
+    (data_type, _transform(transform)) for data_type, transform in TRANSFORMS.items()
+)
+GENERATORS.update(FORMAT_GENERATORS)
+
+# entry points by name, listed on first use
+_entry_points = None
+
+
+def register(data_type, factory=None):
+    """Register the generator factory of `data_type`, also as a decorator.
+
+    `factory(generators, data_type)` returns the Generator of the data type,
+    `generators` is the Generators of the run. `generators.fakers[data_type]`
+    only has the Faker providers fakers.PROVIDERS lists for the data type,
+    lorem for a new one unless added there.
+    """
+    if factory is None:
+        return lambda factory: register(data_type, factory)
+    GENERATORS[data_type] = factory
+    return factory
+
+
+def generator_factory(data_type):
+    """Factory of `data_type`, None for an unknown data type.
+
+    Installed entry points come first, so a package can replace a built-in
+    generator; they are only imported when their data type is used.
+    """
+    global _entry_points
+    if _entry_points is None:
+        _entry_points = {
+            entry_point.name: entry_point
+            for entry_point in entry_points(group=ENTRY_POINT_GROUP)
+        }
+    entry_point = _entry_points.get(data_type)
+    if entry_point is not None:
+        return entry_point.load()
+    return GENERATORS.get(data_type)
+
+
+class Generators:
+    """The Generator of every data type, resolved once and cached.
+
+    Faker data types take their values from `pools` or `pseudonymizer` when
+    given, the ValuePools and Pseudonymizer of the run; transforms and
+    registered generators are used as they are. Unknown data types generate
+    words, `on_unknown(data_type)` is called the first time one is resolved.
+
+    The fields of `dictionary_paths` are masked by a DictionaryGenerator of
+    `dictionary_size` originals per path and data type, which maps the
+    originals of `dictionary_originals[path]`, if any, when it is created.
+
+    The data types "link:<name>:<data type>" generate values of the data type
+    mapped in the MappingStore `links`, see LinkGenerator.
+    """
+
+    def __init__(
+        self,
+        fakers,
+        pools=None,
+        pseudonymizer=None,
+        on_unknown=None,
+        dictionary_paths=(),
+        dictionary_size=DEFAULT_DICTIONARY_SIZE,
+        dictionary_originals=None,
+        links=None,
+    ):
+        self.fakers = fakers
+        self.pools = pools
+        self.pseudonymizer = pseudonymizer
+        self.on_unknown = on_unknown
+        self.resolved = {}
+        self.dictionary_paths = frozenset(dictionary_paths)
+        self.dictionary_size = dictionary_size
+        self.dictionary_originals = dict(dictionary_originals or {})
+        # DictionaryGenerator by (path, data type), collections may give a
+        # path different data types
+        self.dictionaries = {}
+        self.links = links
+
+    def __getitem__(self, data_type):
+        generator = self.resolved.get(data_type)
+        if generator is None:
+            generator = self.resolved[data_type] = self._resolve(data_type)
+        return generator
+
+    def field(self, path, data_type):
+        """Generator of the field at `path`, of type `data_type`."""
+        if path not in self.dictionary_paths:
+            return self[data_type]
+        key = (path, data_type)
+        dictionary = self.dictionaries.get(key)
+        if dictionary is None:
+            dictionary = self.dictionaries[key] = DictionaryGenerator(
+                self[data_type], self.dictionary_size
+            )
+            dictionary.add(self.dictionary_originals.pop(path, ()))
+        return dictionary
+
+    def _resolve(self, data_type):
+        link = parse_link(data_type)
+        if link is not None and self.links is not None:
+            name, link_type = link
+            return LinkGenerator(self.links, name, self[link_type])
+        factory = generator_factory(data_type)
+        if factory is None:
+            if self.on_unknown is not None:
+                self.on_unknown(data_type)
+        elif factory is not FAKER_GENERATORS.get(data_type):
+            return factory(self, data_type)
+        # the pools and the pseudonymizer fall back to words themselves
+        if self.pseudonymizer is not None:
+            return PseudonymGenerator(self.pseudonymizer, data_type)
+        if self.pools is not None:
+            return PooledGenerator(self.pools, data_type)
+        return (factory or GENERATORS[DEFAULT_DATA_TYPE])(self, data_type)
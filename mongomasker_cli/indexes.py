@@ -0,0 +1,84 @@
+# collection options that can only be given when the collection is created
+CREATE_OPTIONS = (
+    "capped",
+    "size",
+    "max",
+    "collation",
+    "timeseries",
+    "expireAfterSeconds",
+    "clusteredIndex",
+    "changeStreamPreAndPostImages",
+    "storageEngine",
+    "indexOptionDefaults",
+)
+# applied with collMod once the documents are written, collMod doesn't
+# validate the documents already there so the copy isn't slowed down or
+# stopped by masked values the validator rejects
+VALIDATION_OPTIONS = ("validator", "validationLevel", "validationAction")
+
+
+def index_models(indexes):
+    """IndexModels recreating the secondary indexes of list_indexes()."""
+    from pymongo import IndexModel
+
+    models = []
+    for index in indexes:
+        if index["name"] == "_id_":
+            continue
+        options = {
+            name: value
+            for name, value in index.items()
+            if name not in ("key", "v", "ns")
+        }
+        models.append(IndexModel(list(index["key"].items()), **options))
+    return models
+
+
+async def defer_indexes(source, target):
+    """Drop the secondary indexes of `target`, returns the ones to build later.
+
+    Those are the indexes of `source` and the indexes only `target` had, so
+    that nothing is lost. Inserts then only maintain the _id index.
+    """
+    source_models = index_models(await source.list_indexes().to_list(None))
+    target_models = index_models(await target.list_indexes().to_list(None))
+    names = {model.document["name"] for model in source_models}
+    models = source_models + [
+        model for model in target_models if model.document["name"] not in names
+    ]
+    if target_models:
+        await target.drop_indexes()
+    return models
+
+
+async def build_indexes(target, models):
+    # a single createIndexes builds them all in one scan of the collection
+    if models:
+        await target.create_indexes(models)
+
+
+async def create_target(source, target):
+    """Create `target` with the options of `source`, returns its validation
+    options to apply with apply_validation once the copy is done.
+
+    Returns None if `target` already exists, its options are left as they are.
+    """
+    options = await source.options()
+    if target.name in await target.database.list_collection_names(
+        filter={"name": target.name}
+    ):
+        return None
+    create_options = {name: options[name] for name in CREATE_OPTIONS if name in options}
+    if "clusteredIndex" in create_options:
+        create_options["clusteredIndex"] = {
+            name: value
+            for name, value in create_options["clusteredIndex"].items()
+            if name != "v"
+        }
+    await target.database.create_collection(target.name, **create_options)
+    return {name: options[name] for name in VALIDATION_OPTIONS if name in options}
+
+
+async def apply_validation(target, validation):
+    if validation:
+        await target.database.command("collMod", target.name, **validation)
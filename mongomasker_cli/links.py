@@ -0,0 +1,144 @@
+import os
+import sqlite3
+import sys
+import tempfile
+
+import bson
+
+_MISSING = object()
+
+# prefix of the data types of linked fields, "link:<name>:<data type>"
+LINK_PREFIX = "link:"
+# rough per entry cost of a dict item and its key tuple
+ENTRY_OVERHEAD = 150
+# keys per SELECT, below SQLite's limit of variables per statement
+QUERY_SIZE = 500
+
+
+def link_data_type(name, data_type):
+    return f"{LINK_PREFIX}{name}:{data_type}"
+
+
+def parse_link(data_type):
+    """(name, data type) of a link data type, None for other data types."""
+    if not data_type.startswith(LINK_PREFIX):
+        return None
+    name, _, link_type = data_type[len(LINK_PREFIX) :].partition(":")
+    return name, link_type
+
+
+class MappingStore:
+    """Masked values of the originals of every link, shared by its fields.
+
+    Mappings are kept in memory up to an estimate of `max_bytes` and spilled
+    to a SQLite file beyond that, a temporary one unless `path` is given. With
+    a `path`, every mapping is written to the file and memory only caches it,
+    so processes, and runs, sharing the file mask alike: the first value
+    written for an original wins. Originals and values are stored as BSON
+    encoded with `codec_options`.
+    """
+
+    def __init__(self, path=None, max_bytes=256 * 1024 * 1024, codec_options=None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.codec_options = codec_options or bson.DEFAULT_CODEC_OPTIONS
+        self.bytes = 0
+        # masked values by (link, encoded original)
+        self.memory = {}
+        self.db = None
+        self.temporary = None
+        # mappings written to the temporary file
+        self.spilled = 0
+        if path is not None:
+            self._open(path)
+
+    def _open(self, path):
+        # a long timeout, worker processes take turns writing their batches
+        self.db = sqlite3.connect(path, timeout=60)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute(
+            "CREATE TABLE IF NOT EXISTS mappings (link TEXT, original BLOB, "
+            "masked BLOB, PRIMARY KEY (link, original)) WITHOUT ROWID"
+        )
+        self.db.commit()
+
+    def key(self, original):
+        return bson.encode({"v": original}, codec_options=self.codec_options)
+
+    def _cache(self, link, key, value):
+        size = sys.getsizeof(key) + sys.getsizeof(value) + ENTRY_OVERHEAD
+        if self.bytes + size > self.max_bytes:
+            return False
+        self.memory[(link, key)] = value
+        self.bytes += size
+        return True
+
+    def _select(self, link, keys):
+        found = {}
+        for start in range(0, len(keys), QUERY_SIZE):
+            chunk = keys[start : start + QUERY_SIZE]
+            rows = self.db.execute(
+                "SELECT original, masked FROM mappings WHERE link = ? AND original "
+                f"IN ({', '.join('?' * len(chunk))})",
+                [link, *chunk],
+            )
+            for key, masked in rows:
+                value = bson.decode(masked, self.codec_options)["v"]
+                found[key] = value
+                self._cache(link, key, value)
+        return found
+
+    def get_many(self, link, keys):
+        """Masked values of the encoded originals `keys` of `link` mapped yet."""
+        memory = self.memory
+        found = {}
+        missing = []
+        for key in keys:
+            value = memory.get((link, key), _MISSING)
+            if value is _MISSING:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing and self.db is not None:
+            found.update(self._select(link, missing))
+        return found
+
+    def put_many(self, link, values):
+        """Map the encoded originals of the dict `values` to their values.
+
+        Returns the mappings, which for a shared file are those written first.
+        """
+        if self.path is not None:
+            self._insert(link, values)
+            return self._select(link, list(values))
+        spill = {
+            key: value
+            for key, value in values.items()
+            if not self._cache(link, key, value)
+        }
+        if spill:
+            if self.db is None:
+                self.temporary = tempfile.TemporaryDirectory(prefix="mongomasker-")
+                self._open(os.path.join(self.temporary.name, "links.sqlite"))
+            self._insert(link, spill)
+            self.spilled += len(spill)
+        return values
+
+    def _insert(self, link, values):
+        codec_options = self.codec_options
+        self.db.executemany(
+            "INSERT OR IGNORE INTO mappings VALUES (?, ?, ?)",
+            [
+                (link, key, bson.encode({"v": value}, codec_options=codec_options))
+                for key, value in values.items()
+            ],
+        )
+        self.db.commit()
+
+    def close(self):
+        if self.db is not None:
+            self.db.close()
+            self.db = None
+        if self.temporary is not None:
+            self.temporary.cleanup()
+            self.temporary = None
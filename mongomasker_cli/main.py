@@ -1,16 +1,123 @@
 import asyncio
+import cProfile
+import io
 import json
-from motor.motor_asyncio import AsyncIOMotorClient
+import os
+import pstats
+import tempfile
+import time
+import bson
+from bson import json_util
 from bson.codec_options import CodecOptions, DatetimeConversion
 from bson.binary import UuidRepresentation
+from bson.raw_bson import RawBSONDocument
 
-from faker import Faker
 import typer
-from typing import List
-from datetime import datetime
+from typer.core import TyperGroup
+from typing import List, Optional
+from dataclasses import dataclass, field, replace
+from pathlib import Path
 
-app = typer.Typer()
-fake = Faker()
+from mongomasker_cli.aggregation import (
+    merge_stage,
+    set_stages,
+    split_fields,
+)
+from mongomasker_cli.batching import (
+    DEFAULT_TARGET_LATENCY,
+    AdaptiveBatcher,
+    MemoryBudget,
+)
+from mongomasker_cli.checkpoint import Checkpoint
+from mongomasker_cli.config import CollectionJob, ConfigError, load_config
+from mongomasker_cli.fakers import Fakers, available_locales
+from mongomasker_cli.files import (
+    FileSink,
+    FileSource,
+    count_documents,
+    file_format,
+    json_options,
+)
+from mongomasker_cli.generators import (
+    DEFAULT_DICTIONARY_SIZE,
+    FAKER_GENERATORS,
+    Generators,
+)
+from mongomasker_cli.indexes import (
+    apply_validation,
+    build_indexes,
+    create_target,
+    defer_indexes,
+    index_models,
+)
+from mongomasker_cli.links import MappingStore, parse_link
+from mongomasker_cli.metrics import (
+    DEFAULT_INTERVAL,
+    DEFAULT_PROMETHEUS_HOST,
+    Metrics,
+    MetricsReporter,
+    start_prometheus_server,
+)
+from mongomasker_cli.partition import sample_partition_filters
+from mongomasker_cli.pipeline import run_pipeline
+from mongomasker_cli.plan import compile_fields
+from mongomasker_cli.pools import ValuePools
+from mongomasker_cli.preview import Coverage, format_coverage
+from mongomasker_cli.progress import LineProgress, LogProgress
+from mongomasker_cli.pseudonym import Pseudonymizer
+from mongomasker_cli.rawbson import mask_raw_bson
+from mongomasker_cli.watch import (
+    change_stream_match,
+    load_resume_token,
+    save_resume_token,
+    sync_changes,
+)
+from mongomasker_cli.workers import RAW_CODEC_OPTIONS, MaskingPool
+from mongomasker_cli.writes import (
+    DUPLICATE_KEY,
+    WRITE_MODES,
+    TargetWriter,
+    WriteFailed,
+)
+
+
+class DefaultCommandGroup(TyperGroup):
+    """Run `copy` when the first argument is not a command or an option of the
+    group, so the form of the CLI from before it had commands,
+    `mongomasker URI source_db source_collection ...`, keeps working."""
+
+    default_command = "copy"
+
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands:
+            options = {opt for param in self.get_params(ctx) for opt in param.opts}
+            if args[0] not in options:
+                args = [self.default_command, *args]
+        return super().parse_args(ctx, args)
+
+
+app = typer.Typer(cls=DefaultCommandGroup)
+# Faker instances by data type, pre-generated fake values, deterministic mode,
+# mappings of the linked fields and the Generator of every data type, see
+# configure_generators
+fakers = None
+value_pools = None
+pseudonymizer = None
+links = None
+generators = None
+
+# default memory budget of the deterministic mode's cache, in MB
+DEFAULT_CACHE_MEMORY = 64
+# default memory budget of the mappings of the linked fields, in MB
+DEFAULT_LINK_MEMORY = 256
+# ways of counting the documents to copy, see count_source
+COUNT_MODES = ("auto", "exact", "background", "none")
+
+CODEC_OPTIONS = CodecOptions(
+    tz_aware=True,
+    uuid_representation=UuidRepresentation.STANDARD,
+    datetime_conversion=DatetimeConversion.DATETIME_CLAMP,
+)
 
 
 def warning(msg):
@@ -29,111 +136,845 @@ def success(msg):
     typer.secho(msg, fg=typer.colors.GREEN, bold=True)
 
 
-# Function to generate fake data based on field type
-def generate_fake_data(data_type):
-    if data_type == "name":
-        return fake.first_name()
-    elif data_type == "company":
-        return fake.company()
-    elif data_type == "email":
-        return fake.email()
-    elif data_type == "address":
-        return fake.address()
-    elif data_type == "date":
-        return datetime.strptime(fake.date(), "%Y-%m-%d")
-    elif data_type == "datestr":
-        return fake.date()
-    elif data_type == "zipcode":
-        return fake.zipcode()
-    elif data_type == "statecode":
-        return fake.state_abbr()
-    elif data_type == "lastname":
-        return fake.last_name()
-    elif data_type == "lastnamefirstname":
-        return fake.last_name() + "," + fake.first_name()
-    elif data_type == "city":
-        return fake.city()
-    elif data_type == "id":
-        # numeric string
-        return str(fake.random_number(digits=10))
-    else:
-        return fake.word()  # Default fake data
+def warn_unknown_data_type(data_type):
+    warning(f"unknown data type {data_type}, it is masked with random words")
+
+
+def configure_generators(
+    seed=None,
+    pool_size=0,
+    deterministic_key=None,
+    cache_memory=DEFAULT_CACHE_MEMORY,
+    locale=None,
+    dictionary_paths=(),
+    dictionary_size=DEFAULT_DICTIONARY_SIZE,
+    dictionary_originals=None,
+    link_store=None,
+    link_memory=DEFAULT_LINK_MEMORY,
+):
+    global fakers, value_pools, pseudonymizer, links, generators
+    fakers = Fakers(seed, locale)
+    if value_pools is not None:
+        value_pools.close()
+    if links is not None:
+        links.close()
+    links = MappingStore(
+        None if link_store is None else str(link_store),
+        link_memory * 1024 * 1024,
+        CODEC_OPTIONS,
+    )
+    value_pools = ValuePools(fakers, pool_size) if pool_size else None
+    pseudonymizer = None
+    if deterministic_key:
+        pseudonymizer = Pseudonymizer(
+            deterministic_key, cache_memory * 1024 * 1024, locale
+        )
+    generators = Generators(
+        fakers,
+        value_pools,
+        pseudonymizer,
+        warn_unknown_data_type,
+        dictionary_paths,
+        dictionary_size,
+        dictionary_originals,
+        links,
+    )
+
+
+# Print the statistics of the dictionaries of this process, the worker
+# processes keep theirs to themselves
+def report_dictionaries():
+    for (path, data_type), dictionary in generators.dictionaries.items():
+        info(
+            f"Dictionary of {path} ({data_type}): {len(dictionary.values)} values, "
+            f"{dictionary.hit_rate:.2%} of {dictionary.hits + dictionary.misses} "
+            "lookups hit"
+        )
+        if len(dictionary.values) >= dictionary.max_size:
+            warning(
+                f"the dictionary of {path} is full, raise --dictionary-size to map "
+                "its other values"
+            )
+
+
+# Run the coroutine of a command and return its result, printing the statistics
+# of the dictionaries when `dictionaries` is set, then stop the refill thread of
+# the value pools and close the link store, whether the command failed or not
+def run_command(coroutine, dictionaries=True):
+    try:
+        result = asyncio.run(coroutine)
+        if dictionaries:
+            report_dictionaries()
+        return result
+    finally:
+        if value_pools is not None:
+            value_pools.close()
+        if links is not None:
+            links.close()
+
+
+# unseeded until a command configures them
+configure_generators()
+
+
+def check_locale(locale):
+    # typer callback of the --locale options
+    if locale is not None and locale not in available_locales():
+        raise typer.BadParameter(f"unknown Faker locale {locale}")
+    return locale
+
+
+def check_count(count):
+    # typer callback of the --count options
+    if count not in COUNT_MODES:
+        raise typer.BadParameter(f"must be one of {', '.join(COUNT_MODES)}")
+    return count
+
+
+def check_write_mode(write_mode):
+    # typer callback of the --write-mode options
+    if write_mode not in WRITE_MODES:
+        raise typer.BadParameter(f"must be one of {', '.join(WRITE_MODES)}")
+    return write_mode
+
+
+# motor, and pymongo with it, are imported on first use to keep the startup
+# of --help and of the commands that don't connect fast
+def mongo_client(mongo_uri, **kwargs):
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    return AsyncIOMotorClient(mongo_uri, **kwargs)
 
 
 def generate_fake_data_different(data_type, original_val):
-    new_value = generate_fake_data(data_type)
-    while new_value == original_val:
-        new_value = generate_fake_data(data_type)
-    return new_value
+    return generators[data_type].one(original_val)
 
 
-# Function to anonymize fields
+# Function to anonymize fields, `fields` is a dict of paths to data types or a
+# FieldPlan compiled from it once with compile_fields
 def anonymize_data(document, fields, show_warnings=False):
-    doc_id = document.get("_id", "NO_ID")
-
-    # typer.echo(f"Anonymizing document: {document["_id"]}")
-    # typer.echo(f"Fields to anonymize: {fields}, document: {document}")
-    def _anonymize(doc, keys, data_type):
-        # typer.echo(f"keys: {keys} doc: {doc}")
-        if len(keys) == 1:
-            if isinstance(doc, list):
-                for item in doc:
-                    if isinstance(item, dict):
-                        if keys[0] not in item:
-                            if show_warnings:
-                                warning(
-                                    f"[{doc_id}] key {keys[0]} of type {data_type} not found in document"
-                                )
-                        else:
-                            item[keys[0]] = generate_fake_data_different(
-                                data_type, item[keys[0]]
-                            )
-                    else:
-                        if show_warnings:
-                            warning(
-                                f"[{doc_id}] nested list not supported, {keys[0]} is a list in {doc}"
-                            )
-            elif keys[0] in doc:
-                doc[keys[0]] = generate_fake_data_different(data_type, doc[keys[0]])
+    return anonymize_batch([document], fields, show_warnings)[0]
+
+
+# Mask a list of documents, every path is masked with a single call to the
+# many() of its generator
+def anonymize_batch(documents, fields, show_warnings=False):
+    plan = compile_fields(fields)
+
+    def warn(document, msg):
+        warning(f"[{document.get('_id', 'NO_ID')}] {msg}")
+
+    return plan.apply_batch(documents, generators, warn if show_warnings else None)
+
+
+# Resolve the generators of the data types of `fields` up front, warning about
+# unknown data types before the copy starts
+def resolve_generators(fields):
+    for data_type in set(compile_fields(fields).fields.values()):
+        generators[data_type]
+
+
+# Exit before anything is written when the Faker locale lacks the values of a
+# Faker data type of fields, e.g. statecode outside of the US locales
+def check_data_types(fields, locale):
+    probe = Generators(Fakers(locale=locale))
+    unsupported = []
+    for data_type in sorted(set(compile_fields(fields).fields.values())):
+        link = parse_link(data_type)
+        if link is not None:
+            data_type = link[1]
+        if data_type not in FAKER_GENERATORS or data_type in unsupported:
+            continue
+        try:
+            probe[data_type].one(None)
+        except AttributeError:
+            unsupported.append(data_type)
+    if unsupported:
+        error(
+            f"the Faker locale {locale} has no {', '.join(unsupported)} values, "
+            "use another data type or locale"
+        )
+        raise typer.Exit(code=1)
+
+
+# Same as anonymize_data for a RawBSONDocument, only the top-level fields of the
+# plan are decoded and the masked document is returned as RawBSONDocument
+def anonymize_raw_data(document, fields, show_warnings=False):
+    plan = compile_fields(fields)
+
+    def warn(masked_document, msg):
+        # the _id of the original, the masked subset may not have it
+        warning(f"[{document.get('_id', 'NO_ID')}] {msg}")
+
+    def mask(subset):
+        plan.apply_batch([subset], generators, warn if show_warnings else None)
+        return subset
+
+    raw = mask_raw_bson(document.raw, plan, mask, CODEC_OPTIONS)
+    if raw is document.raw:
+        return document
+    return RawBSONDocument(raw, RAW_CODEC_OPTIONS)
+
+
+# Mask the documents of batch in place, the list is returned
+def mask_batch(
+    batch, fields_to_anonymize, show_warnings=False, partial_decode=False, metrics=None
+):
+    if partial_decode:
+        for i, doc in enumerate(batch):
+            batch[i] = anonymize_raw_data(doc, fields_to_anonymize, show_warnings)
+        return batch
+    # read as raw BSON to size the batches
+    if batch and isinstance(batch[0], RawBSONDocument):
+        started = time.perf_counter()
+        for i, doc in enumerate(batch):
+            # replacing the raw document right away frees it
+            batch[i] = bson.decode(doc.raw, CODEC_OPTIONS)
+        if metrics is not None:
+            metrics.record("decode", time.perf_counter() - started)
+    return anonymize_batch(batch, fields_to_anonymize, show_warnings)
+
+
+@dataclass
+class CopyOptions:
+    # None sizes the batches by bytes with an AdaptiveBatcher
+    batch_size: Optional[int] = None
+    target_latency: float = DEFAULT_TARGET_LATENCY
+    show_warnings: bool = False
+    writers: int = 4
+    queue_size: Optional[int] = None
+    workers: int = 0
+    seed: Optional[int] = None
+    generator_options: dict = field(default_factory=dict)
+    partitions: int = 1
+    partial_decode: bool = False
+    checkpoint_file: Optional[Path] = None
+    resume: bool = False
+    write_mode: str = "insert"
+    write_retries: int = 3
+    # how the total of the progress display is counted, see count_source
+    count: str = "auto"
+    # name printed with the messages and progress of one of concurrent copies
+    label: Optional[str] = None
+    metrics: Optional[Metrics] = None
+    # file receiving a cProfile of the masking stage
+    profile: Optional[Path] = None
+    # drop the target's indexes during the copy and build the source's after
+    defer_indexes: bool = False
+    # create the target with the source's collection options
+    copy_collection_options: bool = False
+    # MB of BSON documents read and not written yet, see MemoryBudget
+    max_memory: Optional[int] = None
+    # apply the types of aggregation.TRANSFORMS in the source's aggregation
+    # pipeline instead of on the client
+    server_side: bool = False
+    # map the distinct values of the dictionary fields before the copy
+    preload_dictionaries: bool = False
+
+    @property
+    def prefix(self):
+        # written before the messages of a labelled copy
+        return f"{self.label}: " if self.label else ""
+
+    @property
+    def raw_documents(self):
+        # documents are read as raw BSON and decoded by the masking stage
+        return bool(
+            self.workers
+            or self.partial_decode
+            or self.batch_size is None
+            or self.max_memory
+        )
+
+
+# Copy the documents matching filter_dict from source_collection to
+# target_collection, masking fields_to_anonymize, returns the number of
+# documents copied, None when the copy ran server-side
+async def copy_collection(
+    source_collection, target_collection, fields_to_anonymize, filter_dict, options
+):
+    # concurrent copies tell their messages apart by the label
+    prefix = options.prefix
+    checkpoint_file = options.checkpoint_file
+    server_fields = {}
+    if options.server_side:
+        server_fields, client_fields = split_fields(
+            compile_fields(fields_to_anonymize).fields
+        )
+        if not client_fields and checkpoint_file is None:
+            deferred = await prepare_target(
+                source_collection, target_collection, options
+            )
+            try:
+                await merge_collection(
+                    source_collection,
+                    target_collection,
+                    server_fields,
+                    filter_dict,
+                    options,
+                )
+            except BaseException:
+                await restore_indexes(target_collection, deferred, options)
+                raise
+            await finish_target(target_collection, deferred, options)
+            return None
+        if server_fields:
+            info(
+                f"{prefix}Masking {', '.join(server_fields)} server-side, "
+                f"{', '.join(client_fields) or 'no field'} on the client"
+            )
+        fields_to_anonymize = compile_fields(client_fields)
+    checkpoint = None
+    if options.resume:
+        checkpoint = Checkpoint.load(checkpoint_file)
+        if (checkpoint.source, checkpoint.target, checkpoint.filter) != (
+            source_collection.full_name,
+            target_collection.full_name,
+            filter_dict,
+        ):
+            error(
+                f"{prefix}{checkpoint_file} records a copy of {checkpoint.source} to "
+                f"{checkpoint.target} with filter {checkpoint.filter}"
+            )
+            raise typer.Exit(code=1)
+        if checkpoint.done:
+            success(f"{prefix}{checkpoint_file} records a finished copy, nothing to do")
+            return 0
+        queries = checkpoint.queries()
+        info(f"{prefix}Resuming {len(queries)} partitions from {checkpoint_file}")
+        if options.write_mode == "insert":
+            # batches after the checkpointed _id may have been written before
+            # the copy stopped, they are read again and must be skipped
+            info(f"{prefix}Resuming with --write-mode unordered")
+            options = replace(options, write_mode="unordered")
+    else:
+        if checkpoint_file is not None and checkpoint_file.exists():
+            error(f"{prefix}{checkpoint_file} exists, use --resume or remove it")
+            raise typer.Exit(code=1)
+        queries = await sample_partition_filters(
+            source_collection, filter_dict, options.partitions
+        )
+        if options.partitions > 1:
+            if len(queries) == 1:
+                warning(
+                    f"{prefix}could not split _id values into ranges, using one cursor"
+                )
             else:
-                if show_warnings:
-                    warning(
-                        f"[{doc_id}] key {keys[0]} of type {data_type} not found in document"
-                    )
+                info(f"{prefix}Scanning {len(queries)} partitions")
+        if checkpoint_file is not None:
+            checkpoint = Checkpoint.create(
+                checkpoint_file,
+                source_collection.full_name,
+                target_collection.full_name,
+                filter_dict,
+                queries,
+            )
+            checkpoint.save()
 
-        else:
-            key = keys[0]
-            if isinstance(doc, list):
-                for item in doc:
-                    if isinstance(item, dict):
-                        _anonymize(item[key], keys[1:], data_type)
-                    else:
-                        if show_warnings:
-                            warning(f"[{doc_id}] nested list not supported")
-            elif key in doc:
-                _anonymize(doc[key], keys[1:], data_type)
-            elif key == "*":  # means all keys in the document
-                for k in doc.keys():
-                    _anonymize(doc[k], keys[1:], data_type)
-
-    for field, data_type in fields.items():
-        keys = field.split(".")
-        _anonymize(document, keys, data_type)
-    return document
-
-
-async def process_batch(
-    batch, target_collection, fields_to_anonymize, show_warnings=False
-):
-    anonymized_batch = [
-        anonymize_data(doc, fields_to_anonymize, show_warnings) for doc in batch
-    ]
-    # info(f"Anonymized batch of {len(anonymized_batch)} documents")
-    await target_collection.insert_many(anonymized_batch)
-    # info(f"Inserted batch of {len(anonymized_batch)} documents")
+    if options.preload_dictionaries:
+        options = await preload_dictionaries(
+            source_collection, fields_to_anonymize, filter_dict, options
+        )
+    deferred = await prepare_target(
+        source_collection, target_collection, options, checkpoint
+    )
+    try:
+        processed_documents = await write_collection(
+            source_collection,
+            target_collection,
+            fields_to_anonymize,
+            filter_dict,
+            options,
+            queries,
+            server_fields,
+            checkpoint,
+        )
+    except BaseException:
+        await restore_indexes(target_collection, deferred, options)
+        raise
+    await finish_target(target_collection, deferred, options)
+    if checkpoint is not None:
+        checkpoint.finish()
+    return processed_documents
 
 
-@app.command()
+# Read the documents of queries from source_collection, with the server_fields
+# masked by the pipeline, and write them to target_collection masking
+# fields_to_anonymize, returns the number of documents written
+async def write_collection(
+    source_collection,
+    target_collection,
+    fields_to_anonymize,
+    filter_dict,
+    options,
+    queries,
+    server_fields,
+    checkpoint,
+):
+    prefix = options.prefix
+    if options.raw_documents:
+        # documents are decoded and encoded by the masking stage
+        source_collection = source_collection.with_options(
+            codec_options=RAW_CODEC_OPTIONS
+        )
+    if server_fields:
+        # the checkpoint records the highest _id written of every cursor
+        sort = [{"$sort": {"_id": 1}}] if checkpoint is not None else []
+        cursors = [
+            source_collection.aggregate(
+                [{"$match": query}, *sort, *set_stages(server_fields)]
+            )
+            for query in queries
+        ]
+    else:
+        cursors = [source_collection.find(query) for query in queries]
+        if checkpoint is not None:
+            # the checkpoint records the highest _id written of every cursor
+            cursors = [cursor.sort("_id", 1) for cursor in cursors]
+    total_documents = await count_source(
+        source_collection,
+        queries if options.resume else [filter_dict],
+        options.count,
+    )
+    if isinstance(total_documents, int):
+        info(f"{prefix}Total documents to process: {total_documents}")
+    writer = TargetWriter(
+        target_collection, options.write_mode, retries=options.write_retries
+    )
+    try:
+        processed_documents = await mask_documents(
+            cursors,
+            writer.write,
+            fields_to_anonymize,
+            total_documents,
+            options,
+            on_read=checkpoint.batch_read if checkpoint is not None else None,
+            on_written=checkpoint.batch_written if checkpoint is not None else None,
+        )
+    except WriteFailed as exc:
+        error(f"{prefix}{exc}")
+        if options.write_mode == "insert" and any(
+            write_error.get("code") == DUPLICATE_KEY for write_error in exc.errors
+        ):
+            info(
+                f"{prefix}Use --write-mode unordered or upsert to copy into existing data"
+            )
+        raise typer.Exit(code=1)
+
+    if options.write_mode != "insert":
+        info(f"{prefix}Documents written: {writer.summary()}")
+    return processed_documents
+
+
+# Read the distinct values of the dictionary fields of fields_to_anonymize with
+# a distinct command and map them, in this process or, through the returned
+# options, in the worker processes
+async def preload_dictionaries(
+    source_collection, fields_to_anonymize, filter_dict, options
+):
+    from pymongo.errors import OperationFailure
+
+    prefix = options.prefix
+    generator_options = options.generator_options
+    size = generator_options.get("dictionary_size", DEFAULT_DICTIONARY_SIZE)
+    fields = compile_fields(fields_to_anonymize).fields
+    originals = {}
+    for path in generator_options.get("dictionary_paths", ()):
+        if path not in fields:
+            continue
+        if "*" in path:
+            warning(f"{prefix}the dictionary of {path} can't be preloaded, it has a *")
+            continue
+        try:
+            values = await source_collection.distinct(path, filter_dict)
+        except OperationFailure as exc:
+            # e.g. more distinct values than fit in a 16MB reply
+            warning(f"{prefix}the dictionary of {path} is not preloaded: {exc}")
+            continue
+        if len(values) > size:
+            warning(
+                f"{prefix}{path} has {len(values)} distinct values, preloading "
+                f"--dictionary-size {size} of them"
+            )
+        originals[path] = values[:size]
+        info(f"{prefix}Preloaded {len(originals[path])} values of {path}")
+    if not options.workers:
+        for path, values in originals.items():
+            generators.field(path, fields[path]).add(values)
+        return options
+    return replace(
+        options,
+        generator_options=dict(generator_options, dictionary_originals=originals),
+    )
+
+
+# Create target_collection with the options of source_collection and drop its
+# indexes, as set in options, returns the indexes and validation options to
+# hand to finish_target. The indexes are recorded in checkpoint, if any, so
+# that a resumed copy builds those it dropped before it stopped
+async def prepare_target(
+    source_collection, target_collection, options, checkpoint=None
+):
+    prefix = options.prefix
+    validation = None
+    if options.copy_collection_options:
+        validation = await create_target(source_collection, target_collection)
+        if validation is None:
+            warning(
+                f"{prefix}{target_collection.full_name} exists, "
+                "its collection options are left as they are"
+            )
+    models = []
+    if options.defer_indexes:
+        models = await defer_indexes(source_collection, target_collection)
+    if checkpoint is not None and (models or checkpoint.indexes):
+        # dropped by the run that stopped, the target doesn't list them anymore
+        names = {model.document["name"] for model in models}
+        models += [
+            model
+            for model in index_models(checkpoint.indexes)
+            if model.document["name"] not in names
+        ]
+        checkpoint.indexes = [model.document for model in models]
+        checkpoint.save()
+    if models:
+        info(f"{prefix}Building {len(models)} indexes after the copy")
+    return models, validation
+
+
+# Build the indexes prepare_target dropped after the copy failed, so that the
+# target doesn't lose the indexes only it had
+async def restore_indexes(target_collection, deferred, options):
+    from pymongo.errors import PyMongoError
+
+    prefix = options.prefix
+    models, _ = deferred
+    if not models:
+        return
+    warning(f"{prefix}the copy failed, building the indexes of the target again")
+    try:
+        await build_indexes(target_collection, models)
+    except PyMongoError as exc:
+        error(
+            f"{prefix}the indexes of {target_collection.full_name} were not built "
+            f"again: {exc}"
+        )
+
+
+# Build the indexes and apply the validation options of prepare_target
+async def finish_target(target_collection, deferred, options):
+    from pymongo.errors import OperationFailure
+
+    prefix = options.prefix
+    models, validation = deferred
+    try:
+        if models:
+            info(f"{prefix}Building indexes of {target_collection.full_name}")
+            started = time.monotonic()
+            await build_indexes(target_collection, models)
+            info(f"{prefix}Indexes built in {time.monotonic() - started:.1f}s")
+        await apply_validation(target_collection, validation)
+    except OperationFailure as exc:
+        # e.g. masked values colliding in a unique index
+        error(f"{prefix}the documents were copied but {exc}")
+        raise typer.Exit(code=1)
+
+
+# Copy the documents matching filter_dict from source_collection to
+# target_collection with aggregation pipelines ending in $merge, masking
+# fields_to_anonymize, which must all be server-side, without any document
+# going through the client
+async def merge_collection(
+    source_collection, target_collection, fields_to_anonymize, filter_dict, options
+):
+    from pymongo.errors import OperationFailure
+
+    prefix = options.prefix
+    queries = await sample_partition_filters(
+        source_collection, filter_dict, options.partitions
+    )
+    info(
+        f"{prefix}Masking server-side into {target_collection.full_name} "
+        f"with {len(queries)} aggregation pipelines"
+    )
+    merge = merge_stage(
+        target_collection.database.name, target_collection.name, options.write_mode
+    )
+    stages = set_stages(fields_to_anonymize)
+    try:
+        await asyncio.gather(
+            *(
+                source_collection.aggregate(
+                    [{"$match": query}, *stages, merge]
+                ).to_list(None)
+                for query in queries
+            )
+        )
+    except OperationFailure as exc:
+        error(f"{prefix}{exc}")
+        if exc.code == DUPLICATE_KEY and options.write_mode == "insert":
+            info(
+                f"{prefix}Use --write-mode unordered or upsert to copy into existing data"
+            )
+        raise typer.Exit(code=1)
+    return None
+
+
+# Total of the documents matching queries for the progress display, depending on
+# the count mode:
+#  - auto: estimated_document_count without a filter, background otherwise
+#  - exact: count_documents before the copy starts
+#  - background: count_documents concurrently with the copy, returns its Task
+#  - none: None, the progress display doesn't show a total
+async def count_source(collection, queries, mode):
+    if mode == "auto":
+        if queries == [{}]:
+            return await collection.estimated_document_count()
+        mode = "background"
+    if mode == "none":
+        return None
+
+    async def count():
+        total = 0
+        for query in queries:
+            total += await collection.count_documents(query)
+        return total
+
+    if mode == "exact":
+        return await count()
+    return asyncio.ensure_future(count())
+
+
+# Total of the documents of a file for the progress display, the modes of
+# count_source: auto and exact count the file before masking it, which only
+# reads its length prefixes, background counts it in a thread and returns its
+# Task. Only uncompressed BSON files are counted, see count_documents
+async def count_file(path, mode):
+    if mode == "none":
+        return None
+    if mode == "background":
+        return asyncio.ensure_future(asyncio.to_thread(count_documents, path))
+    return count_documents(path)
+
+
+# Mask the documents of cursors, any async iterables, into write, showing the
+# progress towards total_documents (an int, None if unknown, or a Task counting
+# them), returns the number of documents written
+async def mask_documents(
+    cursors,
+    write,
+    fields_to_anonymize,
+    total_documents,
+    options,
+    on_read=None,
+    on_written=None,
+):
+    prefix = options.prefix
+    processed_documents = 0
+    check_data_types(
+        fields_to_anonymize, options.generator_options.get("locale", fakers.locale)
+    )
+
+    pool = None
+    link_directory = None
+    if options.workers:
+        info(f"{prefix}Masking with {options.workers} worker processes")
+        generator_options = options.generator_options
+        link_types = [
+            data_type
+            for data_type in compile_fields(fields_to_anonymize).fields.values()
+            if parse_link(data_type) is not None
+        ]
+        if link_types and not generator_options.get("link_store"):
+            # the workers share the mappings of the links through a file
+            link_directory = tempfile.TemporaryDirectory(prefix="mongomasker-")
+            generator_options = dict(
+                generator_options,
+                link_store=os.path.join(link_directory.name, "links.sqlite"),
+            )
+        pool = MaskingPool(
+            options.workers,
+            fields_to_anonymize,
+            options.show_warnings,
+            options.seed,
+            generator_options,
+            options.partial_decode,
+        )
+        mask = pool.mask
+        if options.profile is not None:
+            warning(f"{prefix}--profile only covers masking in the main process")
+    else:
+        resolve_generators(fields_to_anonymize)
+        profiler = cProfile.Profile() if options.profile is not None else None
+
+        def mask(batch):
+            if profiler is not None:
+                profiler.enable()
+            try:
+                return mask_batch(
+                    batch,
+                    fields_to_anonymize,
+                    options.show_warnings,
+                    options.partial_decode,
+                    options.metrics,
+                )
+            finally:
+                if profiler is not None:
+                    profiler.disable()
+
+    batcher = None
+    if options.batch_size is None:
+        batcher = AdaptiveBatcher(options.target_latency)
+    budget = None
+    if options.max_memory:
+        budget = MemoryBudget(options.max_memory * 1024 * 1024)
+
+    count_task = None
+    if isinstance(total_documents, asyncio.Future):
+        count_task, total_documents = total_documents, None
+    if options.label:
+        progress_display = LogProgress(options.label, total_documents)
+    elif total_documents is None:
+        progress_display = LineProgress("Processing documents")
+    else:
+        progress_display = typer.progressbar(
+            length=total_documents, label="Processing documents"
+        )
+    if count_task is not None:
+
+        def set_length(task):
+            if not task.cancelled() and task.exception() is None:
+                progress_display.length = task.result()
+
+        count_task.add_done_callback(set_length)
+    with progress_display as progress:
+
+        def on_batch_written(batch):
+            nonlocal processed_documents
+            processed_documents += len(batch)
+            progress.update(len(batch))
+            if on_written is not None:
+                on_written(batch)
+
+        try:
+            await run_pipeline(
+                cursors,
+                mask,
+                write,
+                batch_size=options.batch_size,
+                writers=options.writers,
+                queue_size=options.queue_size,
+                on_written=on_batch_written,
+                maskers=options.workers or 1,
+                on_read=on_read,
+                batcher=batcher,
+                metrics=options.metrics,
+                budget=budget,
+            )
+        finally:
+            if count_task is not None and not count_task.done():
+                # the copy won, the total is of no use anymore
+                count_task.cancel()
+                await asyncio.gather(count_task, return_exceptions=True)
+            if pool is not None:
+                pool.close()
+            if link_directory is not None:
+                link_directory.cleanup()
+    if not options.workers and options.profile is not None:
+        profiler.dump_stats(options.profile)
+        info(f"{prefix}Profile of the masking stage written to {options.profile}")
+        stats = io.StringIO()
+        pstats.Stats(profiler, stream=stats).sort_stats("tottime").print_stats(10)
+        typer.echo(stats.getvalue())
+    return processed_documents
+
+
+# options of the fake value generators shared by the masking commands, see
+# generator_options
+COUNT_OPTION = typer.Option(
+    "auto",
+    callback=check_count,
+    help=f"How the documents to mask are counted: {', '.join(COUNT_MODES)}",
+)
+WRITE_MODE_OPTION = typer.Option(
+    "insert",
+    callback=check_write_mode,
+    help=f"How documents are written: {', '.join(WRITE_MODES)}",
+)
+LOCALE_OPTION = typer.Option(
+    None, callback=check_locale, help="Faker locale, e.g. de_DE (default: en_US)"
+)
+POOL_SIZE_OPTION = typer.Option(
+    0, min=0, help="Pre-generate fake values in pools of this size (0 disables)"
+)
+DETERMINISTIC_KEY_OPTION = typer.Option(
+    None,
+    envvar="MONGOMASKER_KEY",
+    help="Secret key, mask every original value to the same fake value",
+)
+CACHE_MEMORY_OPTION = typer.Option(
+    DEFAULT_CACHE_MEMORY,
+    min=1,
+    help="Memory budget in MB of the deterministic mode's value cache",
+)
+PARTIAL_DECODE_OPTION = typer.Option(
+    False, help="Decode only the top-level fields that are masked"
+)
+DICTIONARY_OPTION = typer.Option(
+    None, help="Mask this field by a dictionary of its distinct values, repeatable"
+)
+DICTIONARY_SIZE_OPTION = typer.Option(
+    DEFAULT_DICTIONARY_SIZE,
+    min=1,
+    help="Distinct values mapped per --dictionary field, others are generated",
+)
+LINK_STORE_OPTION = typer.Option(
+    None, help="SQLite file keeping the mappings of the linked fields"
+)
+LINK_MEMORY_OPTION = typer.Option(
+    DEFAULT_LINK_MEMORY,
+    min=1,
+    help="MB of mappings of the linked fields kept in memory",
+)
+
+
+# keyword arguments of configure_generators from the generator options
+def generator_options(
+    pool_size,
+    deterministic_key,
+    cache_memory,
+    locale,
+    dictionary,
+    dictionary_size,
+    link_store,
+    link_memory,
+):
+    return dict(
+        pool_size=pool_size,
+        deterministic_key=deterministic_key,
+        cache_memory=cache_memory,
+        locale=locale,
+        dictionary_paths=tuple(dictionary or ()),
+        dictionary_size=dictionary_size,
+        link_store=link_store,
+        link_memory=link_memory,
+    )
+
+
+def file_options(batch_size, show_warnings, workers, seed, generator_options):
+    options = CopyOptions(
+        batch_size=batch_size,
+        show_warnings=show_warnings,
+        workers=workers,
+        seed=seed,
+        generator_options=generator_options,
+    )
+    if not workers:
+        configure_generators(seed, **generator_options)
+    return options
+
+
+@app.command("copy")
 def main(
     mongo_uri: str = typer.Argument(..., help="MongoDB connection URI"),
     source_db: str = typer.Argument(..., help="Source database name"),
@@ -143,70 +984,835 @@ def main(
     fields_to_anonymize_file: typer.FileText = typer.Argument(
         ..., help="JSON file with fields to anonymize"
     ),
-    batch_size: int = typer.Option(100, help="Batch size for processing"),
+    batch_size: Optional[int] = typer.Option(
+        None, min=1, help="Documents per batch (default: sized by bytes and latency)"
+    ),
+    target_latency: float = typer.Option(
+        DEFAULT_TARGET_LATENCY,
+        min=0.01,
+        help="Seconds an insert_many should take when batches are sized by bytes",
+    ),
     show_warnings: bool = typer.Option(False, help="Show warnings"),
     mongo_filter: str = typer.Option("{}", help="MongoDB filter as JSON string"),
+    writers: int = typer.Option(
+        4, min=1, help="Number of concurrent insert_many calls in flight"
+    ),
+    queue_size: Optional[int] = typer.Option(
+        None, min=1, help="Batches buffered between stages (default: writers)"
+    ),
+    workers: int = typer.Option(
+        0, min=0, help="Number of masking processes (0 masks on the event loop)"
+    ),
+    seed: Optional[int] = typer.Option(None, help="Seed for the fake data generator"),
+    locale: Optional[str] = LOCALE_OPTION,
+    partitions: int = typer.Option(
+        1, min=1, help="Number of _id ranges scanned by concurrent cursors"
+    ),
+    pool_size: int = POOL_SIZE_OPTION,
+    deterministic_key: Optional[str] = DETERMINISTIC_KEY_OPTION,
+    cache_memory: int = CACHE_MEMORY_OPTION,
+    partial_decode: bool = PARTIAL_DECODE_OPTION,
+    dictionary: Optional[List[str]] = DICTIONARY_OPTION,
+    dictionary_size: int = DICTIONARY_SIZE_OPTION,
+    link_store: Optional[Path] = LINK_STORE_OPTION,
+    link_memory: int = LINK_MEMORY_OPTION,
+    preload_dictionaries: bool = typer.Option(
+        False, help="Map the distinct values of the --dictionary fields up front"
+    ),
+    checkpoint_file: Optional[Path] = typer.Option(
+        None,
+        "--checkpoint",
+        help="File recording the last _id written per partition",
+    ),
+    resume: bool = typer.Option(
+        False,
+        help="Resume the copy recorded in the --checkpoint file, skipping the "
+        "documents already written",
+    ),
+    write_mode: str = WRITE_MODE_OPTION,
+    write_retries: int = typer.Option(
+        3, min=0, help="Retries of the documents that failed in a batch"
+    ),
+    metrics_interval: Optional[float] = typer.Option(
+        None, min=0.1, help="Seconds between two JSON lines of metrics"
+    ),
+    metrics_log: Optional[Path] = typer.Option(
+        None, help="File the JSON lines of metrics are appended to (default: stderr)"
+    ),
+    prometheus_file: Optional[Path] = typer.Option(
+        None, help="File rewritten with the metrics in Prometheus format"
+    ),
+    prometheus_port: Optional[int] = typer.Option(
+        None, help="Serve the metrics in Prometheus format on this port"
+    ),
+    prometheus_host: str = typer.Option(
+        DEFAULT_PROMETHEUS_HOST,
+        help="Interface --prometheus-port listens on, e.g. 0.0.0.0 for all",
+    ),
+    profile: Optional[Path] = typer.Option(
+        None, help="Write a cProfile of the masking stage to this file"
+    ),
+    count: str = COUNT_OPTION,
+    server_side: bool = typer.Option(
+        False, help="Apply null, redact and datetrunc in aggregation pipelines"
+    ),
+    max_memory: Optional[int] = typer.Option(
+        None, min=1, help="MB of documents read and not written yet, per copy"
+    ),
+    defer_indexes: bool = typer.Option(
+        False, help="Build the source's indexes on the target after the copy"
+    ),
+    copy_collection_options: bool = typer.Option(
+        False, help="Create the target with the source's options and validator"
+    ),
 ):
+    """Mask a collection into another, also run when no command is given."""
+    if resume and checkpoint_file is None:
+        error("--resume requires --checkpoint")
+        raise typer.Exit(code=1)
+    if resume and not checkpoint_file.exists():
+        error(f"{checkpoint_file} doesn't exist, nothing to resume")
+        raise typer.Exit(code=1)
+
+    options = CopyOptions(
+        batch_size=batch_size,
+        target_latency=target_latency,
+        show_warnings=show_warnings,
+        writers=writers,
+        queue_size=queue_size,
+        workers=workers,
+        seed=seed,
+        generator_options=generator_options(
+            pool_size,
+            deterministic_key,
+            cache_memory,
+            locale,
+            dictionary,
+            dictionary_size,
+            link_store,
+            link_memory,
+        ),
+        partitions=partitions,
+        partial_decode=partial_decode,
+        checkpoint_file=checkpoint_file,
+        resume=resume,
+        write_mode=write_mode,
+        write_retries=write_retries,
+        profile=profile,
+        count=count,
+        server_side=server_side,
+        max_memory=max_memory,
+        defer_indexes=defer_indexes,
+        copy_collection_options=copy_collection_options,
+        preload_dictionaries=preload_dictionaries,
+    )
+    if metrics_interval or prometheus_file or prometheus_port:
+        options.metrics = Metrics()
+    if not workers:
+        configure_generators(seed, **options.generator_options)
+
     async def run():
-        client = AsyncIOMotorClient(mongo_uri)
-        codec_options = CodecOptions(
-            tz_aware=True,
-            uuid_representation=UuidRepresentation.STANDARD,
-            datetime_conversion=DatetimeConversion.DATETIME_CLAMP,
-        )
+        client = mongo_client(mongo_uri)
         source_db_handle = client.get_database(
             source_db,
-            codec_options=codec_options,
+            codec_options=CODEC_OPTIONS,
         )
         target_db_handle = client.get_database(
             target_db,
-            codec_options=codec_options,
+            codec_options=CODEC_OPTIONS,
         )
 
         source_collection_handle = source_db_handle[source_collection]
         target_collection_handle = target_db_handle[target_collection]
 
-        fields_to_anonymize = json.load(fields_to_anonymize_file)
+        fields_to_anonymize = compile_fields(json.load(fields_to_anonymize_file))
 
         # Parse the mongo_filter string to a Python dictionary
         filter_dict = json.loads(mongo_filter)
 
-        cursor = source_collection_handle.find(filter_dict)
-        total_documents = await source_collection_handle.count_documents(filter_dict)
-        info(f"Total documents to process: {total_documents}")
-        processed_documents = 0
+        reporter = None
+        server = None
+        if metrics_interval or prometheus_file:
+            reporter = MetricsReporter(
+                options.metrics,
+                metrics_interval or DEFAULT_INTERVAL,
+                metrics_log,
+                prometheus_file,
+                json_lines=bool(metrics_interval),
+            )
+            reporter.start()
+        if prometheus_port:
+            server = await start_prometheus_server(
+                options.metrics, prometheus_port, prometheus_host
+            )
+        try:
+            processed_documents = await copy_collection(
+                source_collection_handle,
+                target_collection_handle,
+                fields_to_anonymize,
+                filter_dict,
+                options,
+            )
+        finally:
+            if reporter is not None:
+                await reporter.stop()
+            if server is not None:
+                server.close()
+                await server.wait_closed()
 
-        with typer.progressbar(
-            length=total_documents, label="Processing documents"
-        ) as progress:
-            batch = []
-            async for document in cursor:
-                batch.append(document)
-                if len(batch) >= batch_size:
-                    # info(f"Processing batch of {len(batch)} documents")
-                    await process_batch(
-                        batch,
-                        target_collection_handle,
-                        fields_to_anonymize,
-                        show_warnings,
-                    )
-                    # info(f"Processed {len(batch)} documents")
-                    processed_documents += len(batch)
-                    progress.update(len(batch))
-                    batch = []
-
-            # Process any remaining documents in the last batch
-            if batch:
-                await process_batch(
-                    batch, target_collection_handle, fields_to_anonymize, show_warnings
+        success(f"Data anonymized and copied to {target_db}.{target_collection}")
+        if processed_documents is not None:
+            success(f"Total documents processed: {processed_documents}")
+
+    run_command(run())
+
+
+@app.command("copy-many")
+def copy_many(
+    mongo_uri: str = typer.Argument(..., help="MongoDB connection URI"),
+    config_file: typer.FileText = typer.Argument(
+        ..., help="JSON file mapping collections to fields to anonymize"
+    ),
+    concurrency: int = typer.Option(
+        4, min=1, help="Number of collections copied at the same time"
+    ),
+    max_pool_size: int = typer.Option(
+        100, min=1, help="Maximum connections of the client shared by all copies"
+    ),
+    all_collections: bool = typer.Option(
+        False, help="Also copy, unmasked, the collections missing from the config"
+    ),
+    batch_size: Optional[int] = typer.Option(
+        None, min=1, help="Documents per batch (default: sized by bytes and latency)"
+    ),
+    show_warnings: bool = typer.Option(False, help="Show warnings"),
+    writers: int = typer.Option(
+        4, min=1, help="Number of concurrent insert_many calls in flight per copy"
+    ),
+    queue_size: Optional[int] = typer.Option(
+        None, min=1, help="Batches buffered between stages (default: writers)"
+    ),
+    seed: Optional[int] = typer.Option(None, help="Seed for the fake data generator"),
+    locale: Optional[str] = LOCALE_OPTION,
+    partitions: int = typer.Option(
+        1, min=1, help="Number of _id ranges scanned by concurrent cursors"
+    ),
+    pool_size: int = POOL_SIZE_OPTION,
+    deterministic_key: Optional[str] = DETERMINISTIC_KEY_OPTION,
+    cache_memory: int = CACHE_MEMORY_OPTION,
+    partial_decode: bool = PARTIAL_DECODE_OPTION,
+    dictionary: Optional[List[str]] = DICTIONARY_OPTION,
+    dictionary_size: int = DICTIONARY_SIZE_OPTION,
+    link_store: Optional[Path] = LINK_STORE_OPTION,
+    link_memory: int = LINK_MEMORY_OPTION,
+    preload_dictionaries: bool = typer.Option(
+        False, help="Map the distinct values of the --dictionary fields up front"
+    ),
+    checkpoint_dir: Optional[Path] = typer.Option(
+        None, help="Directory with a checkpoint file per collection"
+    ),
+    resume: bool = typer.Option(
+        False, help="Resume the copies recorded in --checkpoint-dir"
+    ),
+    write_mode: str = WRITE_MODE_OPTION,
+    write_retries: int = typer.Option(
+        3, min=0, help="Retries of the documents that failed in a batch"
+    ),
+    count: str = COUNT_OPTION,
+    server_side: bool = typer.Option(
+        False, help="Apply null, redact and datetrunc in aggregation pipelines"
+    ),
+    max_memory: Optional[int] = typer.Option(
+        None, min=1, help="MB of documents read and not written yet, per copy"
+    ),
+    defer_indexes: bool = typer.Option(
+        False, help="Build the source's indexes on the target after the copy"
+    ),
+    copy_collection_options: bool = typer.Option(
+        False, help="Create the target with the source's options and validator"
+    ),
+):
+    """Copy the collections of a config file concurrently with one client."""
+    if resume and checkpoint_dir is None:
+        error("--resume requires --checkpoint-dir")
+        raise typer.Exit(code=1)
+    try:
+        source_db, target_db, jobs = load_config(config_file)
+    except (ConfigError, OSError, ValueError) as exc:
+        error(str(exc))
+        raise typer.Exit(code=1)
+
+    options = CopyOptions(
+        batch_size=batch_size,
+        show_warnings=show_warnings,
+        writers=writers,
+        queue_size=queue_size,
+        seed=seed,
+        generator_options=generator_options(
+            pool_size,
+            deterministic_key,
+            cache_memory,
+            locale,
+            dictionary,
+            dictionary_size,
+            link_store,
+            link_memory,
+        ),
+        partitions=partitions,
+        partial_decode=partial_decode,
+        resume=resume,
+        write_mode=write_mode,
+        write_retries=write_retries,
+        count=count,
+        server_side=server_side,
+        max_memory=max_memory,
+        defer_indexes=defer_indexes,
+        copy_collection_options=copy_collection_options,
+        preload_dictionaries=preload_dictionaries,
+    )
+    configure_generators(seed, **options.generator_options)
+    if checkpoint_dir is not None:
+        checkpoint_dir.mkdir(parents=True, exist_ok=True)
+
+    async def run():
+        client = mongo_client(mongo_uri, maxPoolSize=max_pool_size)
+        source_db_handle = client.get_database(source_db, codec_options=CODEC_OPTIONS)
+        target_db_handle = client.get_database(target_db, codec_options=CODEC_OPTIONS)
+
+        names = await source_db_handle.list_collection_names(
+            filter={"type": "collection"}
+        )
+        listed = {job.source for job in jobs}
+        for job in jobs:
+            if job.source not in names:
+                warning(f"collection {source_db}.{job.source} does not exist")
+        for name in sorted(set(names) - listed):
+            if name.startswith("system."):
+                continue
+            if all_collections:
+                warning(f"{name} is not in the config, copying it unmasked")
+                jobs.append(CollectionJob(name, name, compile_fields({}), {}))
+            else:
+                warning(f"{name} is not in the config, skipping it")
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def copy_job(job):
+            async with semaphore:
+                checkpoint_file = None
+                if checkpoint_dir is not None:
+                    checkpoint_file = checkpoint_dir / f"{job.source}.json"
+                return await copy_collection(
+                    source_db_handle[job.source],
+                    target_db_handle[job.target],
+                    job.fields,
+                    job.filter,
+                    replace(
+                        options,
+                        label=job.source,
+                        checkpoint_file=checkpoint_file,
+                        resume=resume
+                        and checkpoint_file is not None
+                        and checkpoint_file.exists(),
+                    ),
                 )
-                processed_documents += len(batch)
-                progress.update(len(batch))
 
+        # a failed collection doesn't stop the others
+        results = await asyncio.gather(
+            *(copy_job(job) for job in jobs), return_exceptions=True
+        )
+        failed = []
+        for job, result in zip(jobs, results):
+            if isinstance(result, BaseException):
+                if not isinstance(result, typer.Exit):
+                    error(f"{job.source}: {result!r}")
+                failed.append(job.source)
+            elif result is None:
+                success(f"{job.source}: copied server-side to {job.target}")
+            else:
+                success(f"{job.source}: {result} documents copied to {job.target}")
+        if failed:
+            error(f"{len(failed)} collections failed: {', '.join(failed)}")
+            raise typer.Exit(code=1)
+        success(f"{len(jobs)} collections anonymized and copied to {target_db}")
+
+    run_command(run())
+
+
+# Mask the documents of cursors into the file output_file
+async def mask_to_file(cursors, output_file, fields_to_anonymize, total, options):
+    sink = FileSink(output_file, CODEC_OPTIONS)
+    try:
+        # a single writer keeps the batches of a file in order
+        processed_documents = await mask_documents(
+            cursors, sink.write, fields_to_anonymize, total, replace(options, writers=1)
+        )
+    except BaseException:
+        sink.close(keep=False)
+        raise
+    sink.close()
+    return processed_documents
+
+
+def check_file_format(path):
+    try:
+        file_format(str(path))
+    except ValueError as exc:
+        error(str(exc))
+        raise typer.Exit(code=1)
+
+
+@app.command("mask-file")
+def mask_file(
+    input_file: Path = typer.Argument(
+        ..., exists=True, dir_okay=False, help="BSON or NDJSON file to mask"
+    ),
+    output_file: Path = typer.Argument(..., help="BSON or NDJSON file to write"),
+    fields_to_anonymize_file: typer.FileText = typer.Argument(
+        ..., help="JSON file with fields to anonymize"
+    ),
+    batch_size: Optional[int] = typer.Option(
+        None, min=1, help="Documents per batch (default: sized by bytes and latency)"
+    ),
+    show_warnings: bool = typer.Option(False, help="Show warnings"),
+    workers: int = typer.Option(
+        0, min=0, help="Number of masking processes (0 masks on the event loop)"
+    ),
+    seed: Optional[int] = typer.Option(None, help="Seed for the fake data generator"),
+    locale: Optional[str] = LOCALE_OPTION,
+    pool_size: int = POOL_SIZE_OPTION,
+    deterministic_key: Optional[str] = DETERMINISTIC_KEY_OPTION,
+    cache_memory: int = CACHE_MEMORY_OPTION,
+    partial_decode: bool = PARTIAL_DECODE_OPTION,
+    dictionary: Optional[List[str]] = DICTIONARY_OPTION,
+    dictionary_size: int = DICTIONARY_SIZE_OPTION,
+    link_store: Optional[Path] = LINK_STORE_OPTION,
+    link_memory: int = LINK_MEMORY_OPTION,
+    count: str = COUNT_OPTION,
+):
+    """Mask a BSON (mongodump) or NDJSON file into another file."""
+    check_file_format(input_file)
+    check_file_format(output_file)
+    options = file_options(
+        batch_size,
+        show_warnings,
+        workers,
+        seed,
+        generator_options(
+            pool_size,
+            deterministic_key,
+            cache_memory,
+            locale,
+            dictionary,
+            dictionary_size,
+            link_store,
+            link_memory,
+        ),
+    )
+    options.partial_decode = partial_decode
+
+    async def run():
+        fields_to_anonymize = compile_fields(json.load(fields_to_anonymize_file))
+        source = FileSource(str(input_file), CODEC_OPTIONS, raw=options.raw_documents)
+        processed_documents = await mask_to_file(
+            [source],
+            str(output_file),
+            fields_to_anonymize,
+            await count_file(str(input_file), count),
+            options,
+        )
+        success(f"Data anonymized and written to {output_file}")
+        success(f"Total documents processed: {processed_documents}")
+
+    run_command(run())
+
+
+@app.command()
+def dump(
+    mongo_uri: str = typer.Argument(..., help="MongoDB connection URI"),
+    source_db: str = typer.Argument(..., help="Source database name"),
+    source_collection: str = typer.Argument(..., help="Source collection name"),
+    output_file: Path = typer.Argument(..., help="BSON or NDJSON file to write"),
+    fields_to_anonymize_file: typer.FileText = typer.Argument(
+        ..., help="JSON file with fields to anonymize"
+    ),
+    batch_size: Optional[int] = typer.Option(
+        None, min=1, help="Documents per batch (default: sized by bytes and latency)"
+    ),
+    show_warnings: bool = typer.Option(False, help="Show warnings"),
+    mongo_filter: str = typer.Option("{}", help="MongoDB filter as JSON string"),
+    workers: int = typer.Option(
+        0, min=0, help="Number of masking processes (0 masks on the event loop)"
+    ),
+    seed: Optional[int] = typer.Option(None, help="Seed for the fake data generator"),
+    locale: Optional[str] = LOCALE_OPTION,
+    pool_size: int = POOL_SIZE_OPTION,
+    deterministic_key: Optional[str] = DETERMINISTIC_KEY_OPTION,
+    cache_memory: int = CACHE_MEMORY_OPTION,
+    partial_decode: bool = PARTIAL_DECODE_OPTION,
+    dictionary: Optional[List[str]] = DICTIONARY_OPTION,
+    dictionary_size: int = DICTIONARY_SIZE_OPTION,
+    link_store: Optional[Path] = LINK_STORE_OPTION,
+    link_memory: int = LINK_MEMORY_OPTION,
+    count: str = COUNT_OPTION,
+):
+    """Mask a collection into a BSON (mongodump) or NDJSON file."""
+    check_file_format(output_file)
+    options = file_options(
+        batch_size,
+        show_warnings,
+        workers,
+        seed,
+        generator_options(
+            pool_size,
+            deterministic_key,
+            cache_memory,
+            locale,
+            dictionary,
+            dictionary_size,
+            link_store,
+            link_memory,
+        ),
+    )
+    options.partial_decode = partial_decode
+
+    async def run():
+        client = mongo_client(mongo_uri)
+        collection = client.get_database(source_db, codec_options=CODEC_OPTIONS)[
+            source_collection
+        ]
+        if options.raw_documents:
+            collection = collection.with_options(codec_options=RAW_CODEC_OPTIONS)
+        fields_to_anonymize = compile_fields(json.load(fields_to_anonymize_file))
+        filter_dict = json.loads(mongo_filter)
+        total_documents = await count_source(collection, [filter_dict], count)
+        if isinstance(total_documents, int):
+            info(f"Total documents to process: {total_documents}")
+        processed_documents = await mask_to_file(
+            [collection.find(filter_dict)],
+            str(output_file),
+            fields_to_anonymize,
+            total_documents,
+            options,
+        )
+        success(f"Data anonymized and written to {output_file}")
+        success(f"Total documents processed: {processed_documents}")
+
+    run_command(run())
+
+
+@app.command()
+def restore(
+    mongo_uri: str = typer.Argument(..., help="MongoDB connection URI"),
+    input_file: Path = typer.Argument(
+        ..., exists=True, dir_okay=False, help="BSON or NDJSON file to mask"
+    ),
+    target_db: str = typer.Argument(..., help="Target database name"),
+    target_collection: str = typer.Argument(..., help="Target collection name"),
+    fields_to_anonymize_file: typer.FileText = typer.Argument(
+        ..., help="JSON file with fields to anonymize"
+    ),
+    batch_size: Optional[int] = typer.Option(
+        None, min=1, help="Documents per batch (default: sized by bytes and latency)"
+    ),
+    show_warnings: bool = typer.Option(False, help="Show warnings"),
+    writers: int = typer.Option(
+        4, min=1, help="Number of concurrent insert_many calls in flight"
+    ),
+    workers: int = typer.Option(
+        0, min=0, help="Number of masking processes (0 masks on the event loop)"
+    ),
+    seed: Optional[int] = typer.Option(None, help="Seed for the fake data generator"),
+    locale: Optional[str] = LOCALE_OPTION,
+    pool_size: int = POOL_SIZE_OPTION,
+    deterministic_key: Optional[str] = DETERMINISTIC_KEY_OPTION,
+    cache_memory: int = CACHE_MEMORY_OPTION,
+    partial_decode: bool = PARTIAL_DECODE_OPTION,
+    dictionary: Optional[List[str]] = DICTIONARY_OPTION,
+    dictionary_size: int = DICTIONARY_SIZE_OPTION,
+    link_store: Optional[Path] = LINK_STORE_OPTION,
+    link_memory: int = LINK_MEMORY_OPTION,
+    write_mode: str = WRITE_MODE_OPTION,
+    write_retries: int = typer.Option(
+        3, min=0, help="Retries of the documents that failed in a batch"
+    ),
+    count: str = COUNT_OPTION,
+):
+    """Mask a BSON (mongodump) or NDJSON file into a collection."""
+    check_file_format(input_file)
+    options = file_options(
+        batch_size,
+        show_warnings,
+        workers,
+        seed,
+        generator_options(
+            pool_size,
+            deterministic_key,
+            cache_memory,
+            locale,
+            dictionary,
+            dictionary_size,
+            link_store,
+            link_memory,
+        ),
+    )
+    options.partial_decode = partial_decode
+    options.writers = writers
+
+    async def run():
+        client = mongo_client(mongo_uri)
+        collection = client.get_database(target_db, codec_options=CODEC_OPTIONS)[
+            target_collection
+        ]
+        fields_to_anonymize = compile_fields(json.load(fields_to_anonymize_file))
+        source = FileSource(str(input_file), CODEC_OPTIONS, raw=options.raw_documents)
+        writer = TargetWriter(collection, write_mode, retries=write_retries)
+        try:
+            processed_documents = await mask_documents(
+                [source],
+                writer.write,
+                fields_to_anonymize,
+                await count_file(str(input_file), count),
+                options,
+            )
+        except WriteFailed as exc:
+            error(str(exc))
+            raise typer.Exit(code=1)
+        if write_mode != "insert":
+            info(f"Documents written: {writer.summary()}")
         success(f"Data anonymized and copied to {target_db}.{target_collection}")
         success(f"Total documents processed: {processed_documents}")
 
-    asyncio.run(run())
+    run_command(run())
+
+
+@app.command()
+def watch(
+    mongo_uri: str = typer.Argument(..., help="MongoDB connection URI"),
+    source_db: str = typer.Argument(..., help="Source database name"),
+    source_collection: str = typer.Argument(..., help="Source collection name"),
+    target_db: str = typer.Argument(..., help="Target database name"),
+    target_collection: str = typer.Argument(..., help="Target collection name"),
+    fields_to_anonymize_file: typer.FileText = typer.Argument(
+        ..., help="JSON file with fields to anonymize"
+    ),
+    resume_token_file: Path = typer.Option(
+        ..., help="File recording the change stream position applied to the target"
+    ),
+    batch_size: int = typer.Option(100, help="Batch size for processing"),
+    flush_interval: float = typer.Option(
+        1.0, help="Seconds to wait for more changes before writing a batch"
+    ),
+    show_warnings: bool = typer.Option(False, help="Show warnings"),
+    mongo_filter: str = typer.Option("{}", help="MongoDB filter as JSON string"),
+    seed: Optional[int] = typer.Option(None, help="Seed for the fake data generator"),
+    locale: Optional[str] = LOCALE_OPTION,
+    deterministic_key: Optional[str] = DETERMINISTIC_KEY_OPTION,
+    cache_memory: int = CACHE_MEMORY_OPTION,
+):
+    """Copy the collection, then keep the target in sync with its change stream."""
+    configure_generators(
+        seed,
+        deterministic_key=deterministic_key,
+        cache_memory=cache_memory,
+        locale=locale,
+    )
+
+    async def run():
+        client = mongo_client(mongo_uri)
+        source_collection_handle = client.get_database(
+            source_db, codec_options=CODEC_OPTIONS
+        )[source_collection]
+        target_collection_handle = client.get_database(
+            target_db, codec_options=CODEC_OPTIONS
+        )[target_collection]
+        fields_to_anonymize = compile_fields(json.load(fields_to_anonymize_file))
+        check_data_types(fields_to_anonymize, locale)
+        filter_dict = json.loads(mongo_filter)
+        match = change_stream_match(filter_dict)
+        pipeline = [match] if match else []
+
+        resume_token = load_resume_token(resume_token_file)
+        if resume_token is None:
+            # open the stream before copying, changes made during the copy are
+            # replayed afterwards and writes are idempotent
+            async with source_collection_handle.watch(pipeline) as stream:
+                await stream.try_next()
+                resume_token = stream.resume_token
+            processed_documents = await copy_collection(
+                source_collection_handle,
+                target_collection_handle,
+                fields_to_anonymize,
+                filter_dict,
+                CopyOptions(batch_size=batch_size, show_warnings=show_warnings),
+            )
+            save_resume_token(resume_token_file, resume_token)
+            success(f"Initial copy done, {processed_documents} documents")
+        else:
+            info(f"Resuming from {resume_token_file}")
+
+        def on_flush(token, count):
+            save_resume_token(resume_token_file, token)
+            if count:
+                info(f"Applied {count} changes")
+
+        info(f"Watching {source_db}.{source_collection} for changes")
+        async with source_collection_handle.watch(
+            pipeline, full_document="updateLookup", resume_after=resume_token
+        ) as stream:
+            applied = await sync_changes(
+                stream,
+                target_collection_handle,
+                lambda document: anonymize_data(
+                    document, fields_to_anonymize, show_warnings
+                ),
+                batch_size=batch_size,
+                flush_interval=flush_interval,
+                on_flush=on_flush,
+            )
+        warning(f"change stream ended after {applied} changes")
+
+    run_command(run(), dictionaries=False)
+
+
+@app.command()
+def preview(
+    mongo_uri: str = typer.Argument(..., help="MongoDB connection URI"),
+    source_db: str = typer.Argument(..., help="Source database name"),
+    source_collection: str = typer.Argument(..., help="Source collection name"),
+    fields_to_anonymize_file: typer.FileText = typer.Argument(
+        ..., help="JSON file with fields to anonymize"
+    ),
+    sample_size: int = typer.Option(
+        1000, min=1, help="Documents picked by $sample and masked"
+    ),
+    mongo_filter: str = typer.Option("{}", help="MongoDB filter as JSON string"),
+    show: int = typer.Option(0, min=0, help="Masked documents to print"),
+    json_report: bool = typer.Option(
+        False, "--json", help="Print the coverage report as JSON"
+    ),
+    strict: bool = typer.Option(
+        False, help="Exit with status 1 if a path matched no document"
+    ),
+    seed: Optional[int] = typer.Option(None, help="Seed for the fake data generator"),
+    locale: Optional[str] = LOCALE_OPTION,
+    deterministic_key: Optional[str] = DETERMINISTIC_KEY_OPTION,
+):
+    """Mask a sample of documents without writing them and report coverage."""
+    configure_generators(seed, deterministic_key=deterministic_key, locale=locale)
+    fields_to_anonymize = compile_fields(json.load(fields_to_anonymize_file))
+    check_data_types(fields_to_anonymize, locale)
+    filter_dict = json.loads(mongo_filter)
+
+    async def run():
+        client = mongo_client(mongo_uri)
+        collection = client.get_database(source_db, codec_options=CODEC_OPTIONS)[
+            source_collection
+        ]
+        return await collection.aggregate(
+            [{"$match": filter_dict}, {"$sample": {"size": sample_size}}]
+        ).to_list(None)
+
+    documents = asyncio.run(run())
+    coverage = Coverage(fields_to_anonymize)
+    for document in documents:
+        coverage.add(document)
+    started = time.perf_counter()
+    for document in documents:
+        anonymize_data(document, fields_to_anonymize)
+    seconds = time.perf_counter() - started
+
+    if json_report:
+        typer.echo(json.dumps(dict(coverage.as_dict(), mask_seconds=seconds)))
+    else:
+        info(f"{len(documents)} documents sampled and masked in {seconds:.3f}s")
+        typer.echo(format_coverage(coverage))
+    for document in documents[:show]:
+        typer.echo(json_util.dumps(document, json_options=json_options(CODEC_OPTIONS)))
+    unmatched = [path for path, stats in coverage.paths.items() if not stats.hits]
+    if unmatched and documents:
+        warning(f"paths matching no sampled document: {', '.join(unmatched)}")
+        if strict:
+            raise typer.Exit(code=1)
+
+
+@app.command()
+def benchmark(
+    documents: int = typer.Option(1000, min=1, help="Documents per shape"),
+    values: int = typer.Option(2000, min=1, help="Values generated per data type"),
+    imports: int = typer.Option(
+        5, min=0, help="Interpreters started to time the import of the CLI"
+    ),
+    shape: Optional[List[str]] = typer.Option(
+        None, help="Shapes to run: flat, nested, array, wildcard (default: all)"
+    ),
+    mongo_uri: Optional[str] = typer.Option(
+        None, help="Copy through this server instead of in-memory collections"
+    ),
+    database: str = typer.Option(
+        "mongomasker_bench", help="Database of the copies through --mongo-uri"
+    ),
+    batch_size: Optional[int] = typer.Option(
+        None, min=1, help="Documents per batch (default: sized by bytes and latency)"
+    ),
+    workers: int = typer.Option(
+        0, min=0, help="Number of masking processes (0 masks on the event loop)"
+    ),
+    seed: Optional[int] = typer.Option(0, help="Seed for the fake data generator"),
+    locale: Optional[str] = LOCALE_OPTION,
+    pool_size: int = POOL_SIZE_OPTION,
+    deterministic_key: Optional[str] = typer.Option(
+        None, help="Secret key, mask every original value to the same fake value"
+    ),
+    partial_decode: bool = PARTIAL_DECODE_OPTION,
+):
+    """Measure the data types, the field shapes and the copy end to end."""
+    # imported here, the benchmark is not part of the startup it measures
+    from mongomasker_cli.bench import (
+        SHAPES,
+        bench_copy,
+        bench_data_types,
+        bench_shapes,
+        bench_startup,
+        format_results,
+    )
+
+    unknown = set(shape or ()) - set(SHAPES)
+    if unknown:
+        error(f"unknown shapes {', '.join(sorted(unknown))}")
+        raise typer.Exit(code=1)
+    shapes = {name: SHAPES[name] for name in shape} if shape else SHAPES
+    generator_options = dict(
+        pool_size=pool_size, deterministic_key=deterministic_key, locale=locale
+    )
+    configure_generators(seed, **generator_options)
+    options = CopyOptions(
+        batch_size=batch_size,
+        workers=workers,
+        seed=seed,
+        generator_options=generator_options,
+        partial_decode=partial_decode,
+        label="copy",
+    )
+
+    async def run():
+        database_handle = None
+        if mongo_uri is not None:
+            client = mongo_client(mongo_uri)
+            database_handle = client.get_database(database, codec_options=CODEC_OPTIONS)
+        return await bench_copy(documents, options, shapes, database_handle)
+
+    if imports:
+        typer.echo(
+            format_results(
+                "startup", bench_startup(imports), "import", rss="peak RSS MB"
+            )
+        )
+    typer.echo(format_results("data type", bench_data_types(values), "value"))
+    typer.echo(format_results("shape", bench_shapes(documents, shapes)))
+    copy_results = run_command(run(), dictionaries=False)
+    where = "mongod" if mongo_uri else "in memory"
+    typer.echo(format_results(f"copy ({where})", copy_results))
 
 
 if __name__ == "__main__":
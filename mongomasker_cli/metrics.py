@@ -0,0 +1,195 @@
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime, timezone
+
+# read: waiting on the source cursor, decode: decoding raw documents before
+# masking them, mask: the masking stage as a whole (including decode, and the
+# encode of partial decoding or worker processes), write: the write calls
+# (including the driver's encode)
+STAGES = ("read", "decode", "mask", "write")
+
+
+class Metrics:
+    """Counters and per stage timings of a copy.
+
+    Every stage accumulates the seconds spent in it. Divided by the elapsed
+    time and the number of tasks running the stage, that tells which of the
+    source, the masking CPU or the target a copy is waiting on.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.seconds = dict.fromkeys(STAGES, 0.0)
+        self.calls = dict.fromkeys(STAGES, 0)
+        # tasks running every stage, set by run_pipeline
+        self.concurrency = dict.fromkeys(STAGES, 1)
+        self.documents_read = 0
+        self.documents_written = 0
+        self.bytes_read = 0
+        # name to asyncio.Queue, their depths are reported
+        self.queues = {}
+
+    def record(self, stage, seconds):
+        self.seconds[stage] += seconds
+        self.calls[stage] += 1
+
+    def snapshot(self):
+        return {
+            "elapsed": time.monotonic() - self.started,
+            "documents_read": self.documents_read,
+            "documents_written": self.documents_written,
+            "bytes_read": self.bytes_read,
+            "queues": {name: queue.qsize() for name, queue in self.queues.items()},
+            "seconds": dict(self.seconds),
+            "calls": dict(self.calls),
+        }
+
+    def prometheus(self):
+        """Metrics in the Prometheus text exposition format."""
+        snapshot = self.snapshot()
+        lines = [
+            "# TYPE mongomasker_elapsed_seconds gauge",
+            f"mongomasker_elapsed_seconds {snapshot['elapsed']:.3f}",
+            "# TYPE mongomasker_documents_read_total counter",
+            f"mongomasker_documents_read_total {self.documents_read}",
+            "# TYPE mongomasker_documents_written_total counter",
+            f"mongomasker_documents_written_total {self.documents_written}",
+            "# TYPE mongomasker_bytes_read_total counter",
+            f"mongomasker_bytes_read_total {self.bytes_read}",
+            "# TYPE mongomasker_stage_seconds_total counter",
+        ]
+        lines += [
+            f'mongomasker_stage_seconds_total{{stage="{stage}"}} {seconds:.6f}'
+            for stage, seconds in self.seconds.items()
+        ]
+        lines.append("# TYPE mongomasker_stage_calls_total counter")
+        lines += [
+            f'mongomasker_stage_calls_total{{stage="{stage}"}} {calls}'
+            for stage, calls in self.calls.items()
+        ]
+        lines.append("# TYPE mongomasker_queue_depth gauge")
+        lines += [
+            f'mongomasker_queue_depth{{queue="{name}"}} {depth}'
+            for name, depth in snapshot["queues"].items()
+        ]
+        return "\n".join(lines) + "\n"
+
+
+# seconds between two writes of the Prometheus file without JSON lines
+DEFAULT_INTERVAL = 10.0
+
+
+class MetricsReporter:
+    """Write the metrics as a JSON line, and a Prometheus file, every `interval`.
+
+    Besides the totals, every line has the documents per second and the
+    utilization of every stage since the previous line: the share of the
+    stage's tasks' time spent in it. JSON lines go to `log_file`, or stderr,
+    unless `json_lines` is false.
+    """
+
+    def __init__(
+        self,
+        metrics,
+        interval,
+        log_file=None,
+        prometheus_file=None,
+        json_lines=True,
+    ):
+        self.metrics = metrics
+        self.interval = interval
+        self.log_file = log_file
+        self.prometheus_file = prometheus_file
+        self.json_lines = json_lines
+        self.previous = metrics.snapshot()
+        self.task = None
+
+    def report(self):
+        snapshot = self.metrics.snapshot()
+        elapsed = snapshot["elapsed"] - self.previous["elapsed"] or 1e-9
+        line = {
+            "time": datetime.now(timezone.utc).isoformat(),
+            "elapsed": round(snapshot["elapsed"], 3),
+            "documents_read": snapshot["documents_read"],
+            "documents_written": snapshot["documents_written"],
+            "documents_per_second": round(
+                (snapshot["documents_written"] - self.previous["documents_written"])
+                / elapsed,
+                1,
+            ),
+            "queues": snapshot["queues"],
+            "stages": {
+                stage: {
+                    "seconds": round(seconds, 3),
+                    "calls": snapshot["calls"][stage],
+                    "utilization": round(
+                        (seconds - self.previous["seconds"][stage])
+                        / elapsed
+                        / self.metrics.concurrency[stage],
+                        3,
+                    ),
+                }
+                for stage, seconds in snapshot["seconds"].items()
+            },
+        }
+        self.previous = snapshot
+        if self.json_lines and self.log_file is None:
+            print(json.dumps(line), file=sys.stderr, flush=True)
+        elif self.json_lines:
+            with open(self.log_file, "a") as log_file:
+                log_file.write(json.dumps(line) + "\n")
+        if self.prometheus_file is not None:
+            write_prometheus_file(self.metrics, self.prometheus_file)
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.report()
+
+    def start(self):
+        self.task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            await asyncio.gather(self.task, return_exceptions=True)
+        self.report()
+
+
+def write_prometheus_file(metrics, path):
+    # for the node_exporter textfile collector, which must never see a
+    # partially written file
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as prometheus_file:
+        prometheus_file.write(metrics.prometheus())
+    os.replace(temporary_path, path)
+
+
+# interface the metrics are served on unless told otherwise, local only
+DEFAULT_PROMETHEUS_HOST = "127.0.0.1"
+
+
+async def start_prometheus_server(metrics, port, host=DEFAULT_PROMETHEUS_HOST):
+    """Serve the metrics over HTTP on `host`:`port`, for Prometheus to scrape."""
+
+    async def handle(reader, writer):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError):
+            writer.close()
+            return
+        body = metrics.prometheus().encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\n"
+            b"Content-Type: text/plain; version=0.0.4\r\n"
+            + f"Content-Length: {len(body)}\r\n".encode()
+            + b"Connection: close\r\n\r\n"
+            + body
+        )
+        await writer.drain()
+        writer.close()
+
+    return await asyncio.start_server(handle, host, port)
@@ -0,0 +1,79 @@
+from datetime import datetime
+
+from bson.objectid import ObjectId
+
+# number of sampled _id values per partition used to pick the boundaries
+SAMPLES_PER_PARTITION = 20
+
+
+# $type alias of an _id value whose type can be split into ranges. Range
+# queries only match values of the same BSON type (all numeric types compare
+# with each other), so every partition is limited to that type.
+def _id_type(value):
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, (int, float)):
+        return "number"
+    if isinstance(value, str):
+        return "string"
+    if isinstance(value, ObjectId):
+        return "objectId"
+    if isinstance(value, datetime):
+        return "date"
+    return None
+
+
+def split_ids(ids, partitions):
+    """Pick `partitions - 1` boundaries from a sample of _id values.
+
+    Returns the $type alias of the ids and the sorted boundaries, or
+    (None, []) when the sample can't be split into ranges.
+    """
+    id_types = {_id_type(value) for value in ids}
+    if len(id_types) != 1 or None in id_types:
+        return None, []
+    ids = sorted(set(ids))
+    step = len(ids) / partitions
+    boundaries = sorted({ids[int(step * i)] for i in range(1, partitions)})
+    # the smallest sampled id would make the first range empty
+    boundaries = [value for value in boundaries if value != ids[0]]
+    return id_types.pop(), boundaries
+
+
+def partition_filters(filter_dict, id_type, boundaries):
+    """Build one query per _id range, each ANDed with `filter_dict`.
+
+    The ranges cover every _id of type `id_type`, and one extra query matches
+    the documents whose _id has any other type, so the partitions together
+    match exactly the documents matched by `filter_dict`.
+    """
+    if id_type is None or not boundaries:
+        return [filter_dict]
+    bounds = [None] + list(boundaries) + [None]
+    conditions = []
+    for low, high in zip(bounds, bounds[1:]):
+        condition = {}
+        if low is not None:
+            condition["$gte"] = low
+        if high is not None:
+            condition["$lt"] = high
+        conditions.append({"_id": condition})
+    conditions.append({"_id": {"$not": {"$type": id_type}}})
+    if not filter_dict:
+        return conditions
+    return [{"$and": [filter_dict, condition]} for condition in conditions]
+
+
+async def sample_partition_filters(collection, filter_dict, partitions):
+    if partitions <= 1:
+        return [filter_dict]
+    cursor = collection.aggregate(
+        [
+            {"$match": filter_dict},
+            {"$sample": {"size": partitions * SAMPLES_PER_PARTITION}},
+            {"$project": {"_id": 1}},
+        ]
+    )
+    ids = [document["_id"] async for document in cursor]
+    id_type, boundaries = split_ids(ids, partitions)
+    return partition_filters(filter_dict, id_type, boundaries)
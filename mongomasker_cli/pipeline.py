@@ -0,0 +1,231 @@
+import asyncio
+import inspect
+import time
+
+from mongomasker_cli.batching import document_size
+
+# marks the end of a stream of batches on a queue
+_DONE = object()
+
+
+class Batch:
+    """Documents read together from one cursor.
+
+    `source` is the index of the cursor and `sequence` the position of the
+    batch among the batches read from it. `size` is the BSON size of the
+    documents as read, when they were read as raw BSON.
+    """
+
+    __slots__ = ("source", "sequence", "documents", "size")
+
+    def __init__(self, source, sequence, documents, size=0):
+        self.source = source
+        self.sequence = sequence
+        self.documents = documents
+        self.size = size
+
+    def __len__(self):
+        return len(self.documents)
+
+
+async def read_batches(
+    cursor,
+    batch_size,
+    queue,
+    source=0,
+    on_read=None,
+    batcher=None,
+    metrics=None,
+    budget=None,
+):
+    started = time.perf_counter()
+
+    async def put(sequence, documents, size):
+        nonlocal started
+        batch = Batch(source, sequence, documents, size)
+        if metrics is not None:
+            # time waiting on the cursor, not on the full queue
+            metrics.record("read", time.perf_counter() - started)
+            metrics.documents_read += len(batch)
+            metrics.bytes_read += size
+        if on_read is not None:
+            on_read(batch)
+        await queue.put(batch)
+        started = time.perf_counter()
+
+    sequence = 0
+    documents = []
+    size = 0
+    async for document in cursor:
+        documents.append(document)
+        if batcher is not None or budget is not None:
+            document_bytes = document_size(document)
+            size += document_bytes
+            if budget is not None:
+                budget.acquire(document_bytes)
+        if batcher is None:
+            full = len(documents) >= batch_size
+        else:
+            full = batcher.is_full(len(documents), size)
+        if full or (budget is not None and budget.exhausted):
+            # a partial batch is cut when the budget runs out, it could only
+            # be released once written
+            await put(sequence, documents, size)
+            sequence += 1
+            documents = []
+            size = 0
+        if budget is not None:
+            await budget.wait()
+    if documents:
+        await put(sequence, documents, size)
+
+
+async def mask_batches(in_queue, out_queue, mask, metrics=None):
+    while True:
+        batch = await in_queue.get()
+        if batch is _DONE:
+            return
+        started = time.perf_counter()
+        masked = mask(batch.documents)
+        if inspect.isawaitable(masked):
+            masked = await masked
+        if metrics is not None:
+            metrics.record("mask", time.perf_counter() - started)
+        batch.documents = masked
+        await out_queue.put(batch)
+        # not kept alive while waiting for the next batch
+        batch = masked = None
+
+
+async def write_batches(
+    queue, write, on_written=None, batcher=None, metrics=None, budget=None
+):
+    while True:
+        batch = await queue.get()
+        if batch is _DONE:
+            return
+        started = time.perf_counter()
+        await write(batch.documents)
+        seconds = time.perf_counter() - started
+        if batcher is not None:
+            batcher.observe(batch.size, seconds)
+        if metrics is not None:
+            metrics.record("write", seconds)
+            metrics.documents_written += len(batch)
+        if on_written is not None:
+            on_written(batch)
+        if budget is not None:
+            budget.release(batch.size)
+        # not kept alive while waiting for the next batch
+        batch = None
+
+
+async def _supervise(tasks):
+    # wait for every task, but cancel the rest as soon as one of them fails so
+    # that a failed writer does not leave the reader blocked on a full queue
+    try:
+        done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+    except asyncio.CancelledError:
+        for task in tasks:
+            task.cancel()
+        raise
+    for task in pending:
+        task.cancel()
+    if pending:
+        await asyncio.gather(*pending, return_exceptions=True)
+    for task in done:
+        if task.exception() is not None:
+            raise task.exception()
+
+
+async def run_pipeline(
+    cursors,
+    mask,
+    write,
+    batch_size=100,
+    writers=4,
+    queue_size=None,
+    on_written=None,
+    maskers=1,
+    on_read=None,
+    batcher=None,
+    metrics=None,
+    budget=None,
+):
+    """Copy documents from `cursors` through `mask` into `write`.
+
+    One reader per cursor, the masking stage and `writers` concurrent writers run as
+    separate tasks connected by bounded queues, so reading the next batch,
+    masking the current one and inserting earlier ones overlap. `queue_size`
+    bounds the number of batches buffered between two stages (defaults to the
+    larger of `writers` and `maskers`).
+
+    `mask` may be a plain function or return an awaitable; in the latter case
+    `maskers` batches are masked concurrently, e.g. in a process pool.
+
+    `on_read` and `on_written` are called with every Batch as soon as it has
+    been read and written respectively.
+
+    With a `batcher`, e.g. an AdaptiveBatcher, batches are cut by their BSON
+    size instead of `batch_size` documents, and the batcher is told how long
+    every write took.
+
+    `metrics`, a Metrics, gets the time spent in every stage, the documents
+    read and written and the queues between the stages.
+
+    With a `budget`, a MemoryBudget, readers stop reading while the BSON size
+    of the documents read and not written yet exceeds it, and cut the batch
+    they are filling so that it can be written.
+    """
+    if writers < 1:
+        raise ValueError("writers must be at least 1")
+    if maskers < 1:
+        raise ValueError("maskers must be at least 1")
+    queue_size = queue_size or max(writers, maskers)
+    mask_queue = asyncio.Queue(maxsize=queue_size)
+    write_queue = asyncio.Queue(maxsize=queue_size)
+    if metrics is not None:
+        metrics.queues.update(mask=mask_queue, write=write_queue)
+        metrics.concurrency.update(
+            read=len(cursors), decode=maskers, mask=maskers, write=writers
+        )
+
+    async def reader():
+        await asyncio.gather(
+            *(
+                read_batches(
+                    cursor,
+                    batch_size,
+                    mask_queue,
+                    source,
+                    on_read,
+                    batcher,
+                    metrics,
+                    budget,
+                )
+                for source, cursor in enumerate(cursors)
+            )
+        )
+        for _ in range(maskers):
+            await mask_queue.put(_DONE)
+
+    async def masker():
+        await asyncio.gather(
+            *(
+                mask_batches(mask_queue, write_queue, mask, metrics)
+                for _ in range(maskers)
+            )
+        )
+        for _ in range(writers):
+            await write_queue.put(_DONE)
+
+    tasks = [
+        asyncio.ensure_future(reader()),
+        asyncio.ensure_future(masker()),
+    ] + [
+        asyncio.ensure_future(
+            write_batches(write_queue, write, on_written, batcher, metrics, budget)
+        )
+        for _ in range(writers)
+    ]
+    await _supervise(tasks)
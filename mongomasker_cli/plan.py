@@ -0,0 +1,129 @@
+from functools import partial
+
+
+class FieldNode:
+    """One key of the fields to anonymize, shared by all paths through it."""
+
+    __slots__ = ("key", "path", "data_type", "children", "wildcard")
+
+    def __init__(self, key, path):
+        self.key = key
+        self.path = path
+        # type of fake data for a path ending at this node
+        self.data_type = None
+        self.children = {}
+        # node for "*", applied to every key of the document
+        self.wildcard = None
+
+    def child(self, key):
+        if key == "*":
+            if self.wildcard is None:
+                self.wildcard = FieldNode(key, self._child_path(key))
+            return self.wildcard
+        if key not in self.children:
+            self.children[key] = FieldNode(key, self._child_path(key))
+        return self.children[key]
+
+    def _child_path(self, key):
+        return f"{self.path}.{key}" if self.path else key
+
+
+class FieldPlan:
+    """Fields to anonymize compiled into a prefix tree.
+
+    Dotted paths are split once, paths with a common prefix share the nodes of
+    that prefix and a document is masked in a single walk over the tree.
+    Lists are fanned out to their dict items at any level and "*" matches every
+    key of a document.
+    """
+
+    def __init__(self, fields):
+        self.fields = dict(fields)
+        self.root = FieldNode(None, "")
+        for field, data_type in self.fields.items():
+            node = self.root
+            for key in field.split("."):
+                node = node.child(key)
+            node.data_type = data_type
+        # encoded top-level keys, for masking raw BSON without decoding it all
+        self.root_keys = frozenset(key.encode() for key in self.root.children)
+
+    def apply(self, document, generate, warn=None):
+        """Mask `document` in place.
+
+        `generate(data_type, value)` returns the masked value and `warn`, if
+        given, is called with a message for every path that can't be applied.
+        """
+
+        def mask(node, doc, key):
+            doc[key] = generate(node.data_type, doc[key])
+
+        _walk_dict(self.root, document, mask, warn)
+        return document
+
+    def apply_batch(self, documents, generators, warn=None):
+        """Mask the list `documents` in place, one path of the plan at a time.
+
+        The values of every path are collected over the whole batch and
+        replaced by `generators.field(path, data_type).many(values)`, a
+        single call per path and batch. `warn`, if given, is called with the document and the
+        message for every path that can't be applied.
+        """
+        slots = {}
+
+        def collect(node, doc, key):
+            node_slots = slots.get(node)
+            if node_slots is None:
+                node_slots = slots[node] = []
+            node_slots.append((doc, key))
+
+        for document in documents:
+            _walk_dict(
+                self.root,
+                document,
+                collect,
+                None if warn is None else partial(warn, document),
+            )
+        # in the order of the single document walk, so a key matched by a
+        # wildcard and a named path ends up with the same value as with apply
+        for node, node_slots in slots.items():
+            values = generators.field(node.path, node.data_type).many(
+                [doc[key] for doc, key in node_slots]
+            )
+            for (doc, key), value in zip(node_slots, values):
+                doc[key] = value
+        return documents
+
+
+def compile_fields(fields):
+    if isinstance(fields, FieldPlan):
+        return fields
+    return FieldPlan(fields)
+
+
+def _mask_key(node, doc, key, visit, warn):
+    if node.data_type is not None:
+        visit(node, doc, key)
+    elif isinstance(doc[key], dict):
+        _walk_dict(node, doc[key], visit, warn)
+    elif isinstance(doc[key], list):
+        _walk_list(node, doc[key], visit, warn)
+
+
+def _walk_dict(node, doc, visit, warn):
+    for key, child in node.children.items():
+        if key in doc:
+            _mask_key(child, doc, key, visit, warn)
+        elif warn is not None and child.data_type is not None:
+            warn(f"key {child.path} of type {child.data_type} not found in document")
+    if node.wildcard is not None:
+        for key in list(doc):
+            _mask_key(node.wildcard, doc, key, visit, warn)
+
+
+def _walk_list(node, items, visit, warn):
+    for item in items:
+        if isinstance(item, dict):
+            _walk_dict(node, item, visit, warn)
+        elif warn is not None:
+            warn(f"nested list not supported, {node.path} is a list in {items}")
@@ -0,0 +1,115 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime
+
+from mongomasker_cli.fakers import numeric_zipcodes, zipcode
+
+# fake dates are between this day and today, like Faker's date()
+_EPOCH = date(1970, 1, 1).toordinal()
+
+
+def _faker_values(method):
+    def fill(fake, size):
+        generate = getattr(fake, method)
+        return [generate() for _ in range(size)]
+
+    return fill
+
+
+def _lastnamefirstname_values(fake, size):
+    return [fake.last_name() + "," + fake.first_name() for _ in range(size)]
+
+
+def _date_ordinals(fake, size):
+    return fake.random.choices(range(_EPOCH, date.today().toordinal() + 1), k=size)
+
+
+def _date_values(fake, size):
+    return [datetime.fromordinal(ordinal) for ordinal in _date_ordinals(fake, size)]
+
+
+def _datestr_values(fake, size):
+    return [
+        date.fromordinal(ordinal).isoformat() for ordinal in _date_ordinals(fake, size)
+    ]
+
+
+def _zipcode_values(fake, size):
+    if not numeric_zipcodes(fake):
+        return [zipcode(fake) for _ in range(size)]
+    # same range as Faker's en_US postcode()
+    return ["%05d" % value for value in fake.random.choices(range(501, 99951), k=size)]
+
+
+def _id_values(fake, size):
+    return [str(value) for value in fake.random.choices(range(10**10), k=size)]
+
+
+# Functions generating `size` fake values of a data type at once
+FILLERS = {
+    "name": _faker_values("first_name"),
+    "company": _faker_values("company"),
+    "email": _faker_values("email"),
+    "address": _faker_values("address"),
+    "date": _date_values,
+    "datestr": _datestr_values,
+    "zipcode": _zipcode_values,
+    "statecode": _faker_values("state_abbr"),
+    "lastname": _faker_values("last_name"),
+    "lastnamefirstname": _lastnamefirstname_values,
+    "city": _faker_values("city"),
+    "id": _id_values,
+}
+DEFAULT_FILLER = _faker_values("word")
+
+
+class ValuePool:
+    """Hand out pre-generated values of one data type.
+
+    The next block of values is generated by `executor` while the current one
+    is handed out, so taking a value is an index increment.
+    """
+
+    def __init__(self, fill, fake, size, executor):
+        self.fill = fill
+        self.fake = fake
+        self.size = size
+        self.executor = executor
+        # filled by the executor too, it is the only thread using `fake`
+        self.values = executor.submit(fill, fake, size).result()
+        self.index = 0
+        self.next_values = executor.submit(fill, fake, size)
+
+    def take(self):
+        if self.index >= len(self.values):
+            self.values = self.next_values.result()
+            self.index = 0
+            self.next_values = self.executor.submit(self.fill, self.fake, self.size)
+        value = self.values[self.index]
+        self.index += 1
+        return value
+
+
+class ValuePools:
+    """One ValuePool per data type, created on first use.
+
+    `fakers` maps a data type to the Faker generating its values, e.g. Fakers.
+    """
+
+    def __init__(self, fakers, size):
+        self.fakers = fakers
+        self.size = size
+        self.pools = {}
+        # a single refill thread, Faker instances are not thread safe
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def take(self, data_type):
+        pool = self.pools.get(data_type)
+        if pool is None:
+            fill = FILLERS.get(data_type, DEFAULT_FILLER)
+            pool = self.pools[data_type] = ValuePool(
+                fill, self.fakers[data_type], self.size, self.executor
+            )
+        return pool.take()
+
+    def close(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,129 @@
+from collections import Counter
+
+
+class PathCoverage:
+    """How one path of the fields to anonymize matched the sampled documents.
+
+    `hits` counts the values masked and `types` their Python types, `lists`
+    the hits reached through a list. `misses` counts the documents, or objects
+    in a list, missing the path, and `non_documents` the values standing where
+    the path goes on that are neither an object nor a list of objects.
+    """
+
+    __slots__ = (
+        "path",
+        "data_type",
+        "hits",
+        "misses",
+        "lists",
+        "non_documents",
+        "types",
+    )
+
+    def __init__(self, path, data_type):
+        self.path = path
+        self.data_type = data_type
+        self.hits = 0
+        self.misses = 0
+        self.lists = 0
+        self.non_documents = 0
+        self.types = Counter()
+
+    def as_dict(self):
+        return {
+            "path": self.path,
+            "data_type": self.data_type,
+            "hits": self.hits,
+            "misses": self.misses,
+            "lists": self.lists,
+            "non_documents": self.non_documents,
+            "types": dict(self.types.most_common()),
+        }
+
+
+def _type_name(value):
+    return "null" if value is None else type(value).__name__
+
+
+def _leaves(node):
+    if node.data_type is not None:
+        yield node
+        return
+    for child in node.children.values():
+        yield from _leaves(child)
+    if node.wildcard is not None:
+        yield from _leaves(node.wildcard)
+
+
+class Coverage:
+    """Coverage of a FieldPlan over sampled documents, aggregated per path.
+
+    Walks documents the way FieldPlan.apply does, without masking them, and
+    counts what every path met instead of warning once per document.
+    """
+
+    def __init__(self, plan):
+        self.plan = plan
+        self.documents = 0
+        self.paths = {
+            leaf.path: PathCoverage(leaf.path, leaf.data_type)
+            for leaf in _leaves(plan.root)
+        }
+
+    def add(self, document):
+        self.documents += 1
+        self._walk_dict(self.plan.root, document, False)
+
+    def _walk_key(self, node, value, through_list):
+        if node.data_type is not None:
+            coverage = self.paths[node.path]
+            coverage.hits += 1
+            coverage.lists += through_list
+            coverage.types[_type_name(value)] += 1
+        elif isinstance(value, dict):
+            self._walk_dict(node, value, through_list)
+        elif isinstance(value, list):
+            self._walk_list(node, value)
+        else:
+            for leaf in _leaves(node):
+                self.paths[leaf.path].non_documents += 1
+
+    def _walk_dict(self, node, doc, through_list):
+        for key, child in node.children.items():
+            if key in doc:
+                self._walk_key(child, doc[key], through_list)
+            else:
+                for leaf in _leaves(child):
+                    self.paths[leaf.path].misses += 1
+        if node.wildcard is not None:
+            for key in doc:
+                self._walk_key(node.wildcard, doc[key], through_list)
+
+    def _walk_list(self, node, items):
+        for item in items:
+            if isinstance(item, dict):
+                self._walk_dict(node, item, True)
+            else:
+                for leaf in _leaves(node):
+                    self.paths[leaf.path].non_documents += 1
+
+    def as_dict(self):
+        return {
+            "documents": self.documents,
+            "paths": [coverage.as_dict() for coverage in self.paths.values()],
+        }
+
+
+def format_coverage(coverage):
+    width = max([len("path"), *(len(path) for path in coverage.paths)]) + 2
+    lines = [
+        f"{'path':<{width}}{'type':<20}{'hits':>8}{'misses':>8}{'lists':>8}"
+        f"{'non-doc':>9}  value types"
+    ]
+    for path in coverage.paths.values():
+        types = ", ".join(f"{name} {count}" for name, count in path.types.most_common())
+        lines.append(
+            f"{path.path:<{width}}{path.data_type:<20}{path.hits:>8}{path.misses:>8}"
+            f"{path.lists:>8}{path.non_documents:>9}  {types}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,74 @@
+import sys
+import time
+
+import typer
+
+# seconds between two progress lines of a collection
+LOG_INTERVAL = 5.0
+
+
+class LogProgress:
+    """Progress of one of several concurrent copies, printed as lines.
+
+    Progress bars of concurrent copies would overwrite each other, so the
+    count of documents written is printed with the collection name at most
+    every `interval` seconds and once more when the copy ends.
+    """
+
+    def __init__(self, label, length, interval=LOG_INTERVAL):
+        self.label = label
+        self.length = length
+        self.interval = interval
+        self.done = 0
+        self.last_print = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.print()
+
+    def update(self, count):
+        self.done += count
+        if time.monotonic() - self.last_print >= self.interval:
+            self.print()
+
+    def print(self):
+        self.last_print = time.monotonic()
+        if self.length is None:
+            typer.echo(f"{self.label}: {self.done} documents")
+        else:
+            typer.echo(f"{self.label}: {self.done}/{self.length} documents")
+
+
+class LineProgress(LogProgress):
+    """Progress whose total may be unknown, or only known later.
+
+    The count of documents written, their rate and, once `length` is set, the
+    percentage done are redrawn in place on a terminal, or printed as lines
+    every LOG_INTERVAL seconds otherwise.
+    """
+
+    def __init__(self, label, length=None):
+        self.tty = sys.stdout.isatty()
+        super().__init__(label, length, 0.2 if self.tty else LOG_INTERVAL)
+        self.started = time.monotonic()
+
+    def __exit__(self, *exc_info):
+        self.print()
+        if self.tty:
+            typer.echo("")
+
+    def print(self):
+        self.last_print = time.monotonic()
+        rate = self.done / max(self.last_print - self.started, 1e-9)
+        line = f"{self.label}: {self.done}"
+        if self.length:
+            line += f"/{self.length} documents ({min(self.done / self.length, 1):.0%})"
+        else:
+            line += " documents"
+        line += f", {rate:.0f}/s"
+        if self.tty:
+            typer.echo(f"\r{line}\033[K", nl=False)
+        else:
+            typer.echo(line)
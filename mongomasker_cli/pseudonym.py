@@ -0,0 +1,155 @@
+import hashlib
+import hmac
+import sys
+from collections import OrderedDict
+from datetime import date, datetime
+
+import bson
+
+from mongomasker_cli.fakers import Fakers, numeric_zipcodes, zipcode
+
+_MISSING = object()
+
+# rough per entry cost of an OrderedDict item and its key tuple
+ENTRY_OVERHEAD = 200
+
+# deterministic dates use a fixed range so that results don't change with the day
+_FIRST_DAY = date(1970, 1, 1).toordinal()
+_LAST_DAY = date(2024, 12, 31).toordinal()
+
+
+class LRUCache:
+    """Least recently used mapping bounded by an estimate of its memory use."""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value[0]
+
+    def put(self, key, value):
+        if key in self.entries:
+            self.bytes -= self.entries.pop(key)[1]
+        size = sys.getsizeof(key) + sys.getsizeof(value) + ENTRY_OVERHEAD
+        self.entries[key] = (value, size)
+        self.bytes += size
+        while self.bytes > self.max_bytes and self.entries:
+            self.bytes -= self.entries.popitem(last=False)[1][1]
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def _canonical(value):
+    try:
+        return bson.encode({"v": value})
+    except (bson.errors.InvalidDocument, TypeError, OverflowError):
+        return repr(value).encode()
+
+
+def _number(digest):
+    return int.from_bytes(digest[:8], "big")
+
+
+def _id_value(fake, digest):
+    return str(_number(digest) % 10**10)
+
+
+def _zipcode_value(fake, digest):
+    if not numeric_zipcodes(fake):
+        fake.seed_instance(_number(digest))
+        return zipcode(fake)
+    return "%05d" % (501 + _number(digest) % (99951 - 501))
+
+
+def _date_value(fake, digest):
+    return datetime.fromordinal(_FIRST_DAY + _number(digest) % (_LAST_DAY - _FIRST_DAY))
+
+
+def _datestr_value(fake, digest):
+    return _date_value(fake, digest).date().isoformat()
+
+
+def _faker_value(method):
+    def value(fake, digest):
+        fake.seed_instance(_number(digest))
+        return getattr(fake, method)()
+
+    return value
+
+
+def _lastnamefirstname_value(fake, digest):
+    fake.seed_instance(_number(digest))
+    return fake.last_name() + "," + fake.first_name()
+
+
+# Functions selecting the fake value of a data type from an HMAC digest
+VALUES = {
+    "name": _faker_value("first_name"),
+    "company": _faker_value("company"),
+    "email": _faker_value("email"),
+    "address": _faker_value("address"),
+    "date": _date_value,
+    "datestr": _datestr_value,
+    "zipcode": _zipcode_value,
+    "statecode": _faker_value("state_abbr"),
+    "lastname": _faker_value("last_name"),
+    "lastnamefirstname": _lastnamefirstname_value,
+    "city": _faker_value("city"),
+    "id": _id_value,
+}
+DEFAULT_VALUE = _faker_value("word")
+
+
+class Pseudonymizer:
+    """Map every original value to the same fake value for a given key.
+
+    The fake value is selected by an HMAC of the data type and the original
+    value, so it is stable across documents, collections and runs, and
+    repeated values are served from an LRU cache.
+    """
+
+    def __init__(self, key, cache_bytes, locale=None):
+        self.key = key.encode() if isinstance(key, str) else key
+        self.cache = LRUCache(cache_bytes)
+        # reseeded from the digest for every value
+        self.fakers = Fakers(locale=locale)
+
+    def digest(self, data_type, value):
+        message = data_type.encode() + b"\0" + _canonical(value)
+        return hmac.new(self.key, message, hashlib.sha256).digest()
+
+    def generate(self, data_type, original_val):
+        select = VALUES.get(data_type, DEFAULT_VALUE)
+        digest = self.digest(data_type, original_val)
+        fake = self.fakers[data_type]
+        new_value = select(fake, digest)
+        while new_value == original_val:
+            digest = hashlib.sha256(digest).digest()
+            new_value = select(fake, digest)
+        return new_value
+
+    def mask(self, data_type, original_val):
+        try:
+            # the type keeps e.g. 1 and True apart
+            key = (data_type, type(original_val), original_val)
+            hash(key)
+        except TypeError:
+            # e.g. embedded documents, not worth caching
+            return self.generate(data_type, original_val)
+        new_value = self.cache.get(key, _MISSING)
+        if new_value is _MISSING:
+            new_value = self.generate(data_type, original_val)
+            self.cache.put(key, new_value)
+        return new_value
@@ -0,0 +1,100 @@
+import struct
+
+import bson
+
+_INT32 = struct.Struct("<i")
+
+# size of the fixed length BSON element values by type byte
+_FIXED_SIZES = {
+    0x01: 8,  # double
+    0x06: 0,  # undefined
+    0x07: 12,  # ObjectId
+    0x08: 1,  # bool
+    0x09: 8,  # UTC datetime
+    0x0A: 0,  # null
+    0x10: 4,  # int32
+    0x11: 8,  # timestamp
+    0x12: 8,  # int64
+    0x13: 16,  # decimal128
+    0x7F: 0,  # max key
+    0xFF: 0,  # min key
+}
+# types whose value is a length prefixed string
+_STRING_TYPES = (0x02, 0x0D, 0x0E)
+# types whose value starts with its total length
+_SIZED_TYPES = (0x03, 0x04, 0x0F)
+
+
+def _value_end(data, element_type, start):
+    size = _FIXED_SIZES.get(element_type)
+    if size is not None:
+        return start + size
+    if element_type in _STRING_TYPES:
+        return start + 4 + _INT32.unpack_from(data, start)[0]
+    if element_type in _SIZED_TYPES:
+        return start + _INT32.unpack_from(data, start)[0]
+    if element_type == 0x05:  # binary: length, subtype, bytes
+        return start + 5 + _INT32.unpack_from(data, start)[0]
+    if element_type == 0x0B:  # regex: pattern and options cstrings
+        return data.index(b"\0", data.index(b"\0", start) + 1) + 1
+    if element_type == 0x0C:  # DBPointer: string and ObjectId
+        return start + 4 + _INT32.unpack_from(data, start)[0] + 12
+    raise bson.errors.InvalidBSON(f"unknown element type {element_type:#x}")
+
+
+def element_spans(data):
+    """Yield (name, start, end) of the top-level elements of a BSON document.
+
+    `name` is the raw UTF-8 key, data[start:end] is the whole element.
+    """
+    position = 4
+    end_of_document = _INT32.unpack_from(data, 0)[0] - 1
+    while position < end_of_document:
+        name_end = data.index(b"\0", position + 1)
+        end = _value_end(data, data[position], name_end + 1)
+        yield data[position + 1 : name_end], position, end
+        position = end
+
+
+def _document(elements):
+    return _INT32.pack(len(elements) + 5) + elements + b"\0"
+
+
+def mask_raw_bson(data, plan, mask, codec_options=bson.DEFAULT_CODEC_OPTIONS):
+    """Mask the BSON document `data` with `plan`, returning BSON bytes.
+
+    `mask(document)` masks a decoded document in place with the plan and
+    returns it, e.g. `lambda document: plan.apply(document, generate)`. Only
+    the top-level elements the plan touches are decoded, masked and encoded
+    again; all other elements are copied as they are, and `data` itself is
+    returned when the document has none of the planned fields.
+    """
+    if plan.root.wildcard is not None:
+        # every element may be touched
+        document = bson.decode(data, codec_options)
+        return bson.encode(mask(document), codec_options=codec_options)
+
+    touched = [span for span in element_spans(data) if span[0] in plan.root_keys]
+    if not touched:
+        # for the warnings of the missing fields
+        mask({})
+        return data
+
+    subset = bson.decode(
+        _document(b"".join(data[start:end] for _, start, end in touched)),
+        codec_options,
+    )
+    masked = bson.encode(mask(subset), codec_options=codec_options)
+    replacements = {
+        name: masked[start:end] for name, start, end in element_spans(masked)
+    }
+
+    # splice the masked elements between the untouched byte ranges
+    parts = []
+    position = 4
+    for name, start, end in touched:
+        parts.append(data[position:start])
+        parts.append(replacements[name])
+        position = end
+    parts.append(data[position:-1])
+    return _document(b"".join(parts))
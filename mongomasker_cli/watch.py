@@ -0,0 +1,121 @@
+import os
+import time
+
+from bson import json_util
+
+JSON_OPTIONS = json_util.CANONICAL_JSON_OPTIONS
+
+# operation types that end a change stream on a collection
+_END_OF_STREAM = ("drop", "rename", "dropDatabase", "invalidate")
+
+
+def change_stream_match(filter_dict):
+    """$match stage applying a find() filter to the changed documents.
+
+    Field names are moved under fullDocument, deletes always pass since the
+    deleted document is not part of the event.
+    """
+    if not filter_dict:
+        return None
+    return {
+        "$match": {
+            "$or": [
+                {"operationType": "delete"},
+                _prefix_fields(filter_dict, "fullDocument."),
+            ]
+        }
+    }
+
+
+def _prefix_fields(filter_dict, prefix):
+    prefixed = {}
+    for key, value in filter_dict.items():
+        if key in ("$and", "$or", "$nor"):
+            prefixed[key] = [_prefix_fields(clause, prefix) for clause in value]
+        elif key.startswith("$"):
+            prefixed[key] = value
+        else:
+            prefixed[prefix + key] = value
+    return prefixed
+
+
+def load_resume_token(path):
+    if not os.path.exists(path):
+        return None
+    with open(path) as token_file:
+        return json_util.loads(token_file.read(), json_options=JSON_OPTIONS)
+
+
+def save_resume_token(path, token):
+    temporary_path = f"{path}.tmp"
+    with open(temporary_path, "w") as token_file:
+        token_file.write(json_util.dumps(token, json_options=JSON_OPTIONS))
+    os.replace(temporary_path, path)
+
+
+def change_to_operation(change, mask):
+    """Write applying a change event to the target, None if there is nothing to do."""
+    # imported here to keep pymongo out of the startup, see main.mongo_client
+    from pymongo import DeleteOne, ReplaceOne
+
+    operation_type = change["operationType"]
+    if operation_type == "delete":
+        return DeleteOne({"_id": change["documentKey"]["_id"]})
+    if operation_type in ("insert", "replace", "update"):
+        document = change.get("fullDocument")
+        if document is None:
+            # updated and then deleted before the lookup, the delete follows
+            return None
+        return ReplaceOne(
+            {"_id": change["documentKey"]["_id"]}, mask(document), upsert=True
+        )
+    return None
+
+
+async def sync_changes(
+    stream, target_collection, mask, batch_size=100, flush_interval=1.0, on_flush=None
+):
+    """Apply the changes of `stream` to `target_collection` until it ends.
+
+    Changes are masked with `mask` and written in ordered bulk_write calls of
+    up to `batch_size` operations, or whatever arrived within `flush_interval`
+    seconds. `on_flush(resume_token, count)` is called after every write, and
+    whenever the stream is idle, with the token to resume after it.
+    """
+    operations = []
+    token = None
+    first_change_at = None
+    applied = 0
+
+    async def flush(resume_token):
+        nonlocal operations, first_change_at, applied
+        if operations:
+            await target_collection.bulk_write(operations, ordered=True)
+            applied += len(operations)
+        if on_flush is not None and resume_token is not None:
+            on_flush(resume_token, len(operations))
+        operations = []
+        first_change_at = None
+
+    while stream.alive:
+        change = await stream.try_next()
+        if change is None:
+            # nothing new for now, the stream's token is past all changes seen
+            await flush(stream.resume_token or token)
+            continue
+        token = change["_id"]
+        if change["operationType"] in _END_OF_STREAM:
+            await flush(token)
+            break
+        operation = change_to_operation(change, mask)
+        if operation is not None:
+            operations.append(operation)
+            if first_change_at is None:
+                first_change_at = time.monotonic()
+        if len(operations) >= batch_size or (
+            first_change_at is not None
+            and time.monotonic() - first_change_at >= flush_interval
+        ):
+            await flush(token)
+    await flush(token)
+    return applied
@@ -0,0 +1,99 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import bson
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+# documents are shipped to and from the workers as concatenated BSON bytes and
+# handed to insert_many as RawBSONDocument, so the event loop never decodes them
+RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+# per-process state of a masking worker, set up by _init_worker
+_masker = None
+_fields = None
+_show_warnings = False
+_partial_decode = False
+
+
+def _init_worker(
+    fields, show_warnings, seed, counter, generator_options=None, partial_decode=False
+):
+    global _masker, _fields, _show_warnings, _partial_decode
+    # imported here because main imports this module
+    from mongomasker_cli import main as masker
+
+    with counter.get_lock():
+        index = counter.value
+        counter.value += 1
+    # every worker gets its own Faker; without a per-worker seed all workers
+    # would produce the same sequence of fake values
+    masker.configure_generators(
+        None if seed is None else seed + index, **(generator_options or {})
+    )
+    masker.resolve_generators(fields)
+    _masker = masker
+    _fields = fields
+    _show_warnings = show_warnings
+    _partial_decode = partial_decode
+
+
+def mask_raw_batch(data):
+    if _partial_decode:
+        return b"".join(
+            _masker.anonymize_raw_data(document, _fields, _show_warnings).raw
+            for document in bson.decode_all(data, RAW_CODEC_OPTIONS)
+        )
+    codec_options = _masker.CODEC_OPTIONS
+    documents = _masker.anonymize_batch(
+        bson.decode_all(data, codec_options), _fields, _show_warnings
+    )
+    return b"".join(
+        bson.encode(document, codec_options=codec_options) for document in documents
+    )
+
+
+class MaskingPool:
+    """Mask batches of RawBSONDocument in a pool of worker processes."""
+
+    def __init__(
+        self,
+        workers,
+        fields,
+        show_warnings=False,
+        seed=None,
+        generator_options=None,
+        partial_decode=False,
+    ):
+        # spawn rather than fork, the parent runs motor's threads
+        context = multiprocessing.get_context("spawn")
+        self.workers = workers
+        self.executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(
+                fields,
+                show_warnings,
+                seed,
+                context.Value("i", 0),
+                generator_options,
+                partial_decode,
+            ),
+        )
+
+    async def mask(self, batch):
+        data = b"".join(document.raw for document in batch)
+        loop = asyncio.get_running_loop()
+        masked = await loop.run_in_executor(self.executor, mask_raw_batch, data)
+        return bson.decode_all(masked, RAW_CODEC_OPTIONS)
+
+    def close(self):
+        self.executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,112 @@
+import asyncio
+
+# insert: ordered insert_many, the first error aborts the copy
+# unordered: unordered insert_many, existing _id values are skipped
+# upsert: unordered bulk of ReplaceOne upserts, existing documents are replaced
+WRITE_MODES = ("insert", "unordered", "upsert")
+
+DUPLICATE_KEY = 11000
+
+
+class WriteFailed(Exception):
+    """Documents of a batch still failed after all retries."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        first = errors[0]
+        super().__init__(
+            f"{len(errors)} documents could not be written, "
+            f"first error {first.get('code')}: {first.get('errmsg')}"
+        )
+
+
+class TargetWriter:
+    """Write batches of masked documents to the target in one of WRITE_MODES.
+
+    In the unordered and upsert modes a failed document doesn't stop the rest of
+    its batch: the errors of the BulkWriteError are collected and only the
+    failed documents are sent again, up to `retries` times with an exponential
+    backoff. Documents whose _id already exists in the target are counted as
+    duplicates in the unordered mode instead of being retried.
+    """
+
+    def __init__(self, collection, mode="insert", retries=3, retry_delay=0.1):
+        if mode not in WRITE_MODES:
+            raise ValueError(f"unknown write mode {mode}")
+        self.collection = collection
+        self.mode = mode
+        self.retries = retries
+        self.retry_delay = retry_delay
+        self.inserted = 0
+        self.replaced = 0
+        self.duplicates = 0
+        self.retried = 0
+
+    async def write(self, documents):
+        # imported here to keep pymongo out of the startup, see main.mongo_client
+        from pymongo.errors import BulkWriteError
+
+        if self.mode == "insert":
+            try:
+                await self.collection.insert_many(documents)
+            except BulkWriteError as exc:
+                if not exc.details.get("writeErrors"):
+                    raise
+                raise WriteFailed(exc.details["writeErrors"]) from exc
+            self.inserted += len(documents)
+            return
+
+        attempt = 0
+        while True:
+            failed = await self._write_unordered(documents)
+            if not failed:
+                return
+            if attempt >= self.retries:
+                raise WriteFailed([error for _, error in failed])
+            await asyncio.sleep(self.retry_delay * 2**attempt)
+            attempt += 1
+            self.retried += len(failed)
+            documents = [document for document, _ in failed]
+
+    async def _write_unordered(self, documents):
+        # returns the (document, error) pairs worth retrying
+        from pymongo import ReplaceOne
+        from pymongo.errors import BulkWriteError
+
+        try:
+            if self.mode == "upsert":
+                result = await self.collection.bulk_write(
+                    [
+                        ReplaceOne({"_id": document["_id"]}, document, upsert=True)
+                        for document in documents
+                    ],
+                    ordered=False,
+                )
+                self.inserted += result.upserted_count
+                self.replaced += result.matched_count
+            else:
+                await self.collection.insert_many(documents, ordered=False)
+                self.inserted += len(documents)
+            return []
+        except BulkWriteError as exc:
+            details = exc.details
+        self.inserted += details.get("nInserted", 0) + details.get("nUpserted", 0)
+        self.replaced += details.get("nMatched", 0)
+        failed = []
+        for error in details.get("writeErrors", []):
+            if self.mode == "unordered" and error.get("code") == DUPLICATE_KEY:
+                self.duplicates += 1
+            else:
+                # e.g. two upserts of the same new _id racing each other
+                failed.append((documents[error["index"]], error))
+        return failed
+
+    def summary(self):
+        counts = [f"{self.inserted} inserted"]
+        if self.mode == "upsert":
+            counts.append(f"{self.replaced} replaced")
+        if self.mode == "unordered":
+            counts.append(f"{self.duplicates} duplicates skipped")
+        if self.retried:
+            counts.append(f"{self.retried} retried")
+        return ", ".join(counts)
@@ -0,0 +1,147 @@
+import unittest
+from datetime import datetime
+
+from mongomasker_cli import main
+from mongomasker_cli.aggregation import (
+    REDACTED,
+    TRANSFORMS,
+    merge_stage,
+    set_stages,
+    split_fields,
+)
+
+
+class TestSplitFields(unittest.TestCase):
+    def test_faker_and_wildcard_fields_stay_on_the_client(self):
+        server_fields, client_fields = split_fields(
+            {
+                "ssn": "redact",
+                "address.zip": "null",
+                "email": "email",
+                "*.code": "null",
+                "code": "hash",
+            }
+        )
+        self.assertEqual(server_fields, {"ssn": "redact", "address.zip": "null"})
+        # $toHashedIndexKey doesn't give the hashes of the client
+        self.assertEqual(
+            client_fields, {"email": "email", "*.code": "null", "code": "hash"}
+        )
+
+
+class TestSetStages(unittest.TestCase):
+    def test_top_level_field(self):
+        self.assertEqual(
+            set_stages({"ssn": "redact"}),
+            [
+                {
+                    "$set": {
+                        "ssn": {
+                            "$cond": [
+                                {"$eq": [{"$type": "$ssn"}, "missing"]},
+                                "$$REMOVE",
+                                {"$literal": REDACTED},
+                            ]
+                        }
+                    }
+                }
+            ],
+        )
+
+    def test_one_stage_per_path(self):
+        stages = set_stages({"address.zip": "null", "address.city": "redact"})
+        self.assertEqual(len(stages), 2)
+        self.assertEqual([list(stage["$set"]) for stage in stages], [["address"]] * 2)
+
+    def test_nested_path_maps_arrays_and_skips_missing_keys(self):
+        (stage,) = set_stages({"orders.id": "redact"})
+        missing, remove, expression = stage["$set"]["orders"]["$cond"]
+        self.assertEqual(expression["$let"]["vars"], {"value0": "$orders"})
+        masked = expression["$let"]["in"]["$let"]
+        # arrays are mapped, other values are mapped as a one item array
+        self.assertEqual(
+            masked["vars"]["masked0"]["$map"]["input"],
+            {"$cond": [{"$isArray": "$$value0"}, "$$value0", ["$$value0"]]},
+        )
+        self.assertEqual(masked["in"]["$cond"][2], {"$arrayElemAt": ["$$masked0", 0]})
+        has_child, set_child, unchanged = masked["vars"]["masked0"]["$map"]["in"][
+            "$cond"
+        ]
+        child = {"$getField": {"field": {"$literal": "id"}, "input": "$$item0"}}
+        self.assertIn({"$ne": [{"$type": child}, "missing"]}, has_child["$and"])
+        self.assertEqual(
+            set_child["$setField"]["value"],
+            {"$literal": REDACTED},
+        )
+        self.assertEqual(unchanged, "$$item0")
+
+    def test_expression_grows_linearly_with_depth(self):
+        sizes = [
+            len(str(set_stages({".".join("abcdefgh"[:depth]): "null"})))
+            for depth in range(2, 9)
+        ]
+        steps = {after - before for before, after in zip(sizes, sizes[1:])}
+        self.assertEqual(len(steps), 1)
+
+    def test_datetrunc_leaves_other_types(self):
+        (stage,) = set_stages({"createdAt": "datetrunc"})
+        expression = stage["$set"]["createdAt"]["$cond"][2]
+        self.assertEqual(
+            expression["$cond"][0], {"$eq": [{"$type": "$createdAt"}, "date"]}
+        )
+        self.assertEqual(expression["$cond"][2], "$createdAt")
+
+
+class TestMergeStage(unittest.TestCase):
+    def test_write_modes(self):
+        self.assertEqual(
+            merge_stage("db", "people")["$merge"],
+            {
+                "into": {"db": "db", "coll": "people"},
+                "on": "_id",
+                "whenMatched": "fail",
+                "whenNotMatched": "insert",
+            },
+        )
+        self.assertEqual(
+            merge_stage("db", "people", "upsert")["$merge"]["whenMatched"], "replace"
+        )
+        self.assertEqual(
+            merge_stage("db", "people", "unordered")["$merge"]["whenMatched"],
+            "keepExisting",
+        )
+
+
+class TestTransforms(unittest.TestCase):
+    def test_client_path_applies_transforms(self):
+        document = {
+            "ssn": "123-45-6789",
+            "phone": "555",
+            "code": "A1",
+            "createdAt": datetime(2023, 5, 17, 12, 30),
+            "label": "2023-05-17",
+        }
+        main.anonymize_data(
+            document,
+            {
+                "ssn": "redact",
+                "phone": "null",
+                "code": "hash",
+                "createdAt": "datetrunc",
+                "label": "datetrunc",
+            },
+        )
+        self.assertEqual(document["ssn"], REDACTED)
+        self.assertIsNone(document["phone"])
+        self.assertEqual(document["code"], TRANSFORMS["hash"]("A1"))
+        self.assertEqual(document["createdAt"], datetime(2023, 5, 1))
+        self.assertEqual(document["label"], "2023-05-17")
+
+    def test_hash_is_deterministic(self):
+        self.assertEqual(TRANSFORMS["hash"]("A1"), TRANSFORMS["hash"]("A1"))
+        self.assertNotEqual(TRANSFORMS["hash"]("A1"), TRANSFORMS["hash"]("A2"))
+        self.assertIsNone(main.generate_fake_data_different("null", None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,11 @@
 import unittest
+import bson
+from bson.raw_bson import RawBSONDocument
+
 from mongomasker_cli.main import (
+    anonymize_batch,
     anonymize_data,
+    mask_batch,
 )
 from faker import Faker
 import re
@@ -539,5 +544,28 @@ class TestAnonymizeData(unittest.TestCase):
                     self.assertNotEqual(charge["serviceFacilityId"], "1619368842")
 
 
+class TestMaskBatch(unittest.TestCase):
+
+    def test_raw_documents_are_replaced_in_place(self):
+        batch = [
+            RawBSONDocument(bson.encode({"_id": i, "name": "John"})) for i in range(3)
+        ]
+        masked = mask_batch(batch, {"name": "name"})
+        self.assertIs(masked, batch)
+        self.assertTrue(all(isinstance(doc, dict) for doc in batch))
+        self.assertEqual([doc["_id"] for doc in batch], [0, 1, 2])
+        self.assertTrue(all(doc["name"] != "John" for doc in batch))
+
+    def test_anonymize_batch(self):
+        documents = [
+            {"_id": i, "user": {"email": "john@example.com"}, "ssn": "1"}
+            for i in range(5)
+        ]
+        anonymize_batch(documents, {"user.email": "email", "ssn": "redact"})
+        for document in documents:
+            self.assertNotEqual(document["user"]["email"], "john@example.com")
+            self.assertEqual(document["ssn"], "REDACTED")
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,133 @@
+import asyncio
+import unittest
+
+import bson
+from bson.raw_bson import RawBSONDocument
+
+from mongomasker_cli.batching import AdaptiveBatcher, MemoryBudget, document_size
+from mongomasker_cli.pipeline import run_pipeline
+
+
+class AsyncCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def __aiter__(self):
+        for document in self.documents:
+            yield document
+
+
+def raw_document(i, padding):
+    return RawBSONDocument(bson.encode({"_id": i, "padding": "x" * padding}))
+
+
+class TestAdaptiveBatcher(unittest.TestCase):
+
+    def test_is_full_by_bytes_or_count(self):
+        batcher = AdaptiveBatcher(batch_bytes=1000, min_bytes=1, max_documents=10)
+        self.assertFalse(batcher.is_full(5, 999))
+        self.assertTrue(batcher.is_full(5, 1000))
+        self.assertTrue(batcher.is_full(10, 10))
+
+    def test_fast_writes_grow_batches(self):
+        batcher = AdaptiveBatcher(
+            target_latency=1.0, min_bytes=1, max_bytes=2000, batch_bytes=1000
+        )
+        batcher.observe(1000, 0.1)
+        self.assertEqual(batcher.batch_bytes, 1500)
+        batcher.observe(1500, 0.1)
+        self.assertEqual(batcher.batch_bytes, 2000)
+
+    def test_slow_writes_shrink_batches(self):
+        batcher = AdaptiveBatcher(target_latency=1.0, min_bytes=100, batch_bytes=1000)
+        batcher.observe(1000, 4.0)
+        self.assertEqual(batcher.batch_bytes, 250)
+        batcher.observe(250, 100.0)
+        self.assertEqual(batcher.batch_bytes, 100)
+
+    def test_small_batches_and_target_latency_change_nothing(self):
+        batcher = AdaptiveBatcher(target_latency=1.0, min_bytes=1, batch_bytes=1000)
+        batcher.observe(100, 0.01)
+        batcher.observe(1000, 0.8)
+        self.assertEqual(batcher.batch_bytes, 1000)
+
+    def test_document_size(self):
+        document = raw_document(1, 100)
+        self.assertEqual(document_size(document), len(document.raw))
+        self.assertEqual(document_size({"_id": 1}), 0)
+
+
+class TestPipelineWithBatcher(unittest.TestCase):
+
+    def test_batches_are_cut_by_bytes(self):
+        documents = [raw_document(i, 1000 if i < 20 else 10) for i in range(220)]
+        batcher = AdaptiveBatcher(batch_bytes=4096, min_bytes=1)
+        batches = []
+
+        async def write(batch):
+            pass
+
+        asyncio.run(
+            run_pipeline(
+                [AsyncCursor(documents)],
+                lambda batch: batch,
+                write,
+                writers=1,
+                on_written=batches.append,
+                batcher=batcher,
+            )
+        )
+
+        sizes = [len(batch) for batch in batches]
+        self.assertEqual(sum(sizes), 220)
+        # large documents make small batches, small documents large ones
+        self.assertEqual(sizes[0], 4)
+        self.assertGreater(max(sizes), 100)
+        self.assertTrue(all(batch.size >= 4096 for batch in batches[:-1]))
+
+
+class TestMemoryBudget(unittest.TestCase):
+
+    def test_wait_returns_once_released(self):
+        budget = MemoryBudget(100)
+        budget.acquire(150)
+        self.assertTrue(budget.exhausted)
+
+        async def run():
+            waiter = asyncio.ensure_future(budget.wait())
+            await asyncio.sleep(0)
+            self.assertFalse(waiter.done())
+            budget.release(100)
+            await asyncio.wait_for(waiter, 1)
+
+        asyncio.run(run())
+        self.assertEqual(budget.used, 50)
+        self.assertEqual(budget.peak, 150)
+
+    def test_pipeline_stays_within_budget(self):
+        # 100 documents of about 1 KB, at most 4 KB in flight
+        documents = [raw_document(i, 1000) for i in range(100)]
+        size = len(documents[0].raw)
+        budget = MemoryBudget(4 * size)
+        batches = []
+
+        async def write(batch):
+            await asyncio.sleep(0.001)
+
+        asyncio.run(
+            run_pipeline(
+                [AsyncCursor(documents)],
+                lambda batch: batch,
+                write,
+                batch_size=50,
+                writers=2,
+                on_written=batches.append,
+                budget=budget,
+            )
+        )
+
+        self.assertEqual(sum(len(batch) for batch in batches), 100)
+        # batches are cut when the budget runs out
+        self.assertTrue(all(len(batch) <= 4 for batch in batches))
+        self.assertLessEqual(budget.peak, 4 * size)
+        self.assertEqual(budget.used, 0)
@@ -0,0 +1,130 @@
+import asyncio
+import math
+import subprocess
+import sys
+import unittest
+from unittest import mock
+
+import bson
+
+from mongomasker_cli import main
+from mongomasker_cli.bench import (
+    DATA_TYPES,
+    LAZY_MODULES,
+    SHAPES,
+    MemoryCollection,
+    bench_copy,
+    bench_data_types,
+    bench_shapes,
+    bench_startup,
+    format_results,
+    peak_rss_mb,
+)
+from mongomasker_cli.plan import compile_fields
+
+
+class TestBench(unittest.TestCase):
+
+    def setUp(self):
+        main.configure_generators(0)
+
+    def test_shapes_have_their_fields(self):
+        for name, (make_document, fields) in SHAPES.items():
+            with self.subTest(shape=name):
+                warnings = []
+                compile_fields(fields).apply(
+                    make_document(0), lambda data_type, value: value, warnings.append
+                )
+                self.assertEqual(warnings, [])
+
+    def test_results(self):
+        results = bench_data_types(5) + bench_shapes(5)
+        self.assertEqual(len(results), len(DATA_TYPES) + len(SHAPES))
+        self.assertTrue(all(result.per_second > 0 for result in results))
+        table = format_results("shape", results)
+        self.assertEqual(len(table.splitlines()), len(results) + 1)
+
+    def test_copy_in_memory(self):
+        results = asyncio.run(
+            bench_copy(20, main.CopyOptions(label="copy"), {"flat": SHAPES["flat"]})
+        )
+        self.assertEqual(
+            [(result.name, result.count) for result in results], [("flat", 20)]
+        )
+
+    def test_rss_growth_per_row(self):
+        for result in bench_data_types(5):
+            self.assertGreaterEqual(result.rss, 0)
+        self.assertGreater(bench_startup(1)[0].rss, 0)
+
+    def test_peak_rss_without_resource(self):
+        self.assertGreater(peak_rss_mb(), 0)
+        # e.g. on Windows
+        with mock.patch.dict(sys.modules, {"resource": None}):
+            self.assertTrue(math.isnan(peak_rss_mb()))
+
+    def test_benchmark_help_lists_the_shapes(self):
+        from typer.testing import CliRunner
+
+        output = CliRunner().invoke(main.app, ["benchmark", "--help"]).output
+        for name in SHAPES:
+            self.assertIn(name, output)
+
+    def test_memory_collection(self):
+        collection = MemoryCollection("people", main.CODEC_OPTIONS)
+        asyncio.run(collection.insert_many([{"_id": 1}, {"_id": 2}]))
+
+        async def read(collection):
+            return [document async for document in collection.find({})]
+
+        self.assertEqual(asyncio.run(read(collection)), [{"_id": 1}, {"_id": 2}])
+        raw = asyncio.run(
+            read(collection.with_options(codec_options=main.RAW_CODEC_OPTIONS))
+        )
+        self.assertEqual(bson.decode(raw[0].raw), {"_id": 1})
+        self.assertEqual(asyncio.run(collection.count_documents({})), 2)
+
+
+class TestStartup(unittest.TestCase):
+
+    def test_import_leaves_out_lazy_modules(self):
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, mongomasker_cli.main; "
+                f"print(*(m for m in {LAZY_MODULES!r} if m in sys.modules))",
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        self.assertEqual(output.strip(), "")
+
+    def test_import_leaves_out_the_benchmark(self):
+        # resource doesn't exist on Windows
+        output = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                "import sys, mongomasker_cli.main; "
+                "print(*(m for m in ('mongomasker_cli.bench', 'resource') "
+                "if m in sys.modules))",
+            ],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        self.assertEqual(output.strip(), "")
+
+    def test_mongo_client_imports_motor(self):
+        from motor.motor_asyncio import AsyncIOMotorClient
+
+        client = main.mongo_client("mongodb://localhost:1", connect=False)
+        self.assertIsInstance(client, AsyncIOMotorClient)
+        client.close()
+
+    def test_bench_startup(self):
+        (result,) = bench_startup(1)
+        self.assertEqual((result.name, result.count), ("import", 1))
+        self.assertGreater(result.seconds, 0)
@@ -0,0 +1,152 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from pathlib import Path
+
+import bson
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+
+from mongomasker_cli import main
+from mongomasker_cli.bench import MemoryCollection
+from mongomasker_cli.checkpoint import Checkpoint, after_id_filter
+from mongomasker_cli.pipeline import Batch
+
+
+def batch(source, sequence, ids):
+    return Batch(source, sequence, [{"_id": _id} for _id in ids])
+
+
+class TestCheckpoint(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.path = os.path.join(directory, "checkpoint.json")
+
+    def test_last_id_waits_for_earlier_batches(self):
+        checkpoint = Checkpoint.create(self.path, "db.a", "db.b", {}, [{}, {}])
+        batches = [batch(0, i, range(i * 10, i * 10 + 10)) for i in range(3)]
+        for read in batches:
+            checkpoint.batch_read(read)
+
+        checkpoint.batch_written(batches[1])
+        self.assertIsNone(checkpoint.partitions[0]["last_id"])
+        checkpoint.batch_written(batches[0])
+        self.assertEqual(checkpoint.partitions[0]["last_id"], 19)
+        checkpoint.batch_written(batches[2])
+        self.assertEqual(checkpoint.partitions[0]["last_id"], 29)
+        self.assertIsNone(checkpoint.partitions[1]["last_id"])
+
+    def test_save_and_load(self):
+        last_id = ObjectId()
+        query = {"$and": [{"status": "active"}, {"_id": {"$lt": ObjectId()}}]}
+        checkpoint = Checkpoint.create(
+            self.path, "db.a", "db.b", {"status": "active"}, [query]
+        )
+        read = batch(0, 0, [last_id])
+        checkpoint.batch_read(read)
+        checkpoint.batch_written(read)
+
+        loaded = Checkpoint.load(self.path)
+        self.assertEqual(loaded.source, "db.a")
+        self.assertEqual(loaded.filter, {"status": "active"})
+        self.assertEqual(loaded.partitions, [{"filter": query, "last_id": last_id}])
+        self.assertFalse(loaded.done)
+        self.assertEqual(
+            loaded.queries(), [{"$and": [query, after_id_filter(last_id)]}]
+        )
+
+        loaded.finish()
+        self.assertTrue(Checkpoint.load(self.path).done)
+
+    def test_queries_of_unstarted_partitions(self):
+        checkpoint = Checkpoint.create(self.path, "db.a", "db.b", {}, [{}])
+        self.assertEqual(checkpoint.queries(), [{}])
+
+
+class TargetCollection:
+    """Target rejecting the _id values it holds, like a unique _id index."""
+
+    full_name = "db.b"
+
+    def __init__(self, ids):
+        self.ids = set(ids)
+
+    async def insert_many(self, documents, ordered=True):
+        errors = []
+        for index, document in enumerate(documents):
+            if document["_id"] in self.ids:
+                errors.append({"index": index, "code": 11000, "errmsg": "E11000"})
+                if ordered:
+                    break
+            else:
+                self.ids.add(document["_id"])
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "writeConcernErrors": []})
+
+
+class TestResume(unittest.TestCase):
+
+    def setUp(self):
+        main.configure_generators(0)
+
+    def test_documents_written_after_the_checkpoint_are_skipped(self):
+        path = Path(tempfile.mkdtemp()) / "checkpoint.json"
+        source = MemoryCollection(
+            "a",
+            main.CODEC_OPTIONS,
+            [bson.encode({"_id": i, "name": "John"}) for i in range(6)],
+        )
+        # the copy stopped after writing 0 to 3, with 1 checkpointed
+        checkpoint = Checkpoint.create(path, "bench.a", "db.b", {}, [{}])
+        checkpoint.partitions[0]["last_id"] = 1
+        checkpoint.save()
+        # the in-memory source ignores the resume query and reads all again
+        target = TargetCollection(range(4))
+        copied = asyncio.run(
+            main.copy_collection(
+                source,
+                target,
+                {"name": "name"},
+                {},
+                main.CopyOptions(batch_size=2, checkpoint_file=path, resume=True),
+            )
+        )
+        self.assertEqual(copied, 6)
+        self.assertEqual(target.ids, set(range(6)))
+        self.assertTrue(Checkpoint.load(path).done)
+
+
+class TestAfterIdFilter(unittest.TestCase):
+
+    def test_matches_later_types(self):
+        last_id = ObjectId()
+        self.assertEqual(
+            after_id_filter(last_id),
+            {
+                "$or": [
+                    {"_id": {"$gt": last_id}},
+                    {
+                        "_id": {
+                            "$type": [
+                                "bool",
+                                "date",
+                                "timestamp",
+                                "regex",
+                                "maxKey",
+                            ]
+                        }
+                    },
+                ]
+            },
+        )
+
+    def test_numbers_are_followed_by_strings(self):
+        condition = after_id_filter(10)
+        self.assertIn("string", condition["$or"][1]["_id"]["$type"])
+        self.assertNotIn("int", condition["$or"][1]["_id"]["$type"])
+
+
+if __name__ == "__main__":
+    unittest.main()
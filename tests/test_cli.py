@@ -0,0 +1,136 @@
+import json
+import os
+import tempfile
+import unittest
+
+import bson
+import typer
+from typer.testing import CliRunner
+
+from mongomasker_cli import main
+from mongomasker_cli.main import app
+
+
+class TestDefaultCommand(unittest.TestCase):
+
+    def setUp(self):
+        self.runner = CliRunner()
+
+    def test_arguments_without_a_command_run_copy(self):
+        result = self.runner.invoke(
+            app, ["mongodb://localhost:1", "db", "a", "db", "b", "--help"]
+        )
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("copy [OPTIONS] MONGO_URI", result.output)
+
+    def test_options_without_a_command_run_copy(self):
+        result = self.runner.invoke(app, ["--batch-size", "5"])
+        self.assertEqual(result.exit_code, 2)
+        self.assertIn("Missing argument", result.output)
+
+    def test_resume_of_a_missing_checkpoint(self):
+        fields_file = os.path.join(tempfile.mkdtemp(), "fields.json")
+        with open(fields_file, "w") as f:
+            json.dump({"name": "name"}, f)
+        result = self.runner.invoke(
+            app,
+            ["copy", "mongodb://localhost:1", "db", "a", "db", "b", fields_file]
+            + ["--checkpoint", "missing.json", "--resume"],
+        )
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("missing.json doesn't exist", result.output)
+
+    def test_count_and_write_mode_are_checked(self):
+        for args in (["--count", "all"], ["--write-mode", "merge"]):
+            result = self.runner.invoke(
+                app,
+                ["restore", "mongodb://localhost:1", __file__, "db", "b", __file__]
+                + args,
+            )
+            self.assertEqual(result.exit_code, 2)
+            self.assertIn("must be one of", result.output)
+
+    def test_commands_and_group_options(self):
+        result = self.runner.invoke(app, ["--help"])
+        self.assertEqual(result.exit_code, 0)
+        self.assertIn("copy-many", result.output)
+        result = self.runner.invoke(app, ["preview", "--help"])
+        self.assertIn("preview [OPTIONS]", result.output)
+
+
+class TestGeneratorOptions(unittest.TestCase):
+
+    def tearDown(self):
+        main.configure_generators()
+
+    def test_run_command_closes_the_pools_and_the_link_store(self):
+        link_store = os.path.join(tempfile.mkdtemp(), "links.sqlite")
+        main.configure_generators(1, pool_size=4, link_store=link_store)
+
+        async def run():
+            return 5
+
+        self.assertEqual(main.run_command(run()), 5)
+        self.assertIsNone(main.links.db)
+        self.assertTrue(main.value_pools.executor._shutdown)
+
+    def test_options_reach_the_generators(self):
+        directory = tempfile.mkdtemp()
+        input_file = os.path.join(directory, "in.bson")
+        fields_file = os.path.join(directory, "fields.json")
+        with open(input_file, "wb") as file:
+            for i in range(10):
+                file.write(bson.encode({"_id": i, "city": f"city {i % 2}"}))
+        with open(fields_file, "w") as file:
+            json.dump({"city": "city"}, file)
+        result = CliRunner().invoke(
+            app,
+            [
+                "mask-file",
+                input_file,
+                os.path.join(directory, "out.bson"),
+                fields_file,
+                "--dictionary",
+                "city",
+                "--dictionary-size",
+                "5",
+                "--link-memory",
+                "1",
+            ],
+        )
+        self.assertEqual(result.exit_code, 0, result.output)
+        self.assertEqual(main.generators.dictionary_paths, {"city"})
+        self.assertEqual(main.generators.dictionary_size, 5)
+        self.assertEqual(main.links.max_bytes, 1024 * 1024)
+
+
+class TestCheckDataTypes(unittest.TestCase):
+
+    def test_data_types_missing_from_the_locale_fail_early(self):
+        main.check_data_types({"zip": "zipcode", "name": "name"}, "de_DE")
+        with self.assertRaises(typer.Exit):
+            main.check_data_types(
+                {"state": "statecode", "other": "link:place:statecode"}, "de_DE"
+            )
+        main.check_data_types({"state": "statecode"}, None)
+
+    def test_mask_file_writes_nothing(self):
+        directory = tempfile.mkdtemp()
+        input_file = os.path.join(directory, "in.bson")
+        output_file = os.path.join(directory, "out.bson")
+        fields_file = os.path.join(directory, "fields.json")
+        with open(input_file, "wb") as file:
+            file.write(bson.encode({"_id": 1, "state": "NY"}))
+        with open(fields_file, "w") as file:
+            json.dump({"state": "statecode"}, file)
+        result = CliRunner().invoke(
+            app,
+            ["mask-file", input_file, output_file, fields_file, "--locale", "fr_FR"],
+        )
+        self.assertEqual(result.exit_code, 1)
+        self.assertIn("has no statecode values", result.output)
+        self.assertEqual(sorted(os.listdir(directory)), ["fields.json", "in.bson"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import io
+import json
+import os
+import tempfile
+import unittest
+
+from mongomasker_cli.config import ConfigError, load_config
+
+
+def config_file(config, directory=None):
+    directory = directory or tempfile.mkdtemp()
+    path = os.path.join(directory, "config.json")
+    with open(path, "w") as file:
+        json.dump(config, file)
+    return open(path)
+
+
+class TestLoadConfig(unittest.TestCase):
+
+    def test_inline_and_file_fields(self):
+        directory = tempfile.mkdtemp()
+        with open(os.path.join(directory, "orders.json"), "w") as file:
+            json.dump({"customer.email": "email"}, file)
+        config = {
+            "source_db": "crm",
+            "target_db": "crm_masked",
+            "collections": {
+                "people": {"fields": {"name": "name"}, "filter": {"active": True}},
+                "orders": {"fields": "orders.json", "target": "orders_2024"},
+            },
+        }
+        with config_file(config, directory) as file:
+            source_db, target_db, jobs = load_config(file)
+
+        self.assertEqual((source_db, target_db), ("crm", "crm_masked"))
+        people, orders = jobs
+        self.assertEqual((people.source, people.target), ("people", "people"))
+        self.assertEqual(people.filter, {"active": True})
+        self.assertEqual(people.fields.fields, {"name": "name"})
+        self.assertEqual((orders.target, orders.filter), ("orders_2024", {}))
+        self.assertEqual(orders.fields.fields, {"customer.email": "email"})
+
+    def test_missing_fields(self):
+        config = {"source_db": "a", "target_db": "b", "collections": {"people": {}}}
+        with config_file(config) as file, self.assertRaises(ConfigError):
+            load_config(file)
+
+    def test_copy_onto_a_source_collection(self):
+        config = {
+            "source_db": "crm",
+            "target_db": "crm",
+            "collections": {"people": {"fields": {}}},
+        }
+        with config_file(config) as file, self.assertRaises(ConfigError):
+            load_config(file)
+
+    def test_links(self):
+        config = {
+            "source_db": "crm",
+            "target_db": "crm_masked",
+            "collections": {
+                "people": {"fields": {"name": "name"}},
+                "orders": {"fields": {}},
+            },
+            "links": {
+                "customer": {
+                    "type": "id",
+                    "fields": {"people": ["_id"], "orders": ["customer.id"]},
+                }
+            },
+        }
+        with config_file(config) as file:
+            _, _, (people, orders) = load_config(file)
+        self.assertEqual(
+            people.fields.fields, {"name": "name", "_id": "link:customer:id"}
+        )
+        self.assertEqual(orders.fields.fields, {"customer.id": "link:customer:id"})
+
+    def test_invalid_links(self):
+        collections = {"people": {"fields": {"name": "name"}}}
+        for links in (
+            {"customer": {"type": "id"}},
+            {"a:b": {"type": "id", "fields": {}}},
+            {"customer": {"type": "id", "fields": {"orders": ["customerId"]}}},
+            {"customer": {"type": "id", "fields": {"people": ["name"]}}},
+        ):
+            config = {
+                "source_db": "a",
+                "target_db": "b",
+                "collections": collections,
+                "links": links,
+            }
+            with self.subTest(links=links), config_file(config) as file:
+                with self.assertRaises(ConfigError):
+                    load_config(file)
+
+    def test_invalid_json(self):
+        file = io.StringIO("{")
+        file.name = "config.json"
+        with self.assertRaises(ConfigError):
+            load_config(file)
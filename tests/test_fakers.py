@@ -0,0 +1,49 @@
+import unittest
+
+from mongomasker_cli.fakers import PROVIDERS, Fakers, available_locales
+
+
+class TestFakers(unittest.TestCase):
+
+    def test_data_types_sharing_providers_share_an_instance(self):
+        fakers = Fakers(seed=1)
+        self.assertIs(fakers["name"], fakers["lastname"])
+        self.assertIsNot(fakers["name"], fakers["email"])
+        self.assertIs(fakers["unknown"], fakers["id"])
+
+    def test_only_the_needed_providers_are_loaded(self):
+        fake = Fakers()["name"]
+        self.assertTrue(hasattr(fake, "first_name"))
+        self.assertFalse(hasattr(fake, "email"))
+
+    def test_every_data_type_generates(self):
+        fakers = Fakers(seed=1)
+        methods = {
+            "name": "first_name",
+            "lastname": "last_name",
+            "lastnamefirstname": "first_name",
+            "company": "company",
+            "email": "email",
+            "address": "address",
+            "city": "city",
+            "zipcode": "zipcode",
+            "statecode": "state_abbr",
+            "date": "date",
+            "datestr": "date",
+            "id": "random_number",
+        }
+        self.assertEqual(set(methods), set(PROVIDERS))
+        for data_type, method in methods.items():
+            with self.subTest(data_type=data_type):
+                self.assertIsNotNone(getattr(fakers[data_type], method)())
+
+    def test_seed_and_locale(self):
+        first = [Fakers(seed=3)["name"].first_name() for _ in range(2)]
+        self.assertEqual(first[0], first[1])
+        self.assertIn("de_DE", available_locales())
+        german = Fakers(seed=3, locale="de_DE")["address"]
+        self.assertRegex(german.postcode(), r"^\d{5}$")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+import asyncio
+import os
+import tempfile
+import unittest
+import uuid
+from datetime import datetime, timezone
+
+import bson
+from bson.binary import UuidRepresentation
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+from mongomasker_cli.files import FileSink, FileSource, count_documents, file_format
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODEC_OPTIONS = CodecOptions(
+    tz_aware=True, uuid_representation=UuidRepresentation.STANDARD
+)
+
+DOCUMENTS = [
+    {
+        "_id": i,
+        "name": f"name {i}",
+        "created": datetime(2024, 1, 1, tzinfo=timezone.utc),
+        "key": uuid.UUID(int=i),
+        "nested": {"values": [i, i + 0.5]},
+    }
+    for i in range(25)
+]
+
+
+async def read_all(source):
+    return [document async for document in source]
+
+
+class TestFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def path(self, name):
+        return os.path.join(self.directory, name)
+
+    def round_trip(self, name):
+        sink = FileSink(self.path(name), CODEC_OPTIONS)
+        asyncio.run(sink.write(DOCUMENTS[:10]))
+        asyncio.run(sink.write(DOCUMENTS[10:]))
+        sink.close()
+        return asyncio.run(read_all(FileSource(self.path(name), CODEC_OPTIONS)))
+
+    def test_round_trips(self):
+        names = ["a.bson", "a.bson.gz", "a.ndjson", "a.json.gz"]
+        if zstandard is not None:
+            names += ["a.bson.zst", "a.jsonl.zstd"]
+        for name in names:
+            with self.subTest(name=name):
+                self.assertEqual(self.round_trip(name), DOCUMENTS)
+
+    def test_raw_documents(self):
+        for name in ("a.bson", "a.ndjson"):
+            self.round_trip(name)
+            documents = asyncio.run(
+                read_all(FileSource(self.path(name), CODEC_OPTIONS, raw=True))
+            )
+            self.assertIsInstance(documents[0], RawBSONDocument)
+            self.assertEqual(
+                [bson.decode(document.raw, CODEC_OPTIONS) for document in documents],
+                DOCUMENTS,
+            )
+
+    def test_count_documents(self):
+        self.round_trip("a.bson")
+        self.round_trip("a.bson.gz")
+        self.assertEqual(count_documents(self.path("a.bson")), 25)
+        self.assertIsNone(count_documents(self.path("a.bson.gz")))
+
+    def test_count_documents_of_a_truncated_file(self):
+        with open(self.path("a.bson"), "wb") as file:
+            file.write(bson.encode({"a": 1}) + bson.encode({"b": 2})[:-3])
+        with self.assertRaises(bson.errors.InvalidBSON):
+            count_documents(self.path("a.bson"))
+
+    def test_truncated_file(self):
+        with open(self.path("a.bson"), "wb") as file:
+            file.write(bson.encode({"a": 1}) + bson.encode({"b": 2})[:-3])
+        with self.assertRaises(bson.errors.InvalidBSON):
+            asyncio.run(read_all(FileSource(self.path("a.bson"), CODEC_OPTIONS)))
+
+    def test_failed_write_leaves_no_file(self):
+        sink = FileSink(self.path("a.bson"), CODEC_OPTIONS)
+        asyncio.run(sink.write(DOCUMENTS))
+        sink.close(keep=False)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_file_format(self):
+        self.assertEqual(file_format("dump/people.bson"), ("bson", None))
+        self.assertEqual(file_format("people.metadata.json.gz"), ("ndjson", "gzip"))
+        self.assertEqual(file_format("people.BSON.ZST"), ("bson", "zstd"))
+        with self.assertRaises(ValueError):
+            file_format("people.csv")
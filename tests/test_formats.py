@@ -0,0 +1,93 @@
+import unittest
+from datetime import date, datetime, timezone
+from random import Random
+
+import bson
+from bson.int64 import Int64
+
+from mongomasker_cli.formats import (
+    MAX_SHIFT_DAYS,
+    STATE_CODES,
+    scramble,
+    shift_date,
+    shift_state_code,
+)
+
+
+class TestScramble(unittest.TestCase):
+
+    def test_keeps_the_character_classes(self):
+        random = Random(1)
+        for _ in range(200):
+            value = scramble("Ab-12 z9", random)
+            self.assertRegex(value, r"^[A-Z][a-z]-\d\d [a-z]\d$")
+            for new, old in zip(value, "Ab-12 z9"):
+                if old.isalnum():
+                    self.assertNotEqual(new, old)
+
+    def test_ints_keep_their_digits(self):
+        random = Random(1)
+        for original in (10, 1234567890, -45, 7):
+            for _ in range(50):
+                value = scramble(original, random)
+                self.assertIsInstance(value, int)
+                self.assertNotEqual(value, original)
+                self.assertEqual(len(str(value)), len(str(original)))
+
+    def test_ints_stay_in_their_bson_type(self):
+        random = Random(1)
+        for original in (2**31 - 1, 2**31 - 10, -(2**31), 2**63 - 1, -(2**63)):
+            int32 = -(2**31) <= original < 2**31
+            for _ in range(200):
+                value = scramble(original, random)
+                self.assertNotEqual(value, original)
+                self.assertEqual(len(str(value)), len(str(original)))
+                self.assertEqual(-(2**31) <= value < 2**31, int32)
+                bson.encode({"value": value})
+
+    def test_int64_stays_int64(self):
+        value = scramble(Int64(5), Random(1))
+        self.assertIsInstance(value, Int64)
+        self.assertNotEqual(value, 5)
+
+    def test_other_values_are_kept(self):
+        for value in (None, True, 1.5, "--", datetime(2023, 1, 1)):
+            self.assertEqual(scramble(value, Random(1)), value)
+
+
+class TestShiftDate(unittest.TestCase):
+
+    def test_dates_move_within_the_bound(self):
+        random = Random(1)
+        original = datetime(2023, 1, 1, 10, 30, tzinfo=timezone.utc)
+        for _ in range(500):
+            value = shift_date(original, random)
+            self.assertNotEqual(value, original)
+            self.assertLessEqual(abs((value - original).days), MAX_SHIFT_DAYS)
+            self.assertEqual((value.hour, value.tzinfo), (10, timezone.utc))
+
+    def test_strings_keep_their_format(self):
+        random = Random(1)
+        self.assertRegex(shift_date("2023-01-01", random), r"^\d{4}-\d\d-\d\d$")
+        self.assertRegex(
+            shift_date("2023-01-01T10:00:00Z", random), r"^\d{4}-\d\d-\d\dT10:00:00Z$"
+        )
+        self.assertEqual(shift_date("yesterday", random), "yesterday")
+        self.assertNotEqual(shift_date(date.max, random), date.max)
+
+
+class TestShiftStateCode(unittest.TestCase):
+
+    def test_other_state_code(self):
+        random = Random(1)
+        for code in STATE_CODES:
+            value = shift_state_code(code, random)
+            self.assertIn(value, STATE_CODES)
+            self.assertNotEqual(value, code)
+        self.assertIn(shift_state_code("ny", random).upper(), STATE_CODES)
+        self.assertIn(shift_state_code("Puerto Rico", random), STATE_CODES)
+        self.assertIsNone(shift_state_code(None, random))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,238 @@
+import asyncio
+import unittest
+from datetime import datetime
+
+from mongomasker_cli import generators, main
+from mongomasker_cli.fakers import Fakers
+from mongomasker_cli.generators import (
+    DictionaryGenerator,
+    FakerGenerator,
+    FormatGenerator,
+    Generator,
+    Generators,
+    PooledGenerator,
+    PseudonymGenerator,
+    TransformGenerator,
+    register,
+)
+from mongomasker_cli.pools import ValuePools
+from mongomasker_cli.pseudonym import Pseudonymizer
+
+
+class Constant(Generator):
+    def one(self, original):
+        return "constant"
+
+
+class TestGenerators(unittest.TestCase):
+
+    def setUp(self):
+        self.generators = Generators(Fakers(seed=1))
+
+    def test_builtin_types(self):
+        self.assertIsInstance(self.generators["name"], FakerGenerator)
+        self.assertIsInstance(self.generators["redact"], TransformGenerator)
+        self.assertIs(self.generators["name"], self.generators["name"])
+        self.assertIsInstance(self.generators["date"].one(None), datetime)
+        self.assertRegex(self.generators["id"].one("1"), r"^\d+$")
+        self.assertEqual(self.generators["redact"].many([1, 2]), ["REDACTED"] * 2)
+
+    def test_many_differs_from_the_originals(self):
+        states = ["NY", "CA", "TX"] * 100
+        for data_type, originals in (("statecode", states), ("id", list(states))):
+            with self.subTest(data_type=data_type):
+                values = self.generators[data_type].many(originals)
+                self.assertEqual(len(values), len(originals))
+                for value, original in zip(values, originals):
+                    self.assertNotEqual(value, original)
+
+    def test_zipcode_of_locales_without_zipcodes(self):
+        generators = Generators(Fakers(seed=1, locale="de_DE"))
+        self.assertRegex(generators["zipcode"].one("10115"), r"^\d{5}$")
+        self.assertEqual(len(generators["zipcode"].many(["10115"] * 3)), 3)
+
+    def test_zipcode_of_other_locales_in_many(self):
+        generators = Generators(Fakers(seed=1, locale="ja_JP"))
+        for value in generators["zipcode"].many(["100-0001"] * 3):
+            self.assertRegex(value, r"^\d{3}-\d{4}$")
+
+    def test_unknown_type_generates_words(self):
+        unknown = []
+        generators = Generators(Fakers(seed=1), on_unknown=unknown.append)
+        self.assertIsInstance(generators["phone"].one("x"), str)
+        generators["phone"]
+        self.assertEqual(unknown, ["phone"])
+
+    def test_register(self):
+        register("constant", lambda generators, data_type: Constant())
+        try:
+            self.assertEqual(self.generators["constant"].many([1, 2]), ["constant"] * 2)
+        finally:
+            del generators.GENERATORS["constant"]
+
+    def test_pools_and_pseudonymizer_replace_faker_types(self):
+        fakers = Fakers(seed=1)
+        pools = ValuePools(fakers, 8)
+        try:
+            pooled = Generators(fakers, pools=pools)
+            self.assertIsInstance(pooled["city"], PooledGenerator)
+            self.assertIsInstance(pooled["unknown"], PooledGenerator)
+            self.assertIsInstance(pooled["null"], TransformGenerator)
+        finally:
+            pools.close()
+        pseudonymized = Generators(
+            fakers, pseudonymizer=Pseudonymizer("secret", 1024 * 1024)
+        )
+        self.assertIsInstance(pseudonymized["city"], PseudonymGenerator)
+        self.assertEqual(
+            pseudonymized["city"].many(["Paris", "Paris"]),
+            [pseudonymized["city"].one("Paris")] * 2,
+        )
+
+    def test_format_types(self):
+        self.assertRegex(self.generators["scramble"].one("AB-12"), r"^[A-Z]{2}-\d\d$")
+        self.assertEqual(self.generators["dateshift"].one(None), None)
+        seeded = [
+            Generators(Fakers(seed=3))["statecodeshift"].many(["NY"] * 10)
+            for _ in range(2)
+        ]
+        self.assertEqual(seeded[0], seeded[1])
+        self.assertNotIn("NY", seeded[0])
+
+    def test_keyed_format_types(self):
+        pseudonymizer = Pseudonymizer("secret", 1024 * 1024)
+        first, second = (
+            Generators(Fakers(), pseudonymizer=pseudonymizer)["dateshift"]
+            for _ in range(2)
+        )
+        self.assertIsInstance(first, FormatGenerator)
+        self.assertEqual(first.one("2023-01-01"), second.one("2023-01-01"))
+        self.assertEqual(len(set(first.many(["2023-01-01"] * 5))), 1)
+
+
+class Counting(Generator):
+    def __init__(self):
+        self.generated = []
+
+    def many(self, originals):
+        self.generated.append(list(originals))
+        return [f"fake-{original}" for original in originals]
+
+
+class FakeCollection:
+    def __init__(self, values):
+        self.values = values
+
+    async def distinct(self, path, filter_dict):
+        return list(self.values[path])
+
+
+class TestDictionaryGenerator(unittest.TestCase):
+
+    def test_distinct_originals_are_generated_once(self):
+        counting = Counting()
+        dictionary = DictionaryGenerator(counting)
+        self.assertEqual(
+            dictionary.many(["NY", "CA", "NY"]), ["fake-NY", "fake-CA", "fake-NY"]
+        )
+        self.assertEqual(dictionary.many(["CA", "NY"]), ["fake-CA", "fake-NY"])
+        self.assertEqual(counting.generated, [["NY", "CA"]])
+        self.assertEqual((dictionary.hits, dictionary.misses), (3, 2))
+        self.assertEqual(dictionary.hit_rate, 0.6)
+
+    def test_types_and_unhashable_values(self):
+        dictionary = DictionaryGenerator(Counting())
+        dictionary.many([1, True, 1.5])
+        self.assertEqual(len(dictionary.values), 3)
+        self.assertEqual(dictionary.one({"a": 1}), "fake-{'a': 1}")
+        self.assertEqual(len(dictionary.values), 3)
+
+    def test_size_cap_falls_back_to_generating(self):
+        counting = Counting()
+        dictionary = DictionaryGenerator(counting, max_size=1)
+        dictionary.many(["a", "b"])
+        dictionary.many(["a", "b"])
+        self.assertEqual(counting.generated, [["a", "b"], ["b"]])
+
+    def test_add_preloads_without_counting_lookups(self):
+        counting = Counting()
+        dictionary = DictionaryGenerator(counting)
+        dictionary.add(["a", "b"])
+        dictionary.one("a")
+        self.assertEqual((dictionary.hits, dictionary.misses), (1, 0))
+
+    def test_fields_of_the_dictionary_paths(self):
+        generators = Generators(
+            Fakers(seed=1),
+            dictionary_paths=["address.city"],
+            dictionary_size=10,
+            dictionary_originals={"address.city": ["Paris"]},
+        )
+        city = generators.field("address.city", "city")
+        self.assertIsInstance(city, DictionaryGenerator)
+        self.assertIs(generators.field("address.city", "city"), city)
+        self.assertEqual(list(city.values), [(str, "Paris")])
+        self.assertIs(generators.field("city", "city"), generators["city"])
+
+    def test_dictionaries_by_path_and_data_type(self):
+        generators = Generators(Fakers(seed=1), dictionary_paths=["name"])
+        name = generators.field("name", "name")
+        name.one("Ann")
+        company = generators.field("name", "company")
+        self.assertIsNot(company, name)
+        self.assertIs(company.generator, generators["company"])
+        # preloading a dictionary keeps the lookups of the masking
+        name.add(["Bob"])
+        self.assertEqual((name.hits, name.misses), (0, 1))
+
+    def test_anonymize_batch_masks_equal_values_alike(self):
+        original = main.generators
+        try:
+            main.configure_generators(1, dictionary_paths=["city"])
+            documents = [{"city": "Paris"}, {"city": "Paris"}, {"city": "Lyon"}]
+            main.anonymize_batch(documents, {"city": "city"})
+            self.assertEqual(documents[0], documents[1])
+            self.assertNotEqual(documents[0]["city"], "Paris")
+            self.assertEqual(main.generators.dictionaries["city", "city"].misses, 2)
+        finally:
+            main.generators = original
+
+    def test_preload_dictionaries(self):
+        original = main.generators
+        collection = FakeCollection({"city": ["Paris", "Lyon", "Nice"]})
+        fields = {"city": "city", "*.name": "name"}
+        try:
+            main.configure_generators(1, dictionary_paths=["city", "*.name"])
+            options = main.CopyOptions(
+                generator_options={
+                    "dictionary_size": 2,
+                    "dictionary_paths": ["city", "*.name"],
+                }
+            )
+            self.assertIs(
+                asyncio.run(main.preload_dictionaries(collection, fields, {}, options)),
+                options,
+            )
+            self.assertEqual(
+                len(main.generators.dictionaries["city", "city"].values), 2
+            )
+            workers = asyncio.run(
+                main.preload_dictionaries(
+                    collection,
+                    fields,
+                    {},
+                    main.CopyOptions(
+                        workers=2, generator_options={"dictionary_paths": ["city"]}
+                    ),
+                )
+            )
+            self.assertEqual(
+                workers.generator_options["dictionary_originals"],
+                {"city": ["Paris", "Lyon", "Nice"]},
+            )
+        finally:
+            main.generators = original
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+import bson
+
+from mongomasker_cli import main
+from mongomasker_cli.bench import MemoryCollection
+from mongomasker_cli.checkpoint import Checkpoint
+from mongomasker_cli.indexes import (
+    create_target,
+    defer_indexes,
+    index_models,
+)
+
+ID_INDEX = {"v": 2, "key": {"_id": 1}, "name": "_id_"}
+
+
+class FakeCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length):
+        return list(self.documents)
+
+
+class FakeDatabase:
+    def __init__(self, names=()):
+        self.names = list(names)
+        self.created = {}
+
+    async def list_collection_names(self, filter=None):
+        return [name for name in self.names if name == filter["name"]]
+
+    async def create_collection(self, name, **options):
+        self.names.append(name)
+        self.created[name] = options
+
+
+class FakeCollection:
+    def __init__(self, name, indexes=(), options=None, database=None):
+        self.name = name
+        self.indexes = [ID_INDEX, *indexes]
+        self._options = options or {}
+        self.database = database or FakeDatabase()
+
+    def list_indexes(self):
+        return FakeCursor(self.indexes)
+
+    async def drop_indexes(self):
+        self.indexes = [ID_INDEX]
+
+    async def create_indexes(self, models):
+        self.indexes += [model.document for model in models]
+
+    async def options(self):
+        return self._options
+
+
+class TestIndexModels(unittest.TestCase):
+    def test_id_index_is_skipped_and_options_kept(self):
+        (model,) = index_models(
+            [
+                ID_INDEX,
+                {
+                    "v": 2,
+                    "key": {"email": 1, "createdAt": -1},
+                    "name": "email_1_createdAt_-1",
+                    "unique": True,
+                    "partialFilterExpression": {"email": {"$exists": True}},
+                },
+            ]
+        )
+        self.assertEqual(
+            model.document,
+            {
+                "key": {"email": 1, "createdAt": -1},
+                "name": "email_1_createdAt_-1",
+                "unique": True,
+                "partialFilterExpression": {"email": {"$exists": True}},
+            },
+        )
+
+
+class TestDeferIndexes(unittest.TestCase):
+    def test_target_indexes_are_dropped_and_kept_for_later(self):
+        source = FakeCollection(
+            "people", [{"v": 2, "key": {"email": 1}, "name": "email_1"}]
+        )
+        target = FakeCollection(
+            "people",
+            [
+                {"v": 2, "key": {"email": 1}, "name": "email_1"},
+                {"v": 2, "key": {"city": 1}, "name": "city_1"},
+            ],
+        )
+        models = asyncio.run(defer_indexes(source, target))
+        self.assertEqual(
+            [model.document["name"] for model in models], ["email_1", "city_1"]
+        )
+        self.assertEqual(target.indexes, [ID_INDEX])
+
+
+class FailingTarget(FakeCollection):
+    full_name = "db.people"
+
+    async def insert_many(self, documents, ordered=True):
+        raise ConnectionError("target down")
+
+
+class TestIndexesOfFailedCopies(unittest.TestCase):
+    def setUp(self):
+        main.configure_generators(0)
+        self.source = MemoryCollection(
+            "people",
+            main.CODEC_OPTIONS,
+            [bson.encode({"_id": i, "name": "John"}) for i in range(4)],
+        )
+        self.source.list_indexes = lambda: FakeCursor([ID_INDEX])
+        self.target = FailingTarget(
+            "people", [{"v": 2, "key": {"city": 1}, "name": "city_1"}]
+        )
+
+    def test_dropped_indexes_are_built_again(self):
+        with self.assertRaises(ConnectionError):
+            asyncio.run(
+                main.copy_collection(
+                    self.source,
+                    self.target,
+                    {"name": "name"},
+                    {},
+                    main.CopyOptions(batch_size=2, defer_indexes=True),
+                )
+            )
+        self.assertEqual(
+            [index["name"] for index in self.target.indexes], ["_id_", "city_1"]
+        )
+
+    def test_checkpoint_keeps_the_dropped_indexes(self):
+        path = os.path.join(tempfile.mkdtemp(), "checkpoint.json")
+        checkpoint = Checkpoint.create(path, "bench.people", "db.people", {}, [{}])
+        options = main.CopyOptions(defer_indexes=True)
+        asyncio.run(main.prepare_target(self.source, self.target, options, checkpoint))
+        # the copy stopped without building them, the resumed copy doesn't
+        # find them on the target anymore
+        self.assertEqual(self.target.indexes, [ID_INDEX])
+        models, _ = asyncio.run(
+            main.prepare_target(
+                self.source, self.target, options, Checkpoint.load(path)
+            )
+        )
+        self.assertEqual([model.document["name"] for model in models], ["city_1"])
+        self.assertEqual(
+            [index["name"] for index in Checkpoint.load(path).indexes], ["city_1"]
+        )
+
+
+class TestCreateTarget(unittest.TestCase):
+    def test_creation_and_validation_options_are_split(self):
+        source = FakeCollection(
+            "people",
+            options={
+                "collation": {"locale": "fr"},
+                "validator": {"email": {"$type": "string"}},
+                "validationAction": "error",
+            },
+        )
+        target = FakeCollection("people")
+        validation = asyncio.run(create_target(source, target))
+        self.assertEqual(
+            target.database.created, {"people": {"collation": {"locale": "fr"}}}
+        )
+        self.assertEqual(
+            validation,
+            {"validator": {"email": {"$type": "string"}}, "validationAction": "error"},
+        )
+
+    def test_existing_target_is_left_alone(self):
+        source = FakeCollection("people", options={"collation": {"locale": "fr"}})
+        target = FakeCollection("people", database=FakeDatabase(["people"]))
+        self.assertIsNone(asyncio.run(create_target(source, target)))
+        self.assertEqual(target.database.created, {})
+
+
+if __name__ == "__main__":
+    unittest.main()
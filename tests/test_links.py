@@ -0,0 +1,135 @@
+import asyncio
+import os
+import tempfile
+import unittest
+from datetime import datetime, timezone
+
+import bson
+from bson import ObjectId
+
+from mongomasker_cli import main
+from mongomasker_cli.fakers import Fakers
+from mongomasker_cli.generators import Generator, Generators, LinkGenerator
+from mongomasker_cli.links import MappingStore, link_data_type, parse_link
+from mongomasker_cli.workers import RAW_CODEC_OPTIONS, MaskingPool
+
+
+class Counter(Generator):
+    def __init__(self):
+        self.count = 0
+
+    def one(self, original):
+        self.count += 1
+        return f"fake-{self.count}"
+
+
+class TestMappingStore(unittest.TestCase):
+
+    def test_parse_link(self):
+        self.assertEqual(
+            parse_link(link_data_type("customer", "id")), ("customer", "id")
+        )
+        self.assertIsNone(parse_link("id"))
+
+    def test_memory_and_spill(self):
+        store = MappingStore(max_bytes=600)
+        try:
+            keys = [store.key(i) for i in range(10)]
+            values = {key: f"value-{i}" for i, key in enumerate(keys)}
+            self.assertEqual(store.put_many("link", values), values)
+            self.assertGreater(store.spilled, 0)
+            self.assertLess(len(store.memory), 10)
+            self.assertEqual(store.get_many("link", keys), values)
+            self.assertEqual(store.get_many("other", keys), {})
+            directory = store.temporary.name
+        finally:
+            store.close()
+        self.assertFalse(os.path.exists(directory))
+
+    def test_shared_file_keeps_the_first_value(self):
+        path = os.path.join(tempfile.mkdtemp(), "links.sqlite")
+        first, second = MappingStore(path), MappingStore(path)
+        try:
+            key = first.key(ObjectId("64b7f0c2a1b2c3d4e5f60718"))
+            self.assertEqual(first.put_many("link", {key: "a"}), {key: "a"})
+            self.assertEqual(second.get_many("link", [key]), {key: "a"})
+            self.assertEqual(second.put_many("link", {key: "b"}), {key: "a"})
+        finally:
+            first.close()
+            second.close()
+
+    def test_values_keep_their_type(self):
+        store = MappingStore(max_bytes=0, codec_options=main.CODEC_OPTIONS)
+        try:
+            key = store.key(1)
+            value = datetime(2020, 1, 1, tzinfo=timezone.utc)
+            store.put_many("link", {key: value})
+            self.assertEqual(store.get_many("link", [key]), {key: value})
+            self.assertNotEqual(store.key(1), store.key(1.0))
+        finally:
+            store.close()
+
+
+class TestLinkGenerator(unittest.TestCase):
+
+    def test_originals_map_once(self):
+        store = MappingStore()
+        counter = Counter()
+        link = LinkGenerator(store, "customer", counter)
+        self.assertEqual(link.many(["a", "b", "a"]), ["fake-1", "fake-2", "fake-1"])
+        other = LinkGenerator(store, "customer", Counter())
+        self.assertEqual(other.one("b"), "fake-2")
+        self.assertEqual(LinkGenerator(store, "vendor", Counter()).one("b"), "fake-1")
+
+    def test_generators_resolve_links(self):
+        generators = Generators(Fakers(seed=1), links=MappingStore())
+        link = generators["link:customer:id"]
+        self.assertIsInstance(link, LinkGenerator)
+        self.assertIs(link.generator, generators["id"])
+
+    def test_collections_masked_alike(self):
+        original = main.generators
+        try:
+            main.configure_generators(1)
+            people = [{"_id": "c1"}, {"_id": "c2"}]
+            orders = [{"customer": {"id": "c2"}}, {"customer": {"id": "c1"}}]
+            main.anonymize_batch(people, {"_id": "link:customer:id"})
+            main.anonymize_batch(orders, {"customer.id": "link:customer:id"})
+            self.assertEqual(
+                [order["customer"]["id"] for order in orders],
+                [people[1]["_id"], people[0]["_id"]],
+            )
+            self.assertNotIn(people[0]["_id"], ("c1", "c2"))
+        finally:
+            main.generators = original
+
+    def test_workers_share_the_store(self):
+        path = os.path.join(tempfile.mkdtemp(), "links.sqlite")
+        documents = [{"_id": i, "customerId": f"c{i % 3}"} for i in range(30)]
+        data = b"".join(bson.encode(document) for document in documents)
+        batches = [
+            bson.decode_all(data, RAW_CODEC_OPTIONS)[i : i + 5] for i in range(0, 30, 5)
+        ]
+
+        async def mask(pool):
+            return await asyncio.gather(*(pool.mask(batch) for batch in batches))
+
+        with MaskingPool(
+            2,
+            {"customerId": "link:customer:id"},
+            seed=1,
+            generator_options={"link_store": path},
+        ) as pool:
+            masked = [
+                document for batch in asyncio.run(mask(pool)) for document in batch
+            ]
+        by_original = {}
+        for document, masked_document in zip(documents, masked):
+            by_original.setdefault(document["customerId"], set()).add(
+                masked_document["customerId"]
+            )
+        self.assertEqual([len(values) for values in by_original.values()], [1, 1, 1])
+
+
+if __name__ == "__main__":
+    unittest.main()
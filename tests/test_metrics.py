@@ -0,0 +1,102 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+
+from mongomasker_cli.metrics import (
+    Metrics,
+    MetricsReporter,
+    start_prometheus_server,
+)
+from mongomasker_cli.pipeline import run_pipeline
+
+
+class AsyncCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def __aiter__(self):
+        for document in self.documents:
+            await asyncio.sleep(0)
+            yield document
+
+
+async def slow_write(batch):
+    await asyncio.sleep(0.01)
+
+
+def copy(metrics, count=50):
+    asyncio.run(
+        run_pipeline(
+            [AsyncCursor([{"_id": i} for i in range(count)])],
+            lambda batch: batch,
+            slow_write,
+            batch_size=10,
+            writers=2,
+            metrics=metrics,
+        )
+    )
+
+
+class TestMetrics(unittest.TestCase):
+
+    def test_pipeline_records_stages(self):
+        metrics = Metrics()
+        copy(metrics)
+        self.assertEqual((metrics.documents_read, metrics.documents_written), (50, 50))
+        self.assertEqual(metrics.calls["read"], 5)
+        self.assertEqual(metrics.calls["mask"], 5)
+        self.assertEqual(metrics.calls["write"], 5)
+        self.assertGreaterEqual(metrics.seconds["write"], 0.05)
+        self.assertEqual(metrics.concurrency["write"], 2)
+        self.assertEqual(set(metrics.queues), {"mask", "write"})
+
+    def test_reporter_lines_and_prometheus_file(self):
+        directory = tempfile.mkdtemp()
+        log_file = os.path.join(directory, "metrics.jsonl")
+        prometheus_file = os.path.join(directory, "metrics.prom")
+        metrics = Metrics()
+        reporter = MetricsReporter(metrics, 60, log_file, prometheus_file)
+        copy(metrics)
+        reporter.report()
+        reporter.report()
+
+        with open(log_file) as lines:
+            first, second = [json.loads(line) for line in lines]
+        self.assertEqual(first["documents_written"], 50)
+        self.assertGreater(first["documents_per_second"], 0)
+        self.assertGreater(first["stages"]["write"]["utilization"], 0)
+        # nothing happened between the two lines
+        self.assertEqual(second["documents_per_second"], 0)
+        with open(prometheus_file) as prometheus:
+            self.assertIn("mongomasker_documents_written_total 50", prometheus.read())
+        self.assertFalse(os.path.exists(prometheus_file + ".tmp"))
+
+    def test_prometheus_format(self):
+        metrics = Metrics()
+        metrics.record("write", 1.5)
+        text = metrics.prometheus()
+        self.assertIn('mongomasker_stage_seconds_total{stage="write"} 1.500000', text)
+        self.assertIn('mongomasker_stage_calls_total{stage="write"} 1', text)
+        self.assertTrue(text.endswith("\n"))
+
+    def test_prometheus_server(self):
+        metrics = Metrics()
+        metrics.documents_written = 7
+
+        async def scrape():
+            server = await start_prometheus_server(metrics, 0)
+            host, port = server.sockets[0].getsockname()[:2]
+            self.assertEqual(host, "127.0.0.1")
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            response = await reader.read()
+            writer.close()
+            server.close()
+            await server.wait_closed()
+            return response.decode()
+
+        response = asyncio.run(scrape())
+        self.assertTrue(response.startswith("HTTP/1.1 200 OK"))
+        self.assertIn("mongomasker_documents_written_total 7", response)
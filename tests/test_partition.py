@@ -0,0 +1,60 @@
+import unittest
+
+from bson.objectid import ObjectId
+
+from mongomasker_cli.partition import partition_filters, split_ids
+
+
+class TestSplitIds(unittest.TestCase):
+
+    def test_split_numeric_ids(self):
+        id_type, boundaries = split_ids(list(range(100)), 4)
+        self.assertEqual(id_type, "number")
+        self.assertEqual(boundaries, [25, 50, 75])
+
+    def test_split_object_ids(self):
+        ids = [ObjectId() for _ in range(40)]
+        id_type, boundaries = split_ids(ids, 4)
+        self.assertEqual(id_type, "objectId")
+        self.assertEqual(len(boundaries), 3)
+        self.assertEqual(boundaries, sorted(boundaries))
+
+    def test_small_sample_has_no_empty_ranges(self):
+        id_type, boundaries = split_ids([1, 2], 8)
+        self.assertEqual(boundaries, [2])
+
+    def test_mixed_types_are_not_split(self):
+        self.assertEqual(split_ids([1, "a", ObjectId()], 4), (None, []))
+
+    def test_empty_sample_is_not_split(self):
+        self.assertEqual(split_ids([], 4), (None, []))
+
+
+class TestPartitionFilters(unittest.TestCase):
+
+    def test_ranges_without_filter(self):
+        filters = partition_filters({}, "number", [10, 20])
+        self.assertEqual(
+            filters,
+            [
+                {"_id": {"$lt": 10}},
+                {"_id": {"$gte": 10, "$lt": 20}},
+                {"_id": {"$gte": 20}},
+                {"_id": {"$not": {"$type": "number"}}},
+            ],
+        )
+
+    def test_filter_is_anded_into_every_partition(self):
+        filter_dict = {"status": "active"}
+        filters = partition_filters(filter_dict, "string", ["m"])
+        self.assertEqual(len(filters), 3)
+        for partition_filter in filters:
+            self.assertEqual(partition_filter["$and"][0], filter_dict)
+
+    def test_no_boundaries_uses_filter(self):
+        filter_dict = {"status": "active"}
+        self.assertEqual(partition_filters(filter_dict, None, []), [filter_dict])
+
+
+if __name__ == "__main__":
+    unittest.main()
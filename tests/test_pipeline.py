@@ -0,0 +1,126 @@
+import asyncio
+import unittest
+
+from mongomasker_cli.pipeline import run_pipeline
+
+
+class AsyncCursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self.documents:
+            await asyncio.sleep(0)
+            yield document
+
+
+class RecordingWriter:
+    def __init__(self, delay=0.01, fail_on=None):
+        self.delay = delay
+        self.fail_on = fail_on
+        self.written = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def __call__(self, batch):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            await asyncio.sleep(self.delay)
+            if self.fail_on is not None and self.fail_on in batch:
+                raise RuntimeError("insert failed")
+            self.written.extend(batch)
+        finally:
+            self.in_flight -= 1
+
+
+def mask(batch):
+    return [{"value": doc["value"] * 2} for doc in batch]
+
+
+class TestRunPipeline(unittest.TestCase):
+
+    def test_all_documents_are_masked_and_written(self):
+        documents = [{"value": i} for i in range(95)]
+        writer = RecordingWriter()
+        written_batches = []
+        asyncio.run(
+            run_pipeline(
+                [AsyncCursor(documents)],
+                mask,
+                writer,
+                batch_size=10,
+                writers=3,
+                on_written=written_batches.append,
+            )
+        )
+        self.assertEqual(
+            sorted(doc["value"] for doc in writer.written),
+            [i * 2 for i in range(95)],
+        )
+        self.assertEqual(len(written_batches), 10)
+        self.assertEqual(sum(len(batch) for batch in written_batches), 95)
+
+    def test_writes_run_concurrently_up_to_writers(self):
+        documents = [{"value": i} for i in range(100)]
+        writer = RecordingWriter(delay=0.02)
+        asyncio.run(
+            run_pipeline(
+                [AsyncCursor(documents)], mask, writer, batch_size=5, writers=4
+            )
+        )
+        self.assertEqual(writer.max_in_flight, 4)
+
+    def test_multiple_cursors(self):
+        cursors = [
+            AsyncCursor([{"value": i} for i in range(start, start + 25)])
+            for start in range(0, 100, 25)
+        ]
+        writer = RecordingWriter()
+        asyncio.run(run_pipeline(cursors, mask, writer, batch_size=10))
+        self.assertEqual(
+            sorted(doc["value"] for doc in writer.written),
+            [i * 2 for i in range(100)],
+        )
+
+    def test_batches_record_source_and_sequence(self):
+        cursors = [
+            AsyncCursor([{"value": i} for i in range(25)]),
+            AsyncCursor([{"value": i} for i in range(5)]),
+        ]
+        read, written = [], []
+        asyncio.run(
+            run_pipeline(
+                cursors,
+                mask,
+                RecordingWriter(),
+                batch_size=10,
+                on_read=lambda batch: read.append((batch.source, batch.sequence)),
+                on_written=lambda batch: written.append((batch.source, batch.sequence)),
+            )
+        )
+        self.assertEqual(sorted(read), [(0, 0), (0, 1), (0, 2), (1, 0)])
+        self.assertEqual(sorted(written), sorted(read))
+
+    def test_empty_cursor(self):
+        writer = RecordingWriter()
+        asyncio.run(run_pipeline([AsyncCursor([])], mask, writer, batch_size=10))
+        self.assertEqual(writer.written, [])
+
+    def test_writer_failure_stops_pipeline(self):
+        documents = [{"value": i} for i in range(1000)]
+        writer = RecordingWriter(fail_on={"value": 20})
+        with self.assertRaises(RuntimeError):
+            asyncio.run(
+                run_pipeline(
+                    [AsyncCursor(documents)], mask, writer, batch_size=10, writers=2
+                )
+            )
+        self.assertLess(len(writer.written), 1000)
+
+
+if __name__ == "__main__":
+    unittest.main()
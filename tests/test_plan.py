@@ -0,0 +1,121 @@
+import unittest
+
+from mongomasker_cli.plan import FieldPlan, compile_fields
+
+
+def masked(data_type, value):
+    return f"masked-{data_type}"
+
+
+class TestFieldPlan(unittest.TestCase):
+
+    def test_shared_prefix_is_compiled_once(self):
+        plan = FieldPlan({"a.b.c": "name", "a.b.d": "email", "a.e": "city"})
+        self.assertEqual(list(plan.root.children), ["a"])
+        a = plan.root.children["a"]
+        self.assertEqual(list(a.children), ["b", "e"])
+        self.assertEqual(list(a.children["b"].children), ["c", "d"])
+        self.assertEqual(a.children["b"].children["d"].path, "a.b.d")
+
+    def test_compile_fields_reuses_plan(self):
+        plan = compile_fields({"name": "name"})
+        self.assertIs(compile_fields(plan), plan)
+
+    def test_apply_single_pass(self):
+        document = {"a": {"b": {"c": 1, "d": 2}, "e": 3}, "f": 4}
+        FieldPlan({"a.b.c": "name", "a.b.d": "email", "a.e": "city"}).apply(
+            document, masked
+        )
+        self.assertEqual(
+            document,
+            {
+                "a": {
+                    "b": {"c": "masked-name", "d": "masked-email"},
+                    "e": "masked-city",
+                },
+                "f": 4,
+            },
+        )
+
+    def test_list_fan_out_and_wildcard(self):
+        document = {
+            "x": {"items": [{"id": 1}, {"other": 2}, "text"]},
+            "y": {"items": [{"id": 3}]},
+            "z": "scalar",
+        }
+        warnings = []
+        FieldPlan({"*.items.id": "id"}).apply(document, masked, warnings.append)
+        self.assertEqual(document["x"]["items"][0], {"id": "masked-id"})
+        self.assertEqual(document["x"]["items"][1], {"other": 2})
+        self.assertEqual(document["y"]["items"][0], {"id": "masked-id"})
+        self.assertEqual(document["z"], "scalar")
+        self.assertEqual(len(warnings), 2)
+
+    def test_leaf_wildcard_masks_every_key(self):
+        document = {"codes": {"a": "1", "b": "2"}}
+        FieldPlan({"codes.*": "id"}).apply(document, masked)
+        self.assertEqual(document, {"codes": {"a": "masked-id", "b": "masked-id"}})
+
+    def test_missing_key_in_list_item(self):
+        document = {"users": [{"contacts": [{"email": "a"}]}, {"name": "b"}]}
+        FieldPlan({"users.contacts.email": "email"}).apply(document, masked)
+        self.assertEqual(document["users"][0]["contacts"][0]["email"], "masked-email")
+        self.assertEqual(document["users"][1], {"name": "b"})
+
+
+class Generator:
+    def __init__(self, data_type, calls):
+        self.data_type = data_type
+        self.calls = calls
+
+    def many(self, originals):
+        self.calls.append((self.data_type, list(originals)))
+        return [f"masked-{original}" for original in originals]
+
+
+class Generators:
+    def __init__(self):
+        self.calls = []
+
+    def field(self, path, data_type):
+        return Generator(data_type, self.calls)
+
+
+class TestApplyBatch(unittest.TestCase):
+
+    def test_one_call_per_path_and_batch(self):
+        documents = [
+            {"name": "a", "items": [{"id": 1}, {"id": 2}]},
+            {"name": "b", "items": [{"id": 3}]},
+            {"items": []},
+        ]
+        generators = Generators()
+        warnings = []
+        FieldPlan({"name": "name", "items.id": "id"}).apply_batch(
+            documents, generators, lambda document, msg: warnings.append(document)
+        )
+        self.assertEqual(generators.calls, [("name", ["a", "b"]), ("id", [1, 2, 3])])
+        self.assertEqual(documents[0]["name"], "masked-a")
+        self.assertEqual(documents[1]["items"], [{"id": "masked-3"}])
+        self.assertEqual(warnings, [documents[2]])
+
+    def test_same_result_as_apply(self):
+        fields = {"*.items.id": "id", "codes.*": "id"}
+
+        def make():
+            return [
+                {"x": {"items": [{"id": i}, "text"]}, "codes": {"a": i, "b": 0}}
+                for i in range(3)
+            ]
+
+        expected = [
+            FieldPlan(fields).apply(
+                document, lambda data_type, value: f"masked-{value}"
+            )
+            for document in make()
+        ]
+        self.assertEqual(FieldPlan(fields).apply_batch(make(), Generators()), expected)
+
+
+if __name__ == "__main__":
+    unittest.main()
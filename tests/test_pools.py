@@ -0,0 +1,57 @@
+import re
+import unittest
+from datetime import date, datetime
+
+from faker import Faker
+
+from mongomasker_cli.fakers import Fakers
+from mongomasker_cli.pools import FILLERS, ValuePools
+
+
+class TestValuePools(unittest.TestCase):
+
+    def setUp(self):
+        self.fake = Faker()
+        self.fake.seed_instance(1)
+        self.pools = ValuePools(Fakers(seed=1), 16)
+
+    def tearDown(self):
+        self.pools.close()
+
+    def test_take_refills(self):
+        values = [self.pools.take("id") for _ in range(50)]
+        self.assertEqual(len(values), 50)
+        for value in values:
+            self.assertTrue(value.isdigit())
+        self.assertGreater(len(set(values)), 40)
+
+    def test_numeric_types(self):
+        today = datetime.combine(date.today(), datetime.min.time())
+        for _ in range(40):
+            value = self.pools.take("date")
+            self.assertIsInstance(value, datetime)
+            self.assertTrue(datetime(1970, 1, 1) <= value <= today)
+            self.assertRegex(self.pools.take("datestr"), r"^\d{4}-\d{2}-\d{2}$")
+            self.assertRegex(self.pools.take("zipcode"), r"^\d{5}$")
+
+    def test_every_type_has_a_filler(self):
+        for data_type, fill in FILLERS.items():
+            values = fill(self.fake, 3)
+            self.assertEqual(len(values), 3, data_type)
+        self.assertIsNotNone(
+            re.match(r"^\w+,\w+", self.pools.take("lastnamefirstname"))
+        )
+
+    def test_zipcode_of_the_locale(self):
+        pools = ValuePools(Fakers(seed=1, locale="en_GB"), 10)
+        try:
+            self.assertNotRegex(pools.take("zipcode"), r"^\d{5}$")
+        finally:
+            pools.close()
+
+    def test_unknown_type_uses_words(self):
+        self.assertIsInstance(self.pools.take("unknown"), str)
+
+
+if __name__ == "__main__":
+    unittest.main()
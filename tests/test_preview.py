@@ -0,0 +1,87 @@
+import unittest
+from datetime import datetime
+
+from mongomasker_cli.plan import compile_fields
+from mongomasker_cli.preview import Coverage, format_coverage
+
+
+def coverage_of(fields, documents):
+    coverage = Coverage(compile_fields(fields))
+    for document in documents:
+        coverage.add(document)
+    return coverage
+
+
+class TestCoverage(unittest.TestCase):
+    def test_hits_misses_and_types(self):
+        coverage = coverage_of(
+            {"name": "name", "createdAt": "date"},
+            [
+                {"name": "John", "createdAt": datetime(2023, 1, 1)},
+                {"name": None, "createdAt": "2023-01-01"},
+                {"createdAt": datetime(2023, 1, 1)},
+            ],
+        )
+        self.assertEqual(coverage.documents, 3)
+        name = coverage.paths["name"]
+        self.assertEqual((name.hits, name.misses), (2, 1))
+        self.assertEqual(name.types, {"str": 1, "null": 1})
+        self.assertEqual(coverage.paths["createdAt"].types, {"datetime": 2, "str": 1})
+
+    def test_lists_and_non_documents(self):
+        coverage = coverage_of(
+            {"orders.id": "id", "orders.customer.name": "name"},
+            [
+                {"orders": [{"id": "1", "customer": {"name": "John"}}, {"id": "2"}]},
+                {"orders": ["not a document"]},
+                {"orders": "none"},
+            ],
+        )
+        order_id = coverage.paths["orders.id"]
+        self.assertEqual((order_id.hits, order_id.lists), (2, 2))
+        self.assertEqual(order_id.non_documents, 2)
+        customer = coverage.paths["orders.customer.name"]
+        self.assertEqual((customer.hits, customer.misses), (1, 1))
+        self.assertEqual(customer.non_documents, 2)
+
+    def test_missing_prefix_misses_every_path_below(self):
+        coverage = coverage_of(
+            {"address.city": "city", "address.zipcode": "zipcode"}, [{"name": "x"}]
+        )
+        self.assertEqual([path.misses for path in coverage.paths.values()], [1, 1])
+
+    def test_wildcard(self):
+        coverage = coverage_of(
+            {"*.charges.provider": "lastname"},
+            [{"claim1": {"charges": [{"provider": "A"}, {"code": 1}]}, "n": 1}],
+        )
+        provider = coverage.paths["*.charges.provider"]
+        self.assertEqual(
+            (provider.hits, provider.misses, provider.non_documents), (1, 1, 1)
+        )
+
+    def test_format_and_as_dict(self):
+        coverage = coverage_of({"name": "name"}, [{"name": "John"}])
+        report = format_coverage(coverage)
+        self.assertIn("name", report.splitlines()[1])
+        self.assertEqual(
+            coverage.as_dict(),
+            {
+                "documents": 1,
+                "paths": [
+                    {
+                        "path": "name",
+                        "data_type": "name",
+                        "hits": 1,
+                        "misses": 0,
+                        "lists": 0,
+                        "non_documents": 0,
+                        "types": {"str": 1},
+                    }
+                ],
+            },
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import asyncio
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+import bson
+
+from mongomasker_cli.main import count_file, count_source
+from mongomasker_cli.progress import LineProgress
+
+
+class CountingCollection:
+    def __init__(self, total):
+        self.total = total
+        self.calls = []
+
+    async def estimated_document_count(self):
+        self.calls.append("estimated")
+        return self.total
+
+    async def count_documents(self, query):
+        self.calls.append(query)
+        await asyncio.sleep(0)
+        return self.total
+
+
+class TestCountSource(unittest.TestCase):
+
+    def count(self, queries, mode):
+        collection = CountingCollection(10)
+
+        async def run():
+            total = await count_source(collection, queries, mode)
+            if isinstance(total, asyncio.Future):
+                total = ("task", await total)
+            return total
+
+        return asyncio.run(run()), collection.calls
+
+    def test_auto_without_filter_estimates(self):
+        self.assertEqual(self.count([{}], "auto"), (10, ["estimated"]))
+
+    def test_auto_with_filter_counts_in_background(self):
+        self.assertEqual(self.count([{"a": 1}], "auto"), (("task", 10), [{"a": 1}]))
+
+    def test_exact_sums_the_queries(self):
+        self.assertEqual(
+            self.count([{"a": 1}, {"a": 2}], "exact"), (20, [{"a": 1}, {"a": 2}])
+        )
+
+    def test_none(self):
+        self.assertEqual(self.count([{}], "none"), (None, []))
+
+
+class TestCountFile(unittest.TestCase):
+
+    def test_modes(self):
+        path = os.path.join(tempfile.mkdtemp(), "a.bson")
+        with open(path, "wb") as file:
+            file.write(bson.encode({"a": 1}) * 3)
+
+        async def run(mode):
+            total = await count_file(path, mode)
+            if isinstance(total, asyncio.Future):
+                total = ("task", await total)
+            return total
+
+        for mode, total in (
+            ("auto", 3),
+            ("exact", 3),
+            ("background", ("task", 3)),
+            ("none", None),
+        ):
+            with self.subTest(mode=mode):
+                self.assertEqual(asyncio.run(run(mode)), total)
+
+
+class TestLineProgress(unittest.TestCase):
+
+    def test_length_set_later(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            with LineProgress("Processing documents") as progress:
+                progress.update(5)
+                progress.print()
+                progress.length = 20
+                progress.update(5)
+        first, last = output.getvalue().splitlines()[-2:]
+        self.assertTrue(first.startswith("Processing documents: 5 documents"))
+        self.assertTrue(last.startswith("Processing documents: 10/20 documents (50%)"))
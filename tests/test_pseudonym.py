@@ -0,0 +1,90 @@
+import unittest
+from datetime import datetime
+
+from mongomasker_cli import main
+from mongomasker_cli.pseudonym import LRUCache, Pseudonymizer, VALUES
+
+
+class TestPseudonymizer(unittest.TestCase):
+
+    def test_same_value_masks_the_same_across_instances(self):
+        first = Pseudonymizer("secret", 1024 * 1024)
+        second = Pseudonymizer("secret", 1024 * 1024)
+        for data_type in VALUES:
+            self.assertEqual(
+                first.mask(data_type, "John"), second.mask(data_type, "John")
+            )
+
+    def test_key_changes_the_mapping(self):
+        first = Pseudonymizer("secret", 1024 * 1024)
+        second = Pseudonymizer("other secret", 1024 * 1024)
+        originals = [f"user{i}@example.com" for i in range(10)]
+        self.assertNotEqual(
+            [first.mask("email", value) for value in originals],
+            [second.mask("email", value) for value in originals],
+        )
+
+    def test_masked_value_differs_from_original(self):
+        pseudonymizer = Pseudonymizer("secret", 1024 * 1024)
+        for state in ["NY", "CA", "TX", "AZ", "RL"]:
+            self.assertNotEqual(pseudonymizer.mask("statecode", state), state)
+
+    def test_value_types(self):
+        pseudonymizer = Pseudonymizer("secret", 1024 * 1024)
+        self.assertIsInstance(
+            pseudonymizer.mask("date", datetime(2000, 1, 1)), datetime
+        )
+        self.assertRegex(pseudonymizer.mask("id", "1234567890"), r"^\d+$")
+        self.assertRegex(pseudonymizer.mask("zipcode", "10001"), r"^\d{5}$")
+
+    def test_zipcode_of_the_locale(self):
+        pseudonymizer = Pseudonymizer("secret", 1024 * 1024, locale="ja_JP")
+        self.assertRegex(pseudonymizer.mask("zipcode", "10001"), r"^\d{3}-\d{4}$")
+
+    def test_repeated_values_are_cached(self):
+        pseudonymizer = Pseudonymizer("secret", 1024 * 1024)
+        for _ in range(5):
+            pseudonymizer.mask("name", "John")
+        self.assertEqual(pseudonymizer.cache.misses, 1)
+        self.assertEqual(pseudonymizer.cache.hits, 4)
+
+    def test_unhashable_values(self):
+        pseudonymizer = Pseudonymizer("secret", 1024 * 1024)
+        original = {"$date": "2024-02-23T00:00:00.000Z"}
+        self.assertEqual(
+            pseudonymizer.mask("date", original), pseudonymizer.mask("date", original)
+        )
+        self.assertEqual(len(pseudonymizer.cache), 0)
+
+    def test_consistent_across_documents(self):
+        main.configure_generators(deterministic_key="secret")
+        try:
+            first = main.anonymize_data(
+                {"email": "john@example.com"}, {"email": "email"}
+            )
+            second = main.anonymize_data(
+                {"user": {"email": "john@example.com"}}, {"user.email": "email"}
+            )
+        finally:
+            main.configure_generators()
+        self.assertEqual(first["email"], second["user"]["email"])
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used(self):
+        cache = LRUCache(max_bytes=1)
+        cache.put("a", 1)
+        self.assertEqual(len(cache), 0)
+
+        cache = LRUCache(max_bytes=10_000)
+        for i in range(1000):
+            cache.put(i, str(i))
+        self.assertLessEqual(cache.bytes, 10_000)
+        self.assertGreater(len(cache), 0)
+        self.assertIsNone(cache.get(0))
+        self.assertEqual(cache.get(999), "999")
+
+
+if __name__ == "__main__":
+    unittest.main()
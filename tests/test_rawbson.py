@@ -0,0 +1,131 @@
+import re
+import unittest
+import uuid
+from datetime import datetime, timezone
+
+import bson
+from bson.binary import Binary
+from bson.code import Code
+from bson.dbref import DBRef
+from bson.decimal128 import Decimal128
+from bson.int64 import Int64
+from bson.max_key import MaxKey
+from bson.min_key import MinKey
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+from bson.regex import Regex
+from bson.timestamp import Timestamp
+
+from mongomasker_cli.main import CODEC_OPTIONS, anonymize_raw_data
+from mongomasker_cli.plan import FieldPlan
+from mongomasker_cli.rawbson import element_spans, mask_raw_bson
+from mongomasker_cli.workers import RAW_CODEC_OPTIONS
+
+
+def masked(data_type, value):
+    return f"masked-{data_type}"
+
+
+DOCUMENT = {
+    "_id": ObjectId(),
+    "double": 1.5,
+    "string": "text",
+    "document": {"name": "John", "email": "john@example.com"},
+    "array": [{"name": "a"}, {"name": "b"}],
+    "binary": Binary(b"\x00\x01", 0),
+    "uuid": uuid.uuid4(),
+    "bool": True,
+    "date": datetime(2024, 1, 1, tzinfo=timezone.utc),
+    "null": None,
+    "regex": Regex("^a.*", "i"),
+    "dbref": DBRef("other", 1),
+    "code": Code("function () {}"),
+    "code_with_scope": Code("function () { return x; }", {"x": 1}),
+    "int32": 42,
+    "timestamp": Timestamp(1, 1),
+    "int64": Int64(2**40),
+    "decimal": Decimal128("1.25"),
+    "min": MinKey(),
+    "max": MaxKey(),
+    "name": "Jane",
+}
+
+
+def encode(document):
+    return bson.encode(document, codec_options=CODEC_OPTIONS)
+
+
+class TestRawBSON(unittest.TestCase):
+
+    def test_element_spans(self):
+        data = encode(DOCUMENT)
+        names = [name.decode() for name, _, _ in element_spans(data)]
+        self.assertEqual(names, list(DOCUMENT))
+        _, _, last_end = list(element_spans(data))[-1]
+        self.assertEqual(last_end, len(data) - 1)
+
+    def test_element_spans_of_legacy_types(self):
+        # undefined (0x06), DBPointer (0x0C) and symbol (0x0E) can't be encoded
+        # by pymongo, build the elements by hand
+        elements = (
+            b"\x06undefined\x00"
+            + b"\x0cpointer\x00\x04\x00\x00\x00abc\x00"
+            + ObjectId().binary
+            + b"\x0esymbol\x00\x02\x00\x00\x00s\x00"
+            + b"\x02after\x00\x02\x00\x00\x00x\x00"
+        )
+        data = (len(elements) + 5).to_bytes(4, "little") + elements + b"\x00"
+        names = [name for name, _, _ in element_spans(data)]
+        self.assertEqual(names, [b"undefined", b"pointer", b"symbol", b"after"])
+
+    def test_masks_like_a_full_decode(self):
+        fields = {"document.name": "name", "array.name": "name", "name": "name"}
+        data = encode(DOCUMENT)
+        result = bson.decode(
+            mask_raw_bson(
+                data,
+                FieldPlan(fields),
+                lambda document: FieldPlan(fields).apply(document, masked),
+                CODEC_OPTIONS,
+            ),
+            CODEC_OPTIONS,
+        )
+        expected = FieldPlan(fields).apply(bson.decode(data, CODEC_OPTIONS), masked)
+        self.assertEqual(result, expected)
+        self.assertEqual(result["document"]["name"], "masked-name")
+        self.assertEqual(result["document"]["email"], "john@example.com")
+        self.assertEqual(list(result), list(DOCUMENT))
+
+    def test_untouched_document_is_not_copied(self):
+        data = encode(DOCUMENT)
+        warnings = []
+        plan = FieldPlan({"missing": "name"})
+        result = mask_raw_bson(
+            data, plan, lambda document: plan.apply(document, masked, warnings.append)
+        )
+        self.assertIs(result, data)
+        self.assertEqual(len(warnings), 1)
+
+    def test_wildcard_decodes_everything(self):
+        data = encode({"a": {"name": "x"}, "b": {"name": "y"}})
+        plan = FieldPlan({"*.name": "name"})
+        result = bson.decode(
+            mask_raw_bson(data, plan, lambda document: plan.apply(document, masked))
+        )
+        self.assertEqual(
+            result, {"a": {"name": "masked-name"}, "b": {"name": "masked-name"}}
+        )
+
+    def test_anonymize_raw_data(self):
+        document = RawBSONDocument(
+            encode({"_id": 1, "name": "John", "other": "kept"}), RAW_CODEC_OPTIONS
+        )
+        result = anonymize_raw_data(document, {"name": "name"})
+        self.assertIsInstance(result, RawBSONDocument)
+        self.assertNotEqual(result["name"], "John")
+        self.assertEqual(result["other"], "kept")
+        self.assertTrue(re.match(r"^\w", result["name"]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,150 @@
+import asyncio
+import os
+import tempfile
+import unittest
+
+from pymongo import DeleteOne, ReplaceOne
+
+from mongomasker_cli.watch import (
+    change_stream_match,
+    change_to_operation,
+    load_resume_token,
+    save_resume_token,
+    sync_changes,
+)
+
+
+def mask(document):
+    return dict(document, name="masked")
+
+
+class FakeStream:
+    """Change stream returning `events`, None stands for an idle poll."""
+
+    def __init__(self, events):
+        self.events = list(events)
+        self.resume_token = None
+        self.alive = True
+
+    async def try_next(self):
+        event = self.events.pop(0)
+        if event is not None:
+            self.resume_token = event["_id"]
+        if not self.events:
+            self.alive = False
+        return event
+
+
+class FakeCollection:
+    def __init__(self):
+        self.writes = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.writes.append(list(operations))
+
+
+def insert(token, _id):
+    return {
+        "_id": token,
+        "operationType": "insert",
+        "documentKey": {"_id": _id},
+        "fullDocument": {"_id": _id, "name": "John"},
+    }
+
+
+class TestChangeToOperation(unittest.TestCase):
+
+    def test_insert_is_a_masked_upsert(self):
+        operation = change_to_operation(insert({"_data": "1"}, 1), mask)
+        self.assertEqual(
+            operation, ReplaceOne({"_id": 1}, {"_id": 1, "name": "masked"}, upsert=True)
+        )
+
+    def test_delete(self):
+        change = {"operationType": "delete", "documentKey": {"_id": 1}}
+        self.assertEqual(change_to_operation(change, mask), DeleteOne({"_id": 1}))
+
+    def test_update_of_a_deleted_document_is_skipped(self):
+        change = {
+            "operationType": "update",
+            "documentKey": {"_id": 1},
+            "fullDocument": None,
+        }
+        self.assertIsNone(change_to_operation(change, mask))
+
+
+class TestChangeStreamMatch(unittest.TestCase):
+
+    def test_no_filter(self):
+        self.assertIsNone(change_stream_match({}))
+
+    def test_fields_are_prefixed(self):
+        match = change_stream_match(
+            {"status": "active", "$or": [{"age": {"$gt": 18}}, {"vip": True}]}
+        )
+        self.assertEqual(
+            match["$match"]["$or"][1],
+            {
+                "fullDocument.status": "active",
+                "$or": [
+                    {"fullDocument.age": {"$gt": 18}},
+                    {"fullDocument.vip": True},
+                ],
+            },
+        )
+
+
+class TestSyncChanges(unittest.TestCase):
+
+    def test_batches_and_tokens(self):
+        stream = FakeStream([insert({"_data": str(i)}, i) for i in range(5)])
+        target = FakeCollection()
+        flushes = []
+
+        applied = asyncio.run(
+            sync_changes(
+                stream,
+                target,
+                mask,
+                batch_size=2,
+                on_flush=lambda token, count: flushes.append((token, count)),
+            )
+        )
+
+        self.assertEqual(applied, 5)
+        self.assertEqual([len(write) for write in target.writes], [2, 2, 1])
+        self.assertEqual(flushes[-1], ({"_data": "4"}, 1))
+
+    def test_idle_stream_flushes(self):
+        stream = FakeStream(
+            [insert({"_data": "0"}, 0), None, insert({"_data": "1"}, 1)]
+        )
+        target = FakeCollection()
+
+        asyncio.run(sync_changes(stream, target, mask, flush_interval=60))
+
+        self.assertEqual([len(write) for write in target.writes], [1, 1])
+
+    def test_invalidate_ends_the_stream(self):
+        stream = FakeStream(
+            [
+                insert({"_data": "0"}, 0),
+                {"_id": {"_data": "1"}, "operationType": "drop"},
+                insert({"_data": "2"}, 2),
+            ]
+        )
+        target = FakeCollection()
+
+        applied = asyncio.run(sync_changes(stream, target, mask))
+
+        self.assertEqual(applied, 1)
+        self.assertEqual(len(stream.events), 1)
+
+
+class TestResumeToken(unittest.TestCase):
+
+    def test_save_and_load(self):
+        path = os.path.join(tempfile.mkdtemp(), "token.json")
+        self.assertIsNone(load_resume_token(path))
+        save_resume_token(path, {"_data": "8263"})
+        self.assertEqual(load_resume_token(path), {"_data": "8263"})
@@ -0,0 +1,50 @@
+import asyncio
+import multiprocessing
+import unittest
+
+import bson
+
+from mongomasker_cli import main
+from mongomasker_cli.workers import RAW_CODEC_OPTIONS, MaskingPool, _init_worker
+
+
+def raw_batch(documents):
+    return bson.decode_all(
+        b"".join(bson.encode(document) for document in documents), RAW_CODEC_OPTIONS
+    )
+
+
+class TestMaskingPool(unittest.TestCase):
+
+    def test_mask_raw_batch(self):
+        documents = [
+            {"_id": i, "name": "John Doe", "user": {"email": "john@example.com"}}
+            for i in range(20)
+        ]
+        fields = {"name": "name", "user.email": "email"}
+        with MaskingPool(2, fields, seed=42) as pool:
+            masked = asyncio.run(pool.mask(raw_batch(documents)))
+
+        self.assertEqual(len(masked), 20)
+        for i, document in enumerate(masked):
+            self.assertIsInstance(document.raw, bytes)
+            self.assertEqual(document["_id"], i)
+            self.assertNotEqual(document["name"], "John Doe")
+            self.assertNotEqual(document["user"]["email"], "john@example.com")
+
+    def test_workers_use_different_seeds(self):
+        counter = multiprocessing.Value("i", 0)
+        original_fakers = main.fakers
+        try:
+            names = []
+            for _ in range(2):
+                _init_worker({"name": "name"}, False, 7, counter)
+                names.append([main.fakers["name"].first_name() for _ in range(10)])
+        finally:
+            main.fakers = original_fakers
+        self.assertEqual(counter.value, 2)
+        self.assertNotEqual(names[0], names[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+import asyncio
+import unittest
+
+from pymongo.errors import BulkWriteError
+
+from mongomasker_cli.writes import TargetWriter, WriteFailed
+
+
+class FakeResult:
+    def __init__(self, upserted_count, matched_count):
+        self.upserted_count = upserted_count
+        self.matched_count = matched_count
+
+
+class FakeCollection:
+    """Collection failing the writes of the _id values in `failures`.
+
+    `failures` maps an _id to the error codes of its next attempts.
+    """
+
+    def __init__(self, existing=(), failures=None):
+        self.documents = {_id: {"_id": _id} for _id in existing}
+        self.failures = failures or {}
+        self.calls = []
+
+    def _errors(self, documents, upsert):
+        errors = []
+        written = 0
+        for index, document in enumerate(documents):
+            codes = self.failures.get(document["_id"])
+            if codes:
+                errors.append({"index": index, "code": codes.pop(0), "errmsg": "error"})
+            elif document["_id"] in self.documents and not upsert:
+                errors.append({"index": index, "code": 11000, "errmsg": "E11000"})
+            else:
+                written += 1
+                self.documents[document["_id"]] = document
+        return errors, written
+
+    async def insert_many(self, documents, ordered=True):
+        self.calls.append([document["_id"] for document in documents])
+        errors, written = self._errors(documents, upsert=False)
+        if errors:
+            raise BulkWriteError(
+                {"writeErrors": errors, "nInserted": written, "writeConcernErrors": []}
+            )
+
+    async def bulk_write(self, operations, ordered=True):
+        documents = [operation._doc for operation in operations]
+        self.calls.append([document["_id"] for document in documents])
+        existing = sum(document["_id"] in self.documents for document in documents)
+        errors, written = self._errors(documents, upsert=True)
+        if errors:
+            raise BulkWriteError(
+                {
+                    "writeErrors": errors,
+                    "nUpserted": written - existing,
+                    "nMatched": existing,
+                    "writeConcernErrors": [],
+                }
+            )
+        return FakeResult(written - existing, existing)
+
+
+def documents(ids):
+    return [{"_id": _id, "name": "masked"} for _id in ids]
+
+
+class TestTargetWriter(unittest.TestCase):
+
+    def test_unordered_skips_duplicates(self):
+        collection = FakeCollection(existing=[1, 3])
+        writer = TargetWriter(collection, "unordered", retry_delay=0)
+        asyncio.run(writer.write(documents(range(5))))
+        self.assertEqual((writer.inserted, writer.duplicates), (3, 2))
+        self.assertEqual(len(collection.calls), 1)
+
+    def test_retries_only_failed_documents(self):
+        collection = FakeCollection(failures={2: [91, 91]})
+        writer = TargetWriter(collection, "unordered", retry_delay=0)
+        asyncio.run(writer.write(documents(range(4))))
+        self.assertEqual(collection.calls, [[0, 1, 2, 3], [2], [2]])
+        self.assertEqual((writer.inserted, writer.retried), (4, 2))
+
+    def test_gives_up_after_retries(self):
+        collection = FakeCollection(failures={2: [121, 121, 121]})
+        writer = TargetWriter(collection, "unordered", retries=2, retry_delay=0)
+        with self.assertRaises(WriteFailed) as raised:
+            asyncio.run(writer.write(documents(range(4))))
+        self.assertEqual(raised.exception.errors[0]["code"], 121)
+        self.assertEqual(writer.inserted, 3)
+
+    def test_upsert_replaces_existing(self):
+        collection = FakeCollection(existing=[0, 1])
+        writer = TargetWriter(collection, "upsert", retry_delay=0)
+        asyncio.run(writer.write(documents(range(3))))
+        self.assertEqual((writer.inserted, writer.replaced), (1, 2))
+        self.assertEqual(collection.documents[0]["name"], "masked")
+
+    def test_insert_fails_on_duplicates(self):
+        writer = TargetWriter(FakeCollection(existing=[1]), "insert")
+        with self.assertRaises(WriteFailed) as raised:
+            asyncio.run(writer.write(documents(range(3))))
+        self.assertEqual(raised.exception.errors[0]["code"], 11000)
+
+    def test_unknown_mode(self):
+        with self.assertRaises(ValueError):
+            TargetWriter(FakeCollection(), "merge")